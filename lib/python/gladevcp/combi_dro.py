@@ -24,7 +24,7 @@ import sys
 import pango
 import math
 import linuxcnc
-from hal_glib import GStat
+from hal_glib import GStat, StatusHub
 
 # constants
 _INCH = 0
@@ -101,7 +101,8 @@ class Combi_DRO(gtk.VBox):
         # get the necessary connections to linuxcnc
         self.joint_number = self.joint = joint_number
         self.linuxcnc = linuxcnc
-        self.status = linuxcnc.stat()
+        self.status_hub = StatusHub()
+        self.status = self.status_hub.stat
         self.gstat = GStat()
 
         # set some default values'
@@ -192,8 +193,9 @@ class Combi_DRO(gtk.VBox):
         else:
             self.machine_units = _INCH
 
-        # add the timer at a period of 100 ms
-        gobject.timeout_add(self.cycle_time, self._periodic)
+        # update with the status hub every cycle_time ms
+        self._status_subscription = self.status_hub.subscribe(self._periodic,
+            interval = self.cycle_time)
 
     # make an pango attribute to be used with several labels
     def _set_attributes(self, bgcolor, fgcolor, size, weight):
@@ -263,6 +265,8 @@ class Combi_DRO(gtk.VBox):
                     self.toggle_readout = value
                 if name == "cycle_time":
                     self.cycle_time = value
+                    if getattr(self, "_status_subscription", None):
+                        self._status_subscription.set_interval(value)
                 if name in ('metric_units', 'actual', 'diameter'):
                     setattr(self, name, value)
                     self.queue_draw()
@@ -338,15 +342,8 @@ class Combi_DRO(gtk.VBox):
         b = temp[8:]
         return (int(r, 16), int(g, 16), int(b, 16))
 
-    # periodic call to update the positions, every 100 ms
-    def _periodic(self):
-        # we do not want to throw errors if linuxcnc has been killed
-        # from external command
-        try:
-            self.status.poll()
-        except:
-            pass
-
+    # periodic call to update the positions, every cycle_time ms
+    def _periodic(self, stat = None, changed = None):
         if self.status.kinematics_type != linuxcnc.KINEMATICS_IDENTITY and not self.homed:
             self.main_dro.set_text("----.---")
             self.dro_left.set_text("----.---")
@@ -17,6 +17,7 @@
 import sys,os,pango
 import math
 import linuxcnc
+from hal_glib import StatusHub
 
 try:
     import gobject,gtk
@@ -55,12 +56,13 @@ class HAL_DRO(gtk.Label):
     def __init__(self, *a, **kw):
         gtk.Label.__init__(self, *a, **kw)
         self.emc = linuxcnc
-        self.status = self.emc.stat()
+        hub = StatusHub()
+        self.status = hub.stat
         self.display_units_mm=0
         self.machine_units_mm=0
         self.unit_convert=[1]*9
 
-        gobject.timeout_add(100, self.periodic)
+        hub.subscribe(self.periodic, interval=100)
 
         try:
             self.inifile = self.emc.ini(INIPATH)
@@ -102,9 +104,8 @@ class HAL_DRO(gtk.Label):
         else:
             raise AttributeError('unknown property %s' % property.name)
 
-    def periodic(self):
+    def periodic(self, stat=None, changed=None):
         try:
-            self.status.poll()
             absolute,relative,dtg = self.position()
         except:
             sys = 0
@@ -19,11 +19,15 @@ import cairo
 import math
 import gtk.glade
 import time
-from collections import deque
+import numpy
 
 from hal_widgets import _HalWidgetBase, hal
 
 MAX_INT = 0x7fffffff
+MAX_TRACES = 8
+# samples kept per trace when they come from a sampler stream
+STREAM_SAMPLES = 1 << 16
+TRACE_COLORS = ('blue', 'dark green', 'orange', 'magenta', 'cyan', 'brown', 'black')
 
 def gdk_color_tuple(c):
     if not c:
@@ -40,6 +44,61 @@ def mround(v, m):
     if v < 0: return v - vm + m
     return 0
 
+class RingBuffer:
+    """ Fixed size history of samples, the oldest are overwritten """
+    def __init__(self, size, traces=1):
+        self.t = numpy.zeros(size)
+        self.v = numpy.zeros((size, traces))
+        self.size = size
+        self.count = 0
+        self.head = 0
+
+    def append(self, t, values):
+        self.t[self.head] = t
+        self.v[self.head] = values
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def extend(self, t, v):
+        """ Add arrays of times and values (one row per sample) """
+        n = len(t)
+        if n >= self.size:
+            t, v, n = t[-self.size:], v[-self.size:], self.size
+        end = self.head + n
+        if end <= self.size:
+            self.t[self.head:end] = t
+            self.v[self.head:end] = v
+        else:
+            k = self.size - self.head
+            self.t[self.head:] = t[:k]
+            self.v[self.head:] = v[:k]
+            self.t[:n-k] = t[k:]
+            self.v[:n-k] = v[k:]
+        self.head = end % self.size
+        self.count = min(self.count + n, self.size)
+
+    def data(self, since=None):
+        """ Times and values in time order, optionally only from 'since' on """
+        if self.count < self.size:
+            t, v = self.t[:self.count], self.v[:self.count]
+        else:
+            t = numpy.concatenate((self.t[self.head:], self.t[:self.head]))
+            v = numpy.concatenate((self.v[self.head:], self.v[:self.head]))
+        if since is not None:
+            i = numpy.searchsorted(t, since)
+            t, v = t[i:], v[i:]
+        return t, v
+
+def decimate(x, v):
+    """ Reduce a trace to the min and max of each pixel column
+
+    x must be sorted.  Returns the column positions and the per column
+    minimum and maximum; NaN samples are skipped, a column with nothing
+    else gives NaN. """
+    col = numpy.floor(x)
+    starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(col)) + 1))
+    return col[starts], numpy.fmin.reduceat(v, starts), numpy.fmax.reduceat(v, starts)
+
 class HAL_Graph(gtk.DrawingArea, _HalWidgetBase):
     __gtype_name__ = 'HAL_Graph'
     __gproperties__ = {
@@ -78,6 +137,11 @@ class HAL_Graph(gtk.DrawingArea, _HalWidgetBase):
                 "", gobject.PARAM_READWRITE|gobject.PARAM_CONSTRUCT),
         'sublabel' : ( gobject.TYPE_STRING, 'Graph sub label', 'Sub text to display',
                 "", gobject.PARAM_READWRITE|gobject.PARAM_CONSTRUCT),
+        'traces' : ( gobject.TYPE_INT, 'Traces', 'Number of pins to plot, extra pins are named <name>-1, <name>-2...',
+                    1, MAX_TRACES, 1, gobject.PARAM_READWRITE | gobject.PARAM_CONSTRUCT),
+        'sampler' : ( gobject.TYPE_INT, 'Sampler channel',
+                'Take the samples from this sampler component channel instead of the pins. -1 to disable',
+                    -1, MAX_INT, -1, gobject.PARAM_READWRITE | gobject.PARAM_CONSTRUCT),
     }
     __gproperties = __gproperties__
 
@@ -88,8 +152,8 @@ class HAL_Graph(gtk.DrawingArea, _HalWidgetBase):
         self.fg_color = gtk.gdk.Color('red')
 
         self.force_radius = None
-        self.ticks = deque()
-        self.ticks_saved = []
+        self.ticks = None
+        self.ticks_saved = None
         self.time_strings = {}
         self.tick_period = 0.1
 
@@ -100,33 +164,78 @@ class HAL_Graph(gtk.DrawingArea, _HalWidgetBase):
         self.tick = 500
         self.tick_idx = 0
         self.hal_pin = 0
+        self.hal_pins = []
+        self.stream = None
+        self.stream_time = 0
 
         gobject.timeout_add(self.tick, self.tick_poll, self.tick_idx)
 
     def _hal_init(self):
         _HalWidgetBase._hal_init(self)
         self.hal_pin = self.hal.newpin(self.hal_name, hal.HAL_FLOAT, hal.HAL_IN)
+        self.hal_pins = [self.hal_pin]
+        for i in range(1, self.traces):
+            self.hal_pins.append(self.hal.newpin("%s-%d" % (self.hal_name, i), hal.HAL_FLOAT, hal.HAL_IN))
+        if self.sampler >= 0:
+            # hal.stream wants the component itself, not the GComponent
+            comp = getattr(self.hal, 'comp', self.hal)
+            try:
+                self.stream = hal.stream(comp, hal.sampler_base + self.sampler)
+            except IOError, e:
+                print "**** HAL_Graph %s: can't attach to sampler channel %d: %s" % (self.hal_name, self.sampler, e)
+                self.stream = None
+            self.stream_time = time.time()
+
+    def history(self):
+        """ The sample buffer, remade when the trace setup has changed """
+        if self.stream:
+            size = STREAM_SAMPLES
+        else:
+            size = int(self.period * 1000 / self.tick) + 2
+        b = self.ticks
+        if b is None or b.size != size or b.v.shape[1] != self.traces:
+            b = self.ticks = RingBuffer(size, self.traces)
+        return b
 
     def tick_poll(self, idx):
         if self.tick_idx != idx:
             return False
-        v = self.hal_pin and self.hal_pin.get()
+        b = self.history()
         now = time.time()
-        for (t,_) in list(self.ticks):
-            if t >= now - self.period:
-                break
-            self.ticks.popleft()
-        self.ticks.append((now, v))
+        if self.stream:
+            self.read_stream(b, now)
+        else:
+            v = [p.get() for p in self.hal_pins]
+            b.append(now, (v + [0] * self.traces)[:self.traces])
         self.queue_draw()
         return True
 
+    def read_stream(self, b, now):
+        """ Move everything the sampler has queued into the buffer
+
+        The samples carry no time, so they are spread evenly over the time
+        since the last read. """
+        rows = []
+        s = self.stream
+        while s.readable:
+            r = s.read()
+            if r is None: break
+            rows.append(r[:self.traces])
+        if rows:
+            v = numpy.zeros((len(rows), self.traces))
+            v[:, :len(rows[0])] = numpy.array(rows, dtype=float)
+            n = len(rows)
+            t = self.stream_time + (now - self.stream_time) * numpy.arange(1, n + 1) / n
+            b.extend(t, v)
+        self.stream_time = now
+
     def snapshot(self, widget, event):
         if event.button != 1:
             return
         if self.ticks_saved:
-            self.ticks_saved = []
-        else:
-            self.ticks_saved = list(self.ticks)
+            self.ticks_saved = None
+        elif self.ticks:
+            self.ticks_saved = self.ticks.data(time.time() - self.period)
 
     def expose(self, widget, event):
         w = self.allocation.width
@@ -167,8 +276,12 @@ class HAL_Graph(gtk.DrawingArea, _HalWidgetBase):
 
         #tw = self.tick_period * w / self.period
         tnow = now = time.time()
-        if self.ticks_saved:
-            now = max(map(lambda x: x[0], self.ticks_saved))
+        if self.ticks_saved and len(self.ticks_saved[0]):
+            now = self.ticks_saved[0][-1]
+        if self.ticks:
+            ticks = self.ticks.data(tnow - self.period)
+        else:
+            ticks = numpy.zeros(0), numpy.zeros((0, self.traces))
 
         cr.set_source_rgb(0, 0, 0)
 
@@ -185,9 +298,12 @@ class HAL_Graph(gtk.DrawingArea, _HalWidgetBase):
         ymin, ymax = self.min, self.max
         yticks = self.yticks
         if self.autoscale:
-            tv = map(lambda x: x[1], self.ticks_saved + list(self.ticks))
-            if tv:
-                ymin, ymax = min(tv), max(tv)
+            tv = ticks[1]
+            if self.ticks_saved:
+                tv = numpy.concatenate((tv.ravel(), self.ticks_saved[1].ravel()))
+            tv = tv[~numpy.isnan(tv)]
+            if len(tv):
+                ymin, ymax = float(tv.min()), float(tv.max())
                 ymin -= abs(ymin) * 0.1
                 ymax += abs(ymax) * 0.1
             else:
@@ -211,13 +327,14 @@ class HAL_Graph(gtk.DrawingArea, _HalWidgetBase):
         cr.set_font_size(font_small)
         self.text_at(cr, self.sublabel, w/2, 2.5 * font_large, yalign='top')
 
-        cr.set_source_color(self.fg_color)
-
+        colors = [gdk_color_tuple(self.fg_color)]
+        for c in TRACE_COLORS:
+            colors.append(gdk_color_tuple(gtk.gdk.color_parse(c)))
+        alpha = 1
         if self.ticks_saved:
-            self.draw_graph(cr, w, h, ymin, ymax, self.ticks_saved, t2x)
-            cr.set_source_rgba(*(gdk_color_tuple(self.fg_color) + (0.3,)))
-
-        self.draw_graph(cr, w, h, ymin, ymax, self.ticks, lambda t: t2x(t, tnow))
+            self.draw_traces(cr, w, h, ymin, ymax, self.ticks_saved, now, colors, 1)
+            alpha = 0.3
+        self.draw_traces(cr, w, h, ymin, ymax, ticks, tnow, colors, alpha)
 
         if not (self.flags() & gtk.PARENT_SENSITIVE):
             cr.set_source_rgba(0, 0, 0, 0.3)
@@ -242,18 +359,30 @@ class HAL_Graph(gtk.DrawingArea, _HalWidgetBase):
         cr.move_to(x, y)
         cr.show_text(text)
 
-    def draw_graph(self, cr, w, h, ymin, ymax, ticks, t2x):
+    def draw_traces(self, cr, w, h, ymin, ymax, ticks, now, colors, alpha):
+        t, v = ticks
+        x = w * (t - now + self.period) / self.period
+        keep = (x >= 0) & (x <= w)
+        x, v = x[keep], v[keep]
+        for i in range(v.shape[1]):
+            cr.set_source_rgba(*(colors[i % len(colors)] + (alpha,)))
+            self.draw_graph(cr, w, h, ymin, ymax, x, v[:, i])
+
+    def draw_graph(self, cr, w, h, ymin, ymax, x, v):
+        # with more samples than pixels only the extremes of each column
+        # can be seen, so draw those
+        if len(x) > 2 * w:
+            x, vmin, vmax = decimate(x, v)
+            x = numpy.repeat(x, 2)
+            v = numpy.empty(len(x))
+            v[0::2], v[1::2] = vmin, vmax
+        v = numpy.clip(v, ymin, ymax)
+        y = h * (1 - (v - ymin)/(ymax - ymin))
         move = True
-        for (t, v) in ticks:
-            if v is None:
-                move = True
-                continue
-            v = min(max(v, ymin), ymax)
-            x = t2x(t)
-            if x is None:
+        for x, y in zip(x.tolist(), y.tolist()):
+            if y != y: # NaN
                 move = True
                 continue
-            y = h * (1 - (v - ymin)/(ymax - ymin))
             if move:
                 cr.move_to(x, y)
                 move = False
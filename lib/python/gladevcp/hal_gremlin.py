@@ -56,6 +56,7 @@ class HAL_Gremlin(gremlin.Gremlin, _EMC_ActionBase):
     __gsignals__ = {
         'line-clicked': (gobject.SIGNAL_RUN_FIRST, gobject.TYPE_NONE, (gobject.TYPE_INT,)),
         'gcode_error': (gobject.SIGNAL_RUN_FIRST, gobject.TYPE_NONE, (gobject.TYPE_STRING,)),
+        'program-loaded': (gobject.SIGNAL_RUN_FIRST, gobject.TYPE_NONE, (gobject.TYPE_PYOBJECT,)),
     }
 
     __gproperties__ = {
@@ -272,7 +273,10 @@ class HAL_Gremlin(gremlin.Gremlin, _EMC_ActionBase):
 
     @rs274.glcanon.with_context
     def _load(self, filename):
-        return self.load(filename)
+        result = self.load(filename)
+        if self.program_statistics is not None:
+            self.emit('program-loaded', self.program_statistics)
+        return result
 
     def report_gcode_error(self, result, seq, filename):
         error_str = gcode.strerror(result)
@@ -22,7 +22,7 @@
 # set the text formatting for metric/imperial separately
 
 import sys, os, pango, linuxcnc
-from hal_glib import GStat
+from hal_glib import GStat, StatusHub
 datadir = os.path.abspath(os.path.dirname(__file__))
 AXISLIST = ['offset', 'X', 'Y', 'Z', 'A', 'B', 'C', 'U', 'V', 'W', 'name']
 # we need to know if linuxcnc isn't running when using the GLADE editor
@@ -81,7 +81,8 @@ class OffsetPage(gtk.VBox):
         self.gstat = GStat()
         self.filename = filename
         self.linuxcnc = linuxcnc
-        self.status = linuxcnc.stat()
+        hub = StatusHub()
+        self.status = hub.stat
         self.cmd = linuxcnc.command()
         self.hash_check = None
         self.display_units_mm = 0 # imperial
@@ -150,7 +151,10 @@ class OffsetPage(gtk.VBox):
             self.machine_units_mm = 0
             self.conversion = [25.4] * 3 + [1] * 3 + [25.4] * 3
 
-        # check linuxcnc status every half second
+        # follow linuxcnc status, and check the offsets every half second
+        self.status_subscription = hub.subscribe(self.status_changed,
+            ('task_state', 'interp_state', 'g5x_index', 'program_units'),
+            500, self.status_lost)
         gobject.timeout_add(500, self.periodic_check)
 
     # Reload the offsets into display
@@ -415,24 +419,25 @@ class OffsetPage(gtk.VBox):
                 print "MDI error in offsetpage widget-zero rotational offset"
 
     # check for linnuxcnc ON and IDLE which is the only safe time to edit the tool file.
-    # if in editing mode don't update else you can't actually edit
-    def periodic_check(self):
+    def status_changed(self, stat, changed):
+        global lncnc_running
         convert = ("None", "G54", "G55", "G56", "G57", "G58", "G59", "G59.1", "G59.2", "G59.3")
-        try:
-            self.status.poll()
-            on = self.status.task_state > linuxcnc.STATE_OFF
-            idle = self.status.interp_state == linuxcnc.INTERP_IDLE
-            self.edit_button.set_sensitive(bool(on and idle))
-            self.current_system = convert[self.status.g5x_index]
-            self.program_units = int(self.status.program_units == 2)
-            if self.display_follows_program:
-                self.display_units_mm = self.program_units
-            global lncnc_running
-            lncnc_running = True
-        except:
-            self.current_system = "G54"
-            lncnc_running = False
+        on = stat.task_state > linuxcnc.STATE_OFF
+        idle = stat.interp_state == linuxcnc.INTERP_IDLE
+        self.edit_button.set_sensitive(bool(on and idle))
+        self.current_system = convert[stat.g5x_index]
+        self.program_units = int(stat.program_units == 2)
+        if self.display_follows_program:
+            self.display_units_mm = self.program_units
+        lncnc_running = True
+
+    def status_lost(self, error):
+        global lncnc_running
+        self.current_system = "G54"
+        lncnc_running = False
 
+    # if in editing mode don't update else you can't actually edit
+    def periodic_check(self):
         if self.filename and not self.editing_mode:
             self.reload_offsets()
         return True
@@ -462,6 +467,7 @@ class OffsetPage(gtk.VBox):
 
     def set_display_follows_program_units(self):
         self.display_follows_program = True
+        self.status_subscription.refresh()
 
     def set_display_independent_units(self):
         self.display_follows_program = False
@@ -16,6 +16,7 @@
 
 import sys,os,pango
 import linuxcnc
+from hal_glib import StatusHub
 
 try:
     import gobject,gtk
@@ -50,12 +51,13 @@ class HAL_Offset(gtk.Label):
     def __init__(self, *a, **kw):
         gtk.Label.__init__(self, *a, **kw)
         self.emc = linuxcnc
-        self.status = self.emc.stat()
+        hub = StatusHub()
+        self.status = hub.stat
         self.display_units_mm=0
         self.machine_units_mm=0
         self.unit_convert=[1]*9
         # The update time: every 500 milliseonds
-        gobject.timeout_add(500, self.periodic)
+        hub.subscribe(self.periodic, interval=500)
 
         # check the ini file if UNITS are set to mm
         # first check the global settings
@@ -100,12 +102,11 @@ class HAL_Offset(gtk.Label):
         else:
             raise AttributeError('unknown property %s' % property.name)
 
-    # This runs runs at the gooject timeout rate
-    # it polls linuxcnc gets the offsets in correct units
+    # This runs runs at the status hub's rate
+    # it gets the offsets in correct units
     # and displays them according to the formatting entered 
-    def periodic(self):
+    def periodic(self, stat=None, changed=None):
         try:
-            self.status.poll()
             g5x,tool,g92,rot = self.get_offsets()
         except:
             rot = 0
@@ -16,6 +16,7 @@
 
 import sys,os,pango
 import linuxcnc
+from hal_glib import StatusHub
 
 try:
     import gobject,gtk
@@ -36,7 +37,8 @@ class Override(gtk.HScale):
     def __init__(self, *a, **kw):
         gtk.HScale.__init__(self, *a, **kw)
         self.emc = linuxcnc
-        self.status = self.emc.stat()
+        hub = StatusHub()
+        self.status = hub.stat
         self.cmd = linuxcnc.command()
         self.override_type = 0
         self.override = 1.0
@@ -49,7 +51,8 @@ class Override(gtk.HScale):
         #self.add_mark(100.0,gtk.POS_RIGHT,'')
         self.connect('value-changed',self.update_value)
         # The update time: every 100 milliseonds
-        gobject.timeout_add(100, self.periodic)
+        self.status_subscription = hub.subscribe(self.periodic,
+            ('feedrate', 'rapidrate', 'spindle', 'max_velocity'), 100)
 
     # we set the adjustment limits based on the INI entries
     def set_type(self, data=0):
@@ -78,6 +81,9 @@ class Override(gtk.HScale):
             self.max_vel_convert = MAXVEL/100.0
             adjustment.set_upper(100)
             adjustment.set_lower(0)
+        # show the value of the new type with the next poll
+        if getattr(self, 'status_subscription', None):
+            self.status_subscription.refresh()
 
     # This is a signal callback that commands linuxcnc based on the current
     # scale position
@@ -98,22 +104,20 @@ class Override(gtk.HScale):
             self.cmd.maxvel(data)
         return True
 
-    # This runs runs at the gooject timeout rate
-    # it polls linuxcnc to get the current data
+    # This is called by the status hub when an override changed
     # and updates the scale to refleck the current value.
     # in this way if eg HALUI is used to set an override the
     # scale will track it.
-    def periodic(self):
+    def periodic(self, stat, changed):
         try:
-            self.status.poll()
             if self.override_type == 0:
-                self.override = self.status.feedrate
+                self.override = stat.feedrate
             elif self.override_type == 1:
-                self.override = self.status.rapidrate
+                self.override = stat.rapidrate
             elif self.override_type == 2:
-                self.override = self.status.spindlerate
+                self.override = stat.spindle[0]['override']
             elif self.override_type == 3:
-                self.override = self.status.max_velocity
+                self.override = stat.max_velocity
             # max velocity is not based on % so must be converted
             if not self.override_type == 3:
                 self.set_value(self.override*100)
@@ -15,6 +15,7 @@
 # GNU General Public License for more details.
 
 import sys, os, pango, linuxcnc, hashlib, glib
+from hal_glib import StatusHub
 datadir = os.path.abspath(os.path.dirname(__file__))
 KEYWORDS = ['S','T', 'P', 'X', 'Y', 'Z', 'A', 'B', 'C', 'U', 'V', 'W', 'D', 'I', 'J', 'Q', ';']
 try:
@@ -50,7 +51,8 @@ class ToolEdit(gtk.VBox):
 
     def __init__(self,toolfile=None, *a, **kw):
         super(ToolEdit, self).__init__()
-        self.emcstat = linuxcnc.stat()
+        hub = StatusHub()
+        self.emcstat = hub.stat
         self.hash_check = None 
         self.lathe_display_type = True
         self.toolfile = toolfile
@@ -164,7 +166,8 @@ class ToolEdit(gtk.VBox):
         except:
             pass
 
-        # check linuxcnc status every second
+        # follow linuxcnc status, and check the tool file every second
+        hub.subscribe(self.status_changed, ('task_state', 'interp_state'), 1000)
         gobject.timeout_add(1000, self.periodic_check)
 
     # used to split tool and wear data by the tool number
@@ -444,15 +447,13 @@ class ToolEdit(gtk.VBox):
         model[path][0] = not model[path][0]
 
         # check for linnuxcnc ON and IDLE which is the only safe time to edit the tool file.
+    def status_changed(self, stat, changed):
+        on = stat.task_state > linuxcnc.STATE_OFF
+        idle = stat.interp_state == linuxcnc.INTERP_IDLE
+        self.apply.set_sensitive(bool(on and idle))
+
         # check to see if the tool file is current
     def periodic_check(self):
-        try:
-            self.emcstat.poll()
-            on = self.emcstat.task_state > linuxcnc.STATE_OFF
-            idle = self.emcstat.interp_state == linuxcnc.INTERP_IDLE
-            self.apply.set_sensitive(bool(on and idle))
-        except:
-            pass
         if self.toolfile:
             self.file_current_check()
         return True
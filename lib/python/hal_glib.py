@@ -5,6 +5,8 @@ import _hal, hal, gobject
 import linuxcnc
 import os
 import math
+import time
+from operator import attrgetter
 
 # constants
 JOGJOINT  = 1
@@ -77,6 +79,204 @@ class GComponent:
     def __getitem__(self, k): return self.comp[k]
     def __setitem__(self, k, v): self.comp[k] = v
 
+class _StatusSubscription:
+    def __init__(self, hub, callback, fields, interval, error):
+        self.hub = hub
+        self.callback = callback
+        self.fields = frozenset(fields)
+        self.interval = interval
+        self.error = error
+        # the first call reports all the fields
+        self.pending = set(self.fields)
+        self.last = 0
+        self.calls = 0
+        self.time = 0.0
+        if hasattr(callback, 'im_self'):
+            self.name = "%s.%s" % (callback.im_self.__class__.__name__,
+                                   callback.__name__)
+        else:
+            self.name = getattr(callback, '__name__', repr(callback))
+
+    def refresh(self):
+        """Report all the fields again with the next poll"""
+        self.pending.update(self.fields)
+
+    def set_interval(self, interval):
+        self.interval = interval
+        self.hub.schedule()
+
+    def cancel(self):
+        self.hub.unsubscribe(self)
+
+class _StatusHub(object):
+    '''Polls linuxcnc status once per cycle for the whole process
+
+    Instead of every widget polling its own linuxcnc.stat() on its own
+    timer, widgets subscribe to the hub with the names of the stat fields
+    they use.  After each poll the hub compares those fields with the
+    previous poll and calls each subscriber with the stat object and a
+    dict of the fields that changed; subscribers that changed nothing are
+    not called.  A subscriber without fields is called after every poll
+    with an empty dict.  Each subscriber is called at most once per its
+    interval, and the hub polls at the shortest interval asked for.
+
+    If the poll fails (linuxcnc is not running) no subscriber is called,
+    but the error callbacks get the exception.
+
+    The hub counts its polls and the time spent in each subscriber, see
+    counters().
+    '''
+    def __init__(self, stat=None):
+        self.stat = stat or linuxcnc.stat()
+        self.subscriptions = []
+        self.fields = frozenset()
+        self.snapshot = {}
+        self.interval = None
+        self.source = None
+        self.started = time.time()
+        self.polls = 0
+        self.poll_errors = 0
+        self.poll_time = 0.0
+
+    def subscribe(self, callback, fields=(), interval=100, error=None):
+        """Call callback(stat, changed) when any of the fields changed
+
+        Returns a subscription with refresh(), set_interval() and cancel()
+        methods."""
+        for f in fields:
+            if not hasattr(self.stat, f):
+                raise ValueError, "linuxcnc.stat has no field %s" % f
+        s = _StatusSubscription(self, callback, fields, interval, error)
+        self.subscriptions.append(s)
+        self.fields = self.fields.union(s.fields)
+        self.schedule()
+        return s
+
+    def unsubscribe(self, subscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        self.fields = frozenset().union(*[s.fields for s in self.subscriptions])
+        self.schedule()
+
+    def schedule(self):
+        interval = min([s.interval for s in self.subscriptions] or [None])
+        if interval == self.interval: return
+        if self.source is not None:
+            gobject.source_remove(self.source)
+            self.source = None
+        self.interval = interval
+        if interval is not None:
+            self.source = gobject.timeout_add(interval, self.poll)
+
+    def poll(self):
+        t0 = time.time()
+        try:
+            self.stat.poll()
+        except linuxcnc.error, detail:
+            self.poll_errors += 1
+            for s in self.subscriptions[:]:
+                if s.error: s.error(detail)
+            return True
+        self.polls += 1
+
+        stat = self.stat
+        snapshot = self.snapshot
+        changed = set()
+        for f in self.fields:
+            value = getattr(stat, f)
+            if f not in snapshot or snapshot[f] != value:
+                snapshot[f] = value
+                changed.add(f)
+        now = time.time()
+        self.poll_time += now - t0
+
+        # a subscriber is due if its interval is over, give or take half
+        # a poll
+        slack = self.interval / 2000.
+        for s in self.subscriptions[:]:
+            if s.fields:
+                s.pending.update(s.fields & changed)
+                if not s.pending: continue
+            if now - s.last < s.interval / 1000. - slack: continue
+            values = dict((f, snapshot[f]) for f in s.pending)
+            s.pending.clear()
+            s.last = now
+            try:
+                s.callback(stat, values)
+            except Exception, detail:
+                print "Error in status subscriber %s: %s; Removing" % (s.name, detail)
+                self.unsubscribe(s)
+            t1 = time.time()
+            s.calls += 1
+            s.time += t1 - now
+            now = t1
+        return True
+
+    def poll_rate(self):
+        """The average number of polls per second"""
+        elapsed = time.time() - self.started
+        if elapsed <= 0: return 0.0
+        return self.polls / elapsed
+
+    def counters(self):
+        """Return a dict with the poll counters and, under 'subscribers',
+        a list of (name, calls, seconds) of the subscribers, costliest
+        first"""
+        subscribers = [(s.name, s.calls, s.time) for s in self.subscriptions]
+        subscribers.sort(key=lambda s: -s[2])
+        return {'polls': self.polls, 'poll_errors': self.poll_errors,
+                'poll_rate': self.poll_rate(), 'poll_time': self.poll_time,
+                'subscribers': subscribers}
+
+class StatusHub(_StatusHub):
+    _instance = None
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = _StatusHub.__new__(cls)
+        return cls._instance
+
+    def __init__(self, stat=None):
+        # the instance is shared, so only initialize it once
+        if '_initialized' in self.__dict__: return
+        self._initialized = True
+        _StatusHub.__init__(self, stat)
+
+def _gcode_string(stat):
+    codes = ''
+    for i in sorted(stat.gcodes[1:]):
+        if i == -1: continue
+        if i % 10 == 0:
+            codes += "G%d " % (i/10)
+        else:
+            codes += "G%d.%d " % (i/10, i%10)
+    return codes
+
+def _mcode_string(stat):
+    codes = ''
+    for i in sorted(stat.mcodes[1:]):
+        if i == -1: continue
+        codes += "M%s " % i
+    return codes
+
+def _override_limits(stat):
+    return [stat.joint[j]['override_limits'] for j in range(stat.joints)]
+
+def _position(stat):
+    """The absolute and relative position and the distance to go, in
+    machine units"""
+    p = stat.actual_position
+    g5x = stat.g5x_offset
+    tool = stat.tool_offset
+    g92 = stat.g92_offset
+    rel = [p[i] - g5x[i] - tool[i] for i in range(9)]
+    if stat.rotation_xy != 0:
+        t = math.radians(-stat.rotation_xy)
+        x, y = rel[0], rel[1]
+        rel[0] = x * math.cos(t) - y * math.sin(t)
+        rel[1] = x * math.sin(t) + y * math.cos(t)
+    rel = [rel[i] - g92[i] for i in range(9)]
+    return p, rel, stat.dtg
+
 class _GStat(gobject.GObject):
     '''Emits signals based on linuxcnc status '''
     __gsignals__ = {
@@ -157,91 +357,142 @@ class _GStat(gobject.GObject):
              , linuxcnc.INTERP_IDLE: 'interp-idle'
              }
 
+    # The change detector.  Each entry computes one value of self.old
+    # from the stat fields it lists, and calls its emitter when the value
+    # changed.  An entry is only looked at when one of its fields changed
+    # since the last poll, and only computed when one of its signals has
+    # a handler (a skipped entry is computed again when one gets one);
+    # entries without signals are always kept up to date, because other
+    # methods use their values.
+    #     (key, fields, compute, signals, emitter)
+    # An emitter of None emits the first signal with the new value.
+    DETECTORS = (
+        ('state', ('task_state',), attrgetter('task_state'), (), '_emit_state'),
+        ('mode', ('task_mode',), attrgetter('task_mode'), (), '_emit_mode'),
+        ('interp', ('interp_state',), attrgetter('interp_state'), (), '_emit_interp'),
+        ('paused', ('paused',), attrgetter('paused'),
+            ('program-pause-changed',), None),
+        ('block-delete', ('block_delete',), attrgetter('block_delete'),
+            ('block-delete-changed',), None),
+        ('optional-stop', ('optional_stop',), attrgetter('optional_stop'),
+            ('optional-stop-changed',), None),
+        ('file', ('file',), attrgetter('file'), ('file-loaded',), '_emit_file'),
+        ('line', ('motion_line',), attrgetter('motion_line'),
+            ('line-changed',), None),
+        ('tool-in-spindle', ('tool_in_spindle',), attrgetter('tool_in_spindle'),
+            ('tool-in-spindle-changed',), None),
+        ('motion-mode', ('motion_mode',), attrgetter('motion_mode'),
+            ('motion-mode-changed',), None),
+        ('homed', ('homed', 'joints'), attrgetter('homed'), (), '_emit_homed'),
+        ('override-limits', ('joint', 'joints'), _override_limits,
+            ('override-limits-changed',), None),
+        ('current-feed-rate', ('current_vel',), lambda s: s.current_vel * 60.0,
+            ('current-feed-rate',), None),
+        ('current-x-rel-position',
+            ('actual_position', 'g5x_offset', 'tool_offset', 'g92_offset'),
+            lambda s: (s.actual_position[0] - s.g5x_offset[0]
+                       - s.tool_offset[0] - s.g92_offset[0]),
+            ('current-x-rel-position',), None),
+        ('current-position',
+            ('actual_position', 'dtg', 'g5x_offset', 'tool_offset',
+             'g92_offset', 'rotation_xy'),
+            _position, ('current-position',), '_emit_tuple'),
+        ('spindle-control', ('spindle',),
+            lambda s: (s.spindle[0]['enabled'], s.spindle[0]['direction']),
+            ('spindle-control-changed',), '_emit_tuple'),
+        ('spindle-speed', ('spindle',), lambda s: s.spindle[0]['speed'],
+            ('requested-spindle-speed-changed',), None),
+        ('spindle-or', ('spindle',), lambda s: s.spindle[0]['override'],
+            ('spindle-override-changed',), '_emit_percent'),
+        ('feed-or', ('feedrate',), attrgetter('feedrate'),
+            ('feed-override-changed',), '_emit_percent'),
+        ('rapid-or', ('rapidrate',), attrgetter('rapidrate'),
+            ('rapid-override-changed',), '_emit_percent'),
+        ('feed-hold', ('feed_hold_enabled',), attrgetter('feed_hold_enabled'),
+            ('feed-hold-enabled-changed',), None),
+        ('g5x-index', ('g5x_index',), attrgetter('g5x_index'),
+            ('user-system-changed',), None),
+        # modes are looked up in the raw G codes, they need no formatting
+        ('itime', ('gcodes',), lambda s: 930 in s.gcodes[1:], ('itime-mode',), None),
+        ('fpm', ('gcodes',), lambda s: 940 in s.gcodes[1:], ('fpm-mode',), None),
+        ('fpr', ('gcodes',), lambda s: 950 in s.gcodes[1:], ('fpr-mode',), None),
+        ('css', ('gcodes',), lambda s: 960 in s.gcodes[1:], ('css-mode',), None),
+        ('rpm', ('gcodes',), lambda s: 970 in s.gcodes[1:], ('rpm-mode',), None),
+        ('radius', ('gcodes',), lambda s: 80 in s.gcodes[1:], ('radius-mode',), None),
+        ('diameter', ('gcodes',), lambda s: 70 in s.gcodes[1:], ('diameter-mode',), None),
+        ('m-code', ('mcodes',), _mcode_string, ('m-code-changed',), None),
+        ('g-code', ('gcodes',), _gcode_string, ('g-code-changed',), None),
+        ('metric', ('gcodes',), lambda s: 210 in s.gcodes[1:],
+            ('metric-mode-changed',), None),
+        )
+
     def __init__(self, stat = None):
         gobject.GObject.__init__(self)
-        self.stat = stat or linuxcnc.stat()
+        hub = StatusHub()
+        self.stat = stat or hub.stat
         self.cmd = linuxcnc.command()
         self.old = {}
+        # signals that have handlers, see connect(); the detectors skipped
+        # because none of their signals had one, whose old value is stale
+        self._watched = set()
+        self._stale = set()
+        # the detectors with their emitters bound, and indexed by field
+        self._detectors = []
+        self._by_field = {}
+        for i, (key, fields, compute, signals, emitter) in enumerate(self.DETECTORS):
+            if emitter: emitter = getattr(self, emitter)
+            self._detectors.append((key, compute, signals, emitter))
+            for f in fields:
+                self._by_field.setdefault(f, []).append(i)
+        self._fields = tuple(self._by_field)
+        self._raw = {}
         try:
             self.stat.poll()
             self.merge()
         except:
             pass
-        gobject.timeout_add(100, self.update)
+        # share the poll of the status hub, unless given a stat of our own
+        if self.stat is hub.stat:
+            hub.subscribe(self.emit_changes, self._fields)
+        else:
+            gobject.timeout_add(100, self.update)
         self._current_jog_rate = 15
         self._is_all_homed = False
 
+    def _watch(self, signal):
+        signal = signal.replace('_', '-')
+        self._watched.add(signal)
+        # catch up on the detectors that were skipped, so that the first
+        # change after this emits against the current value
+        for i in list(self._stale):
+            key, compute, signals, emitter = self._detectors[i]
+            if signal in signals:
+                self.old[key] = compute(self.stat)
+                self._stale.discard(i)
+
+    def connect(self, signal, *args):
+        self._watch(signal)
+        return gobject.GObject.connect(self, signal, *args)
+
+    def connect_after(self, signal, *args):
+        self._watch(signal)
+        return gobject.GObject.connect_after(self, signal, *args)
+
+    def connect_object(self, signal, *args):
+        self._watch(signal)
+        return gobject.GObject.connect_object(self, signal, *args)
+
+    def connect_object_after(self, signal, *args):
+        self._watch(signal)
+        return gobject.GObject.connect_object_after(self, signal, *args)
+
     def merge(self):
-        self.old['state'] = self.stat.task_state
-        self.old['mode']  = self.stat.task_mode
-        self.old['interp']= self.stat.interp_state
-        # Only update file if call level is 0, which
-        # means we are not executing a subroutine/remap
-        # This avoids emiting signals for bogus file names below
-        if self.stat.call_level == 0:
-            self.old['file']  = self.stat.file
-        self.old['paused']= self.stat.paused
-        self.old['file']  = self.stat.file
-        self.old['line']  = self.stat.motion_line
-        self.old['homed'] = self.stat.homed
-        self.old['tool-in-spindle'] = self.stat.tool_in_spindle
-        self.old['motion-mode'] = self.stat.motion_mode
-        self.old['spindle-or'] = self.stat.spindle[0]['override']
-        self.old['feed-or'] = self.stat.feedrate
-        self.old['rapid-or'] = self.stat.rapidrate
-        self.old['feed-hold']  = self.stat.feed_hold_enabled
-        self.old['g5x-index']  = self.stat.g5x_index
-        self.old['spindle-enabled']  = self.stat.spindle[0]['enabled']
-        self.old['spindle-direction']  = self.stat.spindle[0]['direction']
-        self.old['block-delete']= self.stat.block_delete
-        self.old['optional-stop']= self.stat.optional_stop
-        self.old['spindle-speed']= self.stat.spindle[0]['speed']
-
-        # override limits
-        or_limit_list=[]
-        for j in range(0, self.stat.joints):
-            or_limit_list.append( self.stat.joint[j]['override_limits'])
-        self.old['override-limits'] = or_limit_list
-        # active G codes
-        active_gcodes = []
-        codes =''
-        for i in sorted(self.stat.gcodes[1:]):
-            if i == -1: continue
-            if i % 10 == 0:
-                    active_gcodes.append("G%d" % (i/10))
-            else:
-                    active_gcodes.append("G%d.%d" % (i/10, i%10))
-        for i in active_gcodes:
-            codes = codes +('%s '%i)
-        self.old['g-code'] = codes
-        # extract specific G code modes
-        itime = fpm = fpr = css = rpm = metric = False
-        radius = diameter = False
-        for num,i in enumerate(active_gcodes):
-            if i == 'G93': itime = True
-            elif i == 'G94': fpm = True
-            elif i == 'G95': fpr = True
-            elif i == 'G96': css = True
-            elif i == 'G97': rpm = True
-            elif i == 'G21': metric = True
-            elif i == 'G7': diameter  = True
-            elif i == 'G8': radius = True
-        self.old['itime'] = itime
-        self.old['fpm'] = fpm
-        self.old['fpr'] = fpr
-        self.old['css'] = css
-        self.old['rpm'] = rpm
-        self.old['metric'] = metric
-        self.old['radius'] = radius
-        self.old['diameter'] = diameter
-
-        # active M codes
-        active_mcodes = ''
-        for i in sorted(self.stat.mcodes[1:]):
-            if i == -1: continue
-            active_mcodes = active_mcodes + ("M%s "%i)
-            #active_mcodes.append("M%s "%i)
-        self.old['m-code'] = active_mcodes
+        '''Compute all the values of self.old, without emitting'''
+        for key, compute, signals, emitter in self._detectors:
+            self.old[key] = compute(self.stat)
+        self._stale.clear()
+        for f in self._fields:
+            self._raw[f] = getattr(self.stat, f)
 
     def update(self):
         try:
@@ -249,216 +500,108 @@ class _GStat(gobject.GObject):
         except:
             # Reschedule
             return True
-        old = dict(self.old)
-        self.merge()
+        self.emit_changes()
+        return True
 
-        state_old = old.get('state', 0)
-        state_new = self.old['state']
-        if not state_old:
-            if state_new > linuxcnc.STATE_ESTOP:
+    def emit_changes(self, stat=None, changed=None):
+        '''Emit the signals for the stat fields that changed
+
+        changed holds the fields that changed since the last call, as
+        reported by the status hub; if it is None, the fields are compared
+        with the ones seen last time.'''
+        stat = self.stat
+        if changed is None:
+            changed = []
+            raw = self._raw
+            for f in self._fields:
+                value = getattr(stat, f)
+                if f not in raw or raw[f] != value:
+                    raw[f] = value
+                    changed.append(f)
+        dirty = set()
+        for f in changed:
+            dirty.update(self._by_field.get(f, ()))
+        if not dirty: return
+
+        old = self.old
+        watched = self._watched
+        for i in sorted(dirty):
+            key, compute, signals, emitter = self._detectors[i]
+            if signals and watched.isdisjoint(signals):
+                self._stale.add(i)
+                continue
+            value = compute(stat)
+            previous = old.get(key)
+            if value == previous: continue
+            old[key] = value
+            if emitter:
+                emitter(signals and signals[0], previous, value)
+            else:
+                self.emit(signals[0], value)
+
+    def _emit_state(self, signal, old, new):
+        if not old:
+            if new > linuxcnc.STATE_ESTOP:
                 self.emit('state-estop-reset')
             else:
                 self.emit('state-estop')
             self.emit('state-off')
             self.emit('interp-idle')
-
-        if state_new != state_old:
-            if state_old == linuxcnc.STATE_ON and state_new < linuxcnc.STATE_ON:
-                self.emit('state-off')
-            self.emit(self.STATES[state_new])
-            if state_new == linuxcnc.STATE_ON:
-                old['mode'] = 0
-                old['interp'] = 0
-
-        mode_old = old.get('mode', 0)
-        mode_new = self.old['mode']
-        if mode_new != mode_old:
-            self.emit(self.MODES[mode_new])
-
-        interp_old = old.get('interp', 0)
-        interp_new = self.old['interp']
-        if interp_new != interp_old:
-            if not interp_old or interp_old == linuxcnc.INTERP_IDLE:
-                print "Emit", "interp-run"
-                self.emit('interp-run')
-            self.emit(self.INTERP[interp_new])
-        # paused
-        paused_old = old.get('paused', None)
-        paused_new = self.old['paused']
-        if paused_new != paused_old:
-            self.emit('program-pause-changed',paused_new)
-        # block delete
-        block_delete_old = old.get('block-delete', None)
-        block_delete_new = self.old['block-delete']
-        if block_delete_new != block_delete_old:
-            self.emit('block-delete-changed',block_delete_new)
-        # optional_stop
-        optional_stop_old = old.get('optionaL-stop', None)
-        optional_stop_new = self.old['optional-stop']
-        if optional_stop_new != optional_stop_old:
-            self.emit('optional-stop-changed',optional_stop_new)
-        # file changed
-        file_old = old.get('file', None)
-        file_new = self.old['file']
-        if file_new != file_old:
-            # if interpreter is reading or waiting, the new file
-            # is a remap procedure, with the following test we
-            # partly avoid emitting a signal in that case, which would cause
-            # a reload of the preview and sourceview widgets.  A signal could
-            # still be emitted if aborting a program shortly after it ran an
-            # external file subroutine, but that is fixed by not updating the
-            # file name if call level != 0 in the merge() function above.
-            if self.stat.interp_state == linuxcnc.INTERP_IDLE:
-                self.emit('file-loaded', file_new)
-
-        #ToDo : Find a way to avoid signal when the line changed due to 
-        #       a remap procedure, because the signal do highlight a wrong
-        #       line in the code
-        # current line
-        line_old = old.get('line', None)
-        line_new = self.old['line']
-        if line_new != line_old:
-            self.emit('line-changed', line_new)
-
-        tool_old = old.get('tool-in-spindle', None)
-        tool_new = self.old['tool-in-spindle']
-        if tool_new != tool_old:
-            self.emit('tool-in-spindle-changed', tool_new)
-
-        motion_mode_old = old.get('motion-mode', None)
-        motion_mode_new = self.old['motion-mode']
-        if motion_mode_new != motion_mode_old:
-            self.emit('motion-mode-changed', motion_mode_new)
-
-        # if the homed status has changed
-        # check number of homed joints against number of available joints
-        # if they are equal send the all-homed signal
-        # else send the not-all-homed signal (with a string of unhomed joint numbers)
-        # if a joint is homed send 'homed' (with a string of homed joint number)
-        homed_joint_old = old.get('homed', None)
-        homed_joint_new = self.old['homed']
-        if homed_joint_new != homed_joint_old:
-            homed_joints = 0
-            unhomed_joints = ""
-            for joint in range(0, self.stat.joints):
-                if self.stat.homed[joint]:
-                    homed_joints += 1
-                    self.emit('homed', joint)
-                else:
-                    unhomed_joints += str(joint)
-            if homed_joints == self.stat.joints:
-                self.emit('all-homed')
-                self._is_all_homed = True
+        if old == linuxcnc.STATE_ON and new < linuxcnc.STATE_ON:
+            self.emit('state-off')
+        self.emit(self.STATES[new])
+        if new == linuxcnc.STATE_ON:
+            # announce the mode and the interpreter state again
+            self.old['mode'] = self.stat.task_mode
+            self.old['interp'] = self.stat.interp_state
+            self._emit_mode(None, 0, self.old['mode'])
+            self._emit_interp(None, 0, self.old['interp'])
+
+    def _emit_mode(self, signal, old, new):
+        self.emit(self.MODES[new])
+
+    def _emit_interp(self, signal, old, new):
+        if not old or old == linuxcnc.INTERP_IDLE:
+            print "Emit", "interp-run"
+            self.emit('interp-run')
+        self.emit(self.INTERP[new])
+
+    def _emit_file(self, signal, old, new):
+        # if interpreter is reading or waiting, the new file
+        # is a remap procedure, with the following test we
+        # partly avoid emitting a signal in that case, which would cause
+        # a reload of the preview and sourceview widgets.  A signal could
+        # still be emitted if aborting a program shortly after it ran an
+        # external file subroutine.
+        if self.stat.interp_state == linuxcnc.INTERP_IDLE:
+            self.emit(signal, new)
+
+    # if the homed status has changed
+    # check number of homed joints against number of available joints
+    # if they are equal send the all-homed signal
+    # else send the not-all-homed signal (with a string of unhomed joint numbers)
+    # if a joint is homed send 'homed' (with a string of homed joint number)
+    def _emit_homed(self, signal, old, new):
+        homed_joints = 0
+        unhomed_joints = ""
+        for joint in range(0, self.stat.joints):
+            if new[joint]:
+                homed_joints += 1
+                self.emit('homed', joint)
             else:
-                self.emit('not-all-homed', unhomed_joints)
-                self._is_all_homed = False
-        # override limts
-        or_limits_old = old.get('override-limits', None)
-        or_limits_new = self.old['override-limits']
-        if or_limits_new != or_limits_old:
-            self.emit('override-limits-changed',or_limits_new)
-        # current velocity
-        self.emit('current-feed-rate',self.stat.current_vel * 60.0)
-        # X relative position
-        position = self.stat.actual_position[0]
-        g5x_offset = self.stat.g5x_offset[0]
-        tool_offset = self.stat.tool_offset[0]
-        g92_offset = self.stat.g92_offset[0]
-        self.emit('current-x-rel-position',position-g5x_offset-tool_offset-g92_offset)
-
-        # calculate position offsets (native units)
-        p,rel_p,dtg = self.get_position()
-        self.emit('current_position',p, rel_p, dtg)
-
-        # spindle control
-        spindle_enabled_old = old.get('spindle-enabled', None)
-        spindle_enabled_new = self.old['spindle-enabled']
-        spindle_direction_old = old.get('spindle-direction', None)
-        spindle_direction_new = self.old['spindle-direction']
-        if spindle_enabled_new != spindle_enabled_old or spindle_direction_new != spindle_direction_old:
-            self.emit('spindle-control-changed', spindle_enabled_new, spindle_direction_new)
-        # requested spindle speed
-        spindle_spd_old = old.get('spindle-speed', None)
-        spindle_spd_new = self.old['spindle-speed']
-        if spindle_spd_new != spindle_spd_old:
-            self.emit('requested-spindle-speed-changed', spindle_spd_new)
-        # spindle override
-        spindle_or_old = old.get('spindle-or', None)
-        spindle_or_new = self.old['spindle-or']
-        if spindle_or_new != spindle_or_old:
-            self.emit('spindle-override-changed',spindle_or_new * 100)
-        # feed override
-        feed_or_old = old.get('feed-or', None)
-        feed_or_new = self.old['feed-or']
-        if feed_or_new != feed_or_old:
-            self.emit('feed-override-changed',feed_or_new * 100)
-        # rapid override
-        rapid_or_old = old.get('rapid-or', None)
-        rapid_or_new = self.old['rapid-or']
-        if rapid_or_new != rapid_or_old:
-            self.emit('rapid-override-changed',rapid_or_new * 100)
-        # feed hold
-        feed_hold_old = old.get('feed-hold', None)
-        feed_hold_new = self.old['feed-hold']
-        if feed_hold_new != feed_hold_old:
-            self.emit('feed-hold-enabled-changed',feed_hold_new)
-        # G5x (active user system)
-        g5x_index_old = old.get('g5x-index', None)
-        g5x_index_new = self.old['g5x-index']
-        if g5x_index_new != g5x_index_old:
-            self.emit('user-system-changed',g5x_index_new)
-        # inverse time mode g93
-        itime_old = old.get('itime', None)
-        itime_new = self.old['itime']
-        if itime_new != itime_old:
-            self.emit('itime-mode',itime_new)
-        # feed per minute mode g94
-        fpm_old = old.get('fpm', None)
-        fpm_new = self.old['fpm']
-        if fpm_new != fpm_old:
-            self.emit('fpm-mode',fpm_new)
-        # feed per revolution mode g95
-        fpr_old = old.get('fpr', None)
-        fpr_new = self.old['fpr']
-        if fpr_new != fpr_old:
-            self.emit('fpr-mode',fpr_new)
-        # css mode g96
-        css_old = old.get('css', None)
-        css_new = self.old['css']
-        if css_new != css_old:
-            self.emit('css-mode',css_new)
-        # rpm mode g97
-        rpm_old = old.get('rpm', None)
-        rpm_new = self.old['rpm']
-        if rpm_new != rpm_old:
-            self.emit('rpm-mode',rpm_new)
-        # radius mode g8
-        radius_old = old.get('radius', None)
-        radius_new = self.old['radius']
-        if radius_new != radius_old:
-            self.emit('radius-mode',radius_new)
-        # diameter mode g7
-        diam_old = old.get('diameter', None)
-        diam_new = self.old['diameter']
-        if diam_new != diam_old:
-            self.emit('diameter-mode',diam_new)
-        # M codes
-        m_code_old = old.get('m-code', None)
-        m_code_new = self.old['m-code']
-        if m_code_new != m_code_old:
-            self.emit('m-code-changed',m_code_new)
-        # G codes
-        g_code_old = old.get('g-code', None)
-        g_code_new = self.old['g-code']
-        if g_code_new != g_code_old:
-            self.emit('g-code-changed',g_code_new)
-        # metric mode g21
-        metric_old = old.get('metric', None)
-        metric_new = self.old['metric']
-        if metric_new != metric_old:
-            self.emit('metric-mode-changed',metric_new)
-        # AND DONE... Return true to continue timeout
-        return True
+                unhomed_joints += str(joint)
+        if homed_joints == self.stat.joints:
+            self.emit('all-homed')
+            self._is_all_homed = True
+        else:
+            self.emit('not-all-homed', unhomed_joints)
+            self._is_all_homed = False
+
+    def _emit_percent(self, signal, old, new):
+        self.emit(signal, new * 100)
+
+    def _emit_tuple(self, signal, old, new):
+        self.emit(signal, *new)
 
     def forced_update(self):
         print 'Gstat forced update!'
@@ -526,39 +669,7 @@ class _GStat(gobject.GObject):
 
     # ********** Helper function ********************
     def get_position(self):
-        p = self.stat.actual_position
-        mp = self.stat.position
-        dtg = self.stat.dtg
-
-        x = p[0] - self.stat.g5x_offset[0] - self.stat.tool_offset[0]
-        y = p[1] - self.stat.g5x_offset[1] - self.stat.tool_offset[1]
-        z = p[2] - self.stat.g5x_offset[2] - self.stat.tool_offset[2]
-        a = p[3] - self.stat.g5x_offset[3] - self.stat.tool_offset[3]
-        b = p[4] - self.stat.g5x_offset[4] - self.stat.tool_offset[4]
-        c = p[5] - self.stat.g5x_offset[5] - self.stat.tool_offset[5]
-        u = p[6] - self.stat.g5x_offset[6] - self.stat.tool_offset[6]
-        v = p[7] - self.stat.g5x_offset[7] - self.stat.tool_offset[7]
-        w = p[8] - self.stat.g5x_offset[8] - self.stat.tool_offset[8]
-
-        if self.stat.rotation_xy != 0:
-            t = math.radians(-self.stat.rotation_xy)
-            xr = x * math.cos(t) - y * math.sin(t)
-            yr = x * math.sin(t) + y * math.cos(t)
-            x = xr
-            y = yr
-
-        x -= self.stat.g92_offset[0] 
-        y -= self.stat.g92_offset[1] 
-        z -= self.stat.g92_offset[2] 
-        a -= self.stat.g92_offset[3] 
-        b -= self.stat.g92_offset[4] 
-        c -= self.stat.g92_offset[5] 
-        u -= self.stat.g92_offset[6] 
-        v -= self.stat.g92_offset[7] 
-        w -= self.stat.g92_offset[8] 
-
-        relp = [x, y, z, a, b, c, u, v, w]
-        return p,relp,dtg
+        return _position(self.stat)
 
     def set_jograte(self,upm):
         self._current_jog_rate = upm
@@ -665,3 +776,9 @@ class GStat(_GStat):
         if not cls._instance:
             cls._instance = _GStat.__new__(cls, *args, **kwargs)
         return cls._instance
+
+    def __init__(self, stat=None):
+        # the instance is shared, so only initialize it once
+        if '_initialized' in self.__dict__: return
+        self._initialized = True
+        _GStat.__init__(self, stat)
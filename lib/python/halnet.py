@@ -0,0 +1,162 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""The connection graph of a HAL file
+
+A Netlist records what a HAL file connects rather than how it is written:
+which pins are on each signal and in which direction, the setp/sets values,
+the components loaded and the functions added to each thread.  Two
+netlists can be compared with diff(), so generated configurations can be
+checked for structural changes without caring about comments, spacing or
+the order of the lines.
+
+    python halnet.py old.hal new.hal
+"""
+
+import sys
+
+ARROWS = ("<=", "=>", "<=>")
+
+class Netlist:
+    def __init__(self):
+        self.signals = {}   # signal -> [(arrow, pin)], in the order linked
+        self.pins = {}      # pin -> signal
+        self.params = {}    # setp pin or parameter -> value
+        self.values = {}    # sets signal -> value
+        self.functions = [] # (function, thread) in addf order
+        self.loaded = []    # loadrt / loadusr command lines
+
+    def net(self, signal, *args):
+        """Link pins to signal as halcmd's 'net' does.
+
+        An arrow applies to the pins after it, and a pin right before '=>'
+        writes the signal as if it had '<=' in front of it.  Other pins
+        written without an arrow have no known direction and are recorded
+        with arrow None."""
+        links = self.signals.setdefault(signal, [])
+        arrow = None
+        for i, a in enumerate(args):
+            if a in ARROWS:
+                arrow = a
+                continue
+            old = self.pins.get(a)
+            if old is not None and old != signal:
+                raise ValueError, "pin %s is already linked to %s" % (a, old)
+            if old is None:
+                self.pins[a] = signal
+                if args[i+1:i+2] == ("=>",):
+                    links.append(("<=", a))
+                else:
+                    links.append((arrow, a))
+
+    def setp(self, name, value):
+        self.params[name] = value
+
+    def sets(self, signal, value):
+        self.values[signal] = value
+
+    def driver(self, signal):
+        """The pin writing signal, or None"""
+        for arrow, pin in self.signals.get(signal, ()):
+            if arrow == "<=": return pin
+        return None
+
+    def readers(self, signal):
+        """The pins reading signal"""
+        return [pin for arrow, pin in self.signals.get(signal, ())
+                    if arrow == "=>"]
+
+    def signal_of(self, pin):
+        """The signal pin is linked to, or None"""
+        return self.pins.get(pin)
+
+    def parse(self, text, filename="<string>"):
+        """Add the commands in the HAL text to the netlist
+
+        Only the commands that make up the graph are looked at; anything
+        else halcmd accepts is skipped."""
+        lines = text.splitlines()
+        lineno = 0
+        while lineno < len(lines):
+            line = lines[lineno].split("#", 1)[0].strip()
+            lineno += 1
+            while line.endswith("\\") and lineno < len(lines):
+                line = line[:-1] + " " + lines[lineno].split("#", 1)[0].strip()
+                lineno += 1
+            words = line.split()
+            if not words: continue
+            cmd = words[0]
+            try:
+                if cmd == "net" and len(words) > 1:
+                    self.net(*words[1:])
+                elif cmd == "setp" and len(words) > 2:
+                    self.setp(words[1], " ".join(words[2:]))
+                elif cmd == "sets" and len(words) > 2:
+                    self.sets(words[1], " ".join(words[2:]))
+                elif cmd == "addf" and len(words) > 2:
+                    self.functions.append((words[1], words[2]))
+                elif cmd in ("loadrt", "loadusr"):
+                    self.loaded.append(" ".join(words))
+            except ValueError, detail:
+                raise ValueError, "%s:%d: %s" % (filename, lineno, detail)
+
+    def read(self, filename):
+        self.parse(open(filename).read(), filename)
+
+    def items(self):
+        """Every connection and setting in the netlist as (kind, item)"""
+        for signal, links in self.signals.items():
+            if not links:
+                yield "net", (signal,)
+            for arrow, pin in links:
+                yield "net", (signal, arrow or "", pin)
+        for name, value in self.params.items():
+            yield "setp", (name, value)
+        for signal, value in self.values.items():
+            yield "sets", (signal, value)
+        for function, thread in self.functions:
+            yield "addf", (function, thread)
+        for command in self.loaded:
+            yield "load", (command,)
+
+    def diff(self, other):
+        """What changes between this netlist and other
+
+        Returns a sorted list of ('-', kind, item) for what is only in this
+        netlist and ('+', kind, item) for what is only in other.  The order
+        of functions within a thread is not compared."""
+        mine = set(self.items())
+        theirs = set(other.items())
+        result = [("-",) + i for i in mine - theirs]
+        result.extend([("+",) + i for i in theirs - mine])
+        result.sort(key=lambda r: (r[1], r[2], r[0]))
+        return result
+
+def read(filename):
+    n = Netlist()
+    n.read(filename)
+    return n
+
+def format_diff(changes):
+    return ["%s %s %s" % (op, kind, " ".join([w for w in item if w]))
+                for op, kind, item in changes]
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print >>sys.stderr, "Usage: %s old.hal new.hal" % sys.argv[0]
+        raise SystemExit, 2
+    changes = read(sys.argv[1]).diff(read(sys.argv[2]))
+    for line in format_diff(changes):
+        print line
+    raise SystemExit, bool(changes)
@@ -837,6 +837,14 @@ manpage"""
         "No input device matching %r was found (%d devices checked)" 
             % (pattern, successful_opens))
 
+def encode(type, name):
+    """Return the number of the code called name of the event type"""
+    if type == 'EV_KEY': return KEY.get(name, BTN.get(name))
+    if type == 'EV_ABS': return ABS[name]
+    if type == 'EV_REL': return REL[name]
+    if type == 'EV_LED': return LED[name]
+    raise ValueError, "encode: unexpected type %s" % type
+
 def decode(map, mapname, code):
     if isinstance(code, str): return code
     if code in map: return map[code]
@@ -870,5 +878,13 @@ class InputDevice:
 	elif e.type == 'EV_LED': e.code = decode(LED_invert, 'LED', e.code)
 	return e
 
+    def read_events(self, count=64):
+	"""Read the events waiting on the device, at most count, with one
+	read.  Returns a list of (type, code, value) tuples of numbers."""
+	buf = os.read(self.f, Event.size * count)
+	n = len(buf) // Event.size
+	data = struct.unpack(Event.format * n, buf[:n * Event.size])
+	return [data[i+2:i+5] for i in range(0, len(data), 5)]
+
     def write_event(self, *args):
 	Event.write(self.f, *args)
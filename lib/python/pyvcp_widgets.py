@@ -53,6 +53,11 @@ import math
 import bwidget
 import time
 
+# Indicators that only show the values of HAL input pins list those pins in
+# 'halinputs'.  vcpparse.updater() then calls their update() only when one
+# of those pins has changed.  Widgets without 'halinputs' are updated on
+# every pass.
+
 # -------------------------------------------
 
 
@@ -402,6 +407,7 @@ class pyvcp_meter(Canvas):
             self.halpin = "meter."+str(pyvcp_meter.n)+".value"
             pyvcp_meter.n += 1
         pycomp.newpin(self.halpin, HAL_FLOAT, HAL_IN)
+        self.halinputs = [self.halpin]
         self.value = pycomp[self.halpin]
     
     def rad2deg(self, rad): return rad*180/math.pi
@@ -656,6 +662,7 @@ class pyvcp_label(Label):
     def __init__(self,master,pycomp,halpin=None,disable_pin=False,**kw):
         Label.__init__(self,master,**kw)
         self.disable_pin=disable_pin
+        self.halinputs = []
         if disable_pin:
             if halpin == None:
                 halpin = "label."+str(pyvcp_label.n) 
@@ -663,6 +670,7 @@ class pyvcp_label(Label):
             halpin_disable = halpin+".disable"
             self.halpin_disable = halpin_disable
             pycomp.newpin(halpin_disable, HAL_BIT, HAL_IN)   
+            self.halinputs.append(halpin_disable)
         
     def update(self,pycomp):
         if self.disable_pin: 
@@ -771,6 +779,7 @@ class pyvcp_vbox(Frame):
         self.anchor = 'center'
         self.expand = 'yes'
 
+    halinputs = ()
     def update(self,pycomp): 
         pass
 
@@ -789,16 +798,19 @@ class pyvcp_vbox(Frame):
 class pyvcp_boxfill:
     def __init__(self, master, pycomp, fill):
         self.fill = fill
+    halinputs = ()
     def update(self, pycomp): pass
 
 class pyvcp_boxanchor:
     def __init__(self, master, pycomp, anchor):
         self.anchor = anchor
+    halinputs = ()
     def update(self, pycomp): pass
 
 class pyvcp_boxexpand:
     def __init__(self, master, pycomp, expand):
         self.expand = expand
+    halinputs = ()
     def update(self, pycomp): pass
 
 # -------------------------------------------
@@ -818,6 +830,7 @@ class pyvcp_hbox(Frame):
         self.anchor = 'center'
         self.expand = 'yes'
 
+    halinputs = ()
     def update(self,pycomp): 
         pass
 
@@ -840,6 +853,7 @@ class pyvcp_labelframe(LabelFrame):
     def __init__(self,master,pycomp,**kw):
         LabelFrame.__init__(self,master,**kw)
         self.pack(expand=1,fill=BOTH)
+    halinputs = ()
     def update(self,pycomp):
         pass
     def add(self, container, widget):
@@ -852,6 +866,7 @@ class pyvcp_tabs(bwidget.NoteBook):
         self._require(master)
         Widget.__init__(self, master, "NoteBook", cnf, kw)
 
+    halinputs = ()
     def update(self, pycomp): pass
 
     def add(self, container, child):
@@ -984,6 +999,7 @@ class pyvcp_number(Label):
         dummy = "%(b)"+self.format
         self.v.set( str( dummy  % {'b':self.value} ) )
         pycomp.newpin(halpin, HAL_FLOAT, HAL_IN)
+        self.halinputs = [halpin]
 
     def update(self,pycomp):    
         newvalue = pycomp[self.halpin]
@@ -1008,6 +1024,7 @@ class pyvcp_u32(Label):
         dummy = "%(b)"+self.format
         self.v.set( str( dummy  % {'b':self.value} ) )
         pycomp.newpin(halpin, HAL_U32, HAL_IN)
+        self.halinputs = [halpin]
 
     def update(self,pycomp):    
         newvalue = pycomp[self.halpin]
@@ -1032,6 +1049,7 @@ class pyvcp_s32(Label):
         dummy = "%(b)"+self.format
         self.v.set( str( dummy  % {'b':self.value} ) )
         pycomp.newpin(halpin, HAL_S32, HAL_IN)
+        self.halinputs = [halpin]
 
     def update(self,pycomp):    
         newvalue = pycomp[self.halpin]
@@ -1141,6 +1159,7 @@ class pyvcp_bar(Canvas):
         self.format = "%" + format
 
         pycomp.newpin(halpin, HAL_FLOAT, HAL_IN)
+        self.halinputs = [halpin]
         
         self.value=0.0 # some dummy value to start with  
              
@@ -1253,9 +1272,11 @@ class pyvcp_led(Canvas):
             pyvcp_led.n+=1
         self.halpin=halpin
         pycomp.newpin(halpin, HAL_BIT, HAL_IN)
+        self.halinputs = [halpin]
         if disable_pin:
             halpin_disable = halpin+".disable"
             self.halpin_disable = halpin_disable
+            self.halinputs.append(halpin_disable)
             pycomp.newpin(halpin_disable, HAL_BIT, HAL_IN)       
         
 
@@ -1303,9 +1324,11 @@ class pyvcp_rectled(Canvas):
             pyvcp_led.n+=1     
         self.halpin=halpin
         pycomp.newpin(halpin, HAL_BIT, HAL_IN)
+        self.halinputs = [halpin]
         if disable_pin:
             halpin_disable = halpin+".disable"
             self.halpin_disable = halpin_disable
+            self.halinputs.append(halpin_disable)
             pycomp.newpin(halpin_disable, HAL_BIT, HAL_IN)   
         
 
@@ -1554,20 +1577,24 @@ class pyvcp_table(Frame):
         self.span = 1,1
         self._c = c+cs
 
+    halinputs = ()
     def update(self, pycomp): pass
 
 class pyvcp_tablerow:
     def __init__(self, master, pycomp): pass
+    halinputs = ()
     def update(self, pycomp): pass
 
 class pyvcp_tablespan:
     def __init__(self, master, pycomp, rows=1, columns=1):
         self.span = rows, columns
+    halinputs = ()
     def update(self, pycomp): pass
 
 class pyvcp_tablesticky:
     def __init__(self, master, pycomp, sticky):
         self.sticky = sticky
+    halinputs = ()
     def update(self, pycomp): pass
     
 class pyvcp_include(Frame):
@@ -1605,6 +1632,7 @@ class pyvcp_include(Frame):
         if prefix is not None:
             pycomp.setprefix(oldprefix)
 
+    halinputs = ()
     def update(self, pycomp): pass
 
     def add(self, container, widget):
@@ -1612,6 +1640,7 @@ class pyvcp_include(Frame):
 
 class _pyvcp_dummy:
     def add(self, container, widget): pass
+    halinputs = ()
     def update(self, pycomp): pass
     def pack(self, *args, **kw): pass
 
@@ -1646,6 +1675,7 @@ class _pyvcp_image(Label):
         self.value = 0
         self.last = None
         pycomp.newpin(halpin, self.pintype, HAL_IN)
+        self.halinputs = [halpin]
 
     def update(self, pycomp):
         l = pycomp[self.halpin]
@@ -185,92 +185,88 @@ If 'plane' is specified as 17, 18, or 19, it may find helical arcs in the given
 plane in addition to lines.  Note that if there is movement in the plane
 perpendicular to the arc, it will be distorted, so 'plane' should usually
 be specified only when there is only movement on 2 axes
+
+The path is divided with a stack of index ranges rather than by recursion,
+so there is no limit on its length and no part of it is copied.
 """
     if len(st) == 1:
         yield "G1", st[0], None
         return
 
-    l1 = st[0]
-    l2 = st[-1]
-    
-    worst_dist = 0
-    worst = 0
-    min_rad = sys.maxint
-    max_arc = -1
-
-    ps = st[0]
-    pe = st[-1]
-
-    for i, p in enumerate(st): 
-        if p is l1 or p is l2: continue
-        dist = dist_lseg(l1, l2, p)
-        if dist > worst_dist:
-            worst = i
-            worst_dist = dist
-	    rad = arc_rad(plane, ps, p, pe)
-	    #print >>sys.stderr, "rad", rad, max_arc, min_rad
-	    if rad < min_rad:
-		max_arc = i
-		min_rad = rad
-
-    worst_arc_dist = 0
-    if min_rad != sys.maxint:
-	c1, c2 = arc_center(plane, ps, st[max_arc], pe)
-	lx, ly, lz = st[0]
-	if one_quadrant(plane, (c1, c2), ps, st[max_arc], pe):
-	    for i, (x,y,z) in enumerate(st):
-		if plane == 17: dist = abs(math.hypot(c1-x, c2-y) - min_rad)
-		elif plane == 18: dist = abs(math.hypot(c1-x, c2-z) - min_rad)
-		elif plane == 19: dist = abs(math.hypot(c1-y, c2-z) - min_rad)
-		else: dist = sys.maxint
-		#print >>sys.stderr, "wad", dist, worst_arc_dist
-		if dist > worst_arc_dist: worst_arc_dist = dist
-
-		mx = (x+lx)/2
-		my = (y+ly)/2
-		mz = (z+lz)/2
-		if plane == 17: dist = abs(math.hypot(c1-mx, c2-my) - min_rad)
-		elif plane == 18: dist = abs(math.hypot(c1-mx, c2-mz) - min_rad)
-		elif plane == 19: dist = abs(math.hypot(c1-my, c2-mz) - min_rad)
-		else: dist = sys.maxint
-		#if dist > worst_arc_dist: worst_arc_dist = dist
-
-		lx, ly, lz = x, y, z
-	else:
-	    worst_arc_dist = sys.maxint
-
-    else:
-	worst_arc_dist = sys.maxint
-
-    #if worst_arc_dist != sys.maxint:
-	#print >>sys.stderr, "douglas", len(st), "\n\t", st[0], "\n\t", st[max_arc], "\n\t", st[-1]
-	#print >>sys.stderr, "\t", worst_arc_dist, worst_dist
-	#print >>sys.stderr, "\t", c1, c2
-    if worst_arc_dist < tolerance and worst_arc_dist < worst_dist:
-	ccw = arc_dir(plane, (c1, c2), ps, st[max_arc], pe)
-	if plane == 18: ccw = not ccw # wtf?
-	yield "G1", ps, None
-	if ccw:
-	    yield "G3", st[-1], arc_fmt(plane, c1, c2, ps)
-	else:
-	    yield "G2", st[-1], arc_fmt(plane, c1, c2, ps)
-    elif worst_dist > tolerance:
-	if _first: yield "G1", st[0], None
-        for i in douglas(st[:worst+1], tolerance, plane, False):
-            yield i
-        yield "G1", st[worst], None
-        for i in douglas(st[worst:], tolerance, plane, False):
-            yield i
-	if _first: yield "G1", st[-1], None
-    else:
-	if _first: yield "G1", st[0], None
-	if _first: yield "G1", st[-1], None
+    # what is left to do, last first: (lo, hi, first) to simplify the
+    # points st[lo] to st[hi], or (None, move, None) to yield a move
+    todo = [(0, len(st)-1, _first)]
+    while todo:
+        lo, hi, first = todo.pop()
+        if lo is None:
+            yield hi
+            continue
+
+        l1 = ps = st[lo]
+        l2 = pe = st[hi]
+
+        worst_dist = 0
+        worst = 0
+        min_rad = sys.maxint
+        max_arc = -1
+
+        for i in xrange(lo, hi+1):
+            p = st[i]
+            if p is l1 or p is l2: continue
+            dist = dist_lseg(l1, l2, p)
+            if dist > worst_dist:
+                worst = i
+                worst_dist = dist
+                rad = arc_rad(plane, ps, p, pe)
+                if rad < min_rad:
+                    max_arc = i
+                    min_rad = rad
+
+        worst_arc_dist = 0
+        if min_rad != sys.maxint:
+            c1, c2 = arc_center(plane, ps, st[max_arc], pe)
+            if one_quadrant(plane, (c1, c2), ps, st[max_arc], pe):
+                for i in xrange(lo, hi+1):
+                    x, y, z = st[i]
+                    if plane == 17: dist = abs(math.hypot(c1-x, c2-y) - min_rad)
+                    elif plane == 18: dist = abs(math.hypot(c1-x, c2-z) - min_rad)
+                    elif plane == 19: dist = abs(math.hypot(c1-y, c2-z) - min_rad)
+                    else: dist = sys.maxint
+                    if dist > worst_arc_dist: worst_arc_dist = dist
+            else:
+                worst_arc_dist = sys.maxint
+        else:
+            worst_arc_dist = sys.maxint
+
+        if worst_arc_dist < tolerance and worst_arc_dist < worst_dist:
+            ccw = arc_dir(plane, (c1, c2), ps, st[max_arc], pe)
+            if plane == 18: ccw = not ccw # wtf?
+            yield "G1", ps, None
+            if ccw:
+                yield "G3", pe, arc_fmt(plane, c1, c2, ps)
+            else:
+                yield "G2", pe, arc_fmt(plane, c1, c2, ps)
+        elif worst_dist > tolerance:
+            if first:
+                yield "G1", ps, None
+                todo.append((None, ("G1", pe, None), None))
+            todo.append((worst, hi, False))
+            todo.append((None, ("G1", st[worst], None), None))
+            todo.append((lo, worst, False))
+        else:
+            if first: yield "G1", ps, None
+            if first: yield "G1", pe, None
 
 class Gcode:
-    "For creating rs274ngc files"
+    """For creating rs274ngc files
+
+Each line is passed to 'target' as soon as it is made.  'cut' moves are
+held until the next flush; if 'lookahead' is given, they are also flushed
+whenever that many are held, so the memory used stays bounded however
+long the path is, at the price of keeping one point in every 'lookahead'."""
     def __init__(self, homeheight = 1.5, safetyheight = 0.04, tolerance=0.001,
             spindle_speed=1000, units="G20",
-            target=lambda s: sys.stdout.write(s + "\n")):
+            target=lambda s: sys.stdout.write(s + "\n"), lookahead=None):
         self.lastx = self.lasty = self.lastz = self.lasta = None
         self.lastgcode = self.lastfeed = None
         self.homeheight = homeheight
@@ -278,6 +274,7 @@ class Gcode:
         self.tolerance = tolerance
         self.units = units
         self.cuts = []
+        self.lookahead = lookahead
         self.write = target
         self.time = 0
         self.spindle_speed = spindle_speed
@@ -313,7 +310,15 @@ that the last 'cut' coordinate is actually in the output file, and it may
 give better performance because this means that the simplification algorithm
 will examine fewer points per run."""
         if not self.cuts: return
-        for move, (x, y, z), cent in douglas(self.cuts, self.tolerance, self.plane):
+        self.moves(douglas(self.cuts, self.tolerance, self.plane))
+        self.cuts = []
+
+    def moves(self, moves):
+	"""\
+Output the moves made by 'douglas', which may have been run elsewhere (for
+instance in another process) on cut moves that were never given to this
+object."""
+        for move, (x, y, z), cent in moves:
 	    if cent:
 		self.write("%s X%.4f Y%.4f Z%.4f %s" % (move, x, y, z, cent))
 		self.lastgcode = None
@@ -322,7 +327,6 @@ will examine fewer points per run."""
 		self.lastz = z
 	    else:
 		self.move_common(x, y, z, gcode="G1")
-        self.cuts = []
 
     def end(self):
 	"""End the program"""
@@ -391,6 +395,8 @@ the simplification algorithm may still skip over specified points."""
         if y is None: y = lasty
         if z is None: z = lastz
         self.cuts.append([x,y,z])
+        if self.lookahead and len(self.cuts) >= self.lookahead:
+            self.flush()
 
     def home(self):
 	"Go to the 'home' height at rapid speed"
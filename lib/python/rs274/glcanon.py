@@ -16,6 +16,10 @@
 #    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 from rs274 import Translated, ArcsToSegmentsMixin, OpenGLTk
+from rs274.segments import SegmentList, ToolOffsetTable, START, END
+import rs274.segments
+import rs274.vertexbuffer
+import rs274.pickindex
 from minigl import *
 import math
 import glnav
@@ -25,6 +29,8 @@ import array
 import gcode
 import os
 import re
+import sys
+import threading
 
 def minmax(*args):
     return min(*args), max(*args)
@@ -79,12 +85,14 @@ limiticon = array.array('B',
 class GLCanon(Translated, ArcsToSegmentsMixin):
     lineno = -1
     def __init__(self, colors, geometry, is_foam=0):
+        # the tool offsets used by the program, shared by the segment lists
+        self.tool_offsets = ToolOffsetTable()
         # traverse list - [line number, [start position], [end position], [tlo x, tlo y, tlo z]]
-        self.traverse = []; self.traverse_append = self.traverse.append
+        self.traverse = SegmentList(self.tool_offsets, False); self.traverse_add = self.traverse.add
         # feed list - [line number, [start position], [end position], feedrate, [tlo x, tlo y, tlo z]]
-        self.feed = []; self.feed_append = self.feed.append
+        self.feed = SegmentList(self.tool_offsets); self.feed_add = self.feed.add
         # arcfeed list - [line number, [start position], [end position], feedrate, [tlo x, tlo y, tlo z]]
-        self.arcfeed = []; self.arcfeed_append = self.arcfeed.append
+        self.arcfeed = SegmentList(self.tool_offsets); self.arcfeed_add = self.arcfeed.add
         # dwell list - [line number, color, pos x, pos y, pos z, plane]
         self.dwells = []; self.dwells_append = self.dwells.append
         self.choice = None
@@ -99,8 +107,14 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         self.colors = colors
         self.in_arc = 0
         self.xo = self.yo = self.zo = self.ao = self.bo = self.co = self.uo = self.vo = self.wo = 0
+        self.tlo_index = self.tool_offsets.add(0, 0, 0)
         self.dwell_time = 0
         self.suppress = 0
+        self._pick_index = None
+        self._pick_index_key = None
+        self._dwell_index = None
+        # [((traverse, feed, arcfeed counts), tool number)] at each M6
+        self.tool_changes = []
         self.g92_offset_x = 0.0
         self.g92_offset_y = 0.0
         self.g92_offset_z = 0.0
@@ -165,7 +179,12 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         self.lineno = self.state.sequence_number
 
     def draw_lines(self, lines, for_selection, j=0, geometry=None):
-        return linuxcnc.draw_lines(geometry or self.geometry, lines, for_selection)
+        geometry = geometry or self.geometry
+        if isinstance(lines, SegmentList):
+            for chunk in lines.chunks():
+                linuxcnc.draw_lines(geometry, chunk, for_selection)
+        else:
+            linuxcnc.draw_lines(geometry, lines, for_selection)
 
     def colored_lines(self, color, lines, for_selection, j=0):
         if self.is_foam:
@@ -190,7 +209,7 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         return linuxcnc.draw_dwells(self.geometry, dwells, alpha, for_selection, self.is_lathe())
 
     def calc_extents(self):
-        self.min_extents, self.max_extents, self.min_extents_notool, self.max_extents_notool = gcode.calc_extents(self.arcfeed, self.feed, self.traverse)
+        self.min_extents, self.max_extents, self.min_extents_notool, self.max_extents_notool = rs274.segments.calc_extents(self.arcfeed, self.feed, self.traverse)
         if self.is_foam:
             min_z = min(self.foam_z, self.foam_w)
             max_z = max(self.foam_z, self.foam_w)
@@ -214,6 +233,7 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         self.uo = uo
         self.vo = vo
         self.wo = wo
+        self.tlo_index = self.tool_offsets.add(xo, yo, zo)
 
     def set_spindle_rate(self, arg): pass
     def set_feed_rate(self, arg): self.feedrate = arg / 60.
@@ -221,12 +241,15 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
 
     def change_tool(self, arg):
         self.first_move = True
+        # arg is the pocket of the tool about to be loaded
+        tool = self.get_tool(arg)[0] if arg else -1
+        self.tool_changes.append((self.segment_counts()[:3], tool))
 
     def straight_traverse(self, x,y,z, a,b,c, u, v, w):
         if self.suppress > 0: return
         l = self.rotate_and_translate(x,y,z,a,b,c,u,v,w)
         if not self.first_move:
-                self.traverse_append((self.lineno, self.lo, l, [self.xo, self.yo, self.zo]))
+                self.traverse_add(self.lineno, self.lo, l, 0, self.tlo_index)
         self.lo = l
 
     def rigid_tap(self, x, y, z):
@@ -235,9 +258,9 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         l = self.rotate_and_translate(x,y,z,0,0,0,0,0,0)[:3]
         l += [self.lo[3], self.lo[4], self.lo[5],
                self.lo[6], self.lo[7], self.lo[8]]
-        self.feed_append((self.lineno, self.lo, l, self.feedrate, [self.xo, self.yo, self.zo]))
+        self.feed_add(self.lineno, self.lo, l, self.feedrate, self.tlo_index)
 #        self.dwells_append((self.lineno, self.colors['dwell'], x + self.offset_x, y + self.offset_y, z + self.offset_z, 0))
-        self.feed_append((self.lineno, l, self.lo, self.feedrate, [self.xo, self.yo, self.zo]))
+        self.feed_add(self.lineno, l, self.lo, self.feedrate, self.tlo_index)
 
     def arc_feed(self, *args):
         if self.suppress > 0: return
@@ -253,10 +276,10 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         lo = self.lo
         lineno = self.lineno
         feedrate = self.feedrate
-        to = [self.xo, self.yo, self.zo]
-        append = self.arcfeed_append
+        tool = self.tlo_index
+        add = self.arcfeed_add
         for l in segs:
-            append((lineno, lo, l, feedrate, to))
+            add(lineno, lo, l, feedrate, tool)
             lo = l
         self.lo = lo
 
@@ -264,7 +287,7 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         if self.suppress > 0: return
         self.first_move = False
         l = self.rotate_and_translate(x,y,z,a,b,c,u,v,w)
-        self.feed_append((self.lineno, self.lo, l, self.feedrate, [self.xo, self.yo, self.zo]))
+        self.feed_add(self.lineno, self.lo, l, self.feedrate, self.tlo_index)
         self.lo = l
     straight_probe = straight_feed
 
@@ -280,30 +303,39 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         self.dwells_append((self.lineno, color, self.lo[0], self.lo[1], self.lo[2], self.state.plane/10-17))
 
 
+    def line_segments(self, lineno):
+        """Return the (start, end) pairs of the moves of line lineno"""
+        result = []
+        for segments in (self.traverse, self.arcfeed, self.feed):
+            indices = segments.line_indices(lineno)
+            if not indices: continue
+            rows = segments.arrays()[1]
+            for i in indices:
+                row = rows[i].tolist()
+                result.append((row[START], row[END]))
+        return result
+
+    def line_dwells(self, lineno):
+        """Return the dwells of line lineno"""
+        if self._dwell_index is None or self._dwell_index[0] != len(self.dwells):
+            index = {}
+            for d in self.dwells:
+                index.setdefault(d[0], []).append(d)
+            self._dwell_index = len(self.dwells), index
+        return self._dwell_index[1].get(lineno, [])
+
     def highlight(self, lineno, geometry):
         glLineWidth(3)
         c = self.colors['selected']
         glColor3f(*c)
         glBegin(GL_LINES)
         coords = []
-        for line in self.traverse:
-            if line[0] != lineno: continue
-            linuxcnc.line9(geometry, line[1], line[2])
-            coords.append(line[1][:3])
-            coords.append(line[2][:3])
-        for line in self.arcfeed:
-            if line[0] != lineno: continue
-            linuxcnc.line9(geometry, line[1], line[2])
-            coords.append(line[1][:3])
-            coords.append(line[2][:3])
-        for line in self.feed:
-            if line[0] != lineno: continue
-            linuxcnc.line9(geometry, line[1], line[2])
-            coords.append(line[1][:3])
-            coords.append(line[2][:3])
+        for start, end in self.line_segments(lineno):
+            linuxcnc.line9(geometry, start, end)
+            coords.append(start[:3])
+            coords.append(end[:3])
         glEnd()
-        for line in self.dwells:
-            if line[0] != lineno: continue
+        for line in self.line_dwells(lineno):
             self.draw_dwells([(line[0], c) + line[2:]], 2, 0)
             coords.append(line[2:5])
         glLineWidth(1)
@@ -336,6 +368,80 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
             self.draw_dwells(self.dwells, self.colors.get('dwell_alpha', 1/3.), for_selection, len(self.traverse) + len(self.feed) + len(self.arcfeed))
             glLineWidth(1)
 
+    def pick_index(self):
+        """Return the (traverse, other) rs274.pickindex.SegmentIndex pair
+        for the segments seen so far, building it if needed"""
+        key = self.segment_counts(), self.geometry, self.foam_z, self.foam_w
+        if self._pick_index_key != key:
+            self._pick_index = rs274.pickindex.index_canon(self)
+            self._pick_index_key = key
+        return self._pick_index
+
+    def segment_counts(self):
+        return len(self.traverse), len(self.feed), len(self.arcfeed), len(self.dwells)
+
+    def draw_range(self, start, end, for_selection=0, no_traverse=True):
+        """Like draw(), but only for the segments added between two
+        segment_counts() snapshots"""
+        t0, f0, a0, d0 = start
+        t1, f1, a1, d1 = end
+        if not no_traverse:
+            glEnable(GL_LINE_STIPPLE)
+            self.colored_lines('traverse', self.traverse[t0:t1], for_selection)
+            glDisable(GL_LINE_STIPPLE)
+        else:
+            self.colored_lines('straight_feed', self.feed[f0:f1], for_selection)
+            self.colored_lines('arc_feed', self.arcfeed[a0:a1], for_selection)
+
+            glLineWidth(2)
+            self.draw_dwells(self.dwells[d0:d1], self.colors.get('dwell_alpha', 1/3.), for_selection)
+            glLineWidth(1)
+
+def parse_preview(cache, f, canon, *args):
+    """Like gcode.parse, but use the PreviewCache cache (if not None)
+
+    An unchanged program in an unchanged interpreter context is then read
+    back from the cache instead of being interpreted again."""
+    if cache is None:
+        return gcode.parse(f, canon, *args)
+    key = cache.key(f, canon, args)
+    result = cache.load(key, canon)
+    if result is not None:
+        return result
+    result, seq = gcode.parse(f, canon, *args)
+    if result <= gcode.MIN_ERROR:
+        cache.store(key, canon, result, seq)
+    return result, seq
+
+class PreviewThread(threading.Thread):
+    """Run the interpreter over a program without blocking the GUI
+
+    The canon's segment lists fill up while the thread runs, and the GUI
+    can show what has arrived so far with GlCanonDraw.begin_preview().
+    Toolkit and GL calls are only allowed in the GUI thread, so the
+    canon's callbacks (check_abort in particular) must not make any.
+    """
+    def __init__(self, cache, filename, canon, *args):
+        threading.Thread.__init__(self, name="preview")
+        self.setDaemon(True)
+        self.cache = cache
+        self.filename = filename
+        self.canon = canon
+        self.args = args
+        self.result = None
+        self.exc_info = None
+
+    def run(self):
+        try:
+            self.result = parse_preview(self.cache, self.filename, self.canon, *self.args)
+            if self.result[0] <= gcode.MIN_ERROR:
+                self.canon.pick_index()
+        except KeyboardInterrupt:
+            self.result = 0, 0
+        except:
+            self.exc_info = sys.exc_info()
+            self.result = 0, 0
+
 def with_context(f):
     def inner(self, *args, **kw):
         self.activate()
@@ -416,7 +522,15 @@ class GlCanonDraw:
         self.lp = lp
         self.canon = g
         self._dlists = {}
-        self.select_buffer_size = 100
+        self.preview_cache = None
+        self._preview_batches = []
+        self._preview_counts = None
+        self.preview_loading = False
+        self.program_buffer = None
+        # None: use vertex buffers for the program if the GL supports them
+        self.use_vertex_buffers = None
+        # the distance in pixels within which a click picks a line
+        self.pick_radius = 3
         self.cached_tool = -1
         self.initialised = 0
         self.no_joint_display = False
@@ -475,41 +589,36 @@ class GlCanonDraw:
 
     def select(self, x, y):
         if self.canon is None: return
-        pmatrix = glGetDoublev(GL_PROJECTION_MATRIX)
-        glMatrixMode(GL_PROJECTION)
-        glPushMatrix()
-        glLoadIdentity()
+        # the segment arrays may move while a PreviewThread appends to them
+        if self.preview_loading: return
+        self.set_highlight_line(self.pick_line(x, y))
+
+    def pick_line(self, x, y):
+        """Return the line number of the program segment drawn nearest to
+        the window position x, y, or None if there is none within
+        pick_radius pixels"""
+        if self.canon is None: return None
         vport = glGetIntegerv(GL_VIEWPORT)
-        gluPickMatrix(x, vport[3]-y, 5, 5, vport)
-        glMultMatrixd(pmatrix)
-        glMatrixMode(GL_MODELVIEW)
-
-        while 1:
-            glSelectBuffer(self.select_buffer_size)
-            glRenderMode(GL_SELECT)
-            glInitNames()
-            glPushName(0)
-
-            if self.get_show_rapids():
-                glCallList(self.dlist('select_rapids', gen=self.make_selection_list))
-            glCallList(self.dlist('select_norapids', gen=self.make_selection_list))
-
-            try:
-                buffer = list(glRenderMode(GL_RENDER))
-            except OverflowError:
-                self.select_buffer_size *= 2
-                continue
-            break
-
-        if buffer:
-            min_depth, max_depth, names = min(buffer)
-            self.set_highlight_line(names[0])
-        else:
-            self.set_highlight_line(None)
-
-        glMatrixMode(GL_PROJECTION)
-        glPopMatrix()
-        glMatrixMode(GL_MODELVIEW)
+        y = vport[3] - y
+        near = gluUnProject(x, y, 0.)
+        far = gluUnProject(x, y, 1.)
+        near1 = gluUnProject(x + self.pick_radius, y, 0.)
+        far1 = gluUnProject(x + self.pick_radius, y, 1.)
+        def dist(a, b):
+            return math.sqrt(sum((p - q) ** 2 for p, q in zip(a, b)))
+        length = dist(near, far)
+        if length == 0: return None
+        direction = [(q - p) / length for p, q in zip(near, far)]
+        radius = dist(near, near1)
+        spread = (dist(far, far1) - radius) / length
+
+        rapids, program = self.canon.pick_index()
+        hits = [program.nearest(near, direction, radius, spread)]
+        if self.get_show_rapids():
+            hits.append(rapids.nearest(near, direction, radius, spread))
+        hits = [h for h in hits if h is not None]
+        if not hits: return None
+        return min(hits)[1]
 
     def dlist(self, name, n=1, gen=lambda n: None):
         if name not in self._dlists:
@@ -526,6 +635,8 @@ class GlCanonDraw:
     def __del__(self):
         for base, count in self._dlists.values():
             glDeleteLists(base, count)
+        if self.program_buffer is not None:
+            self.program_buffer.delete()
 
     def update_highlight_variable(self,line):
         self.highlight_line = line
@@ -534,9 +645,12 @@ class GlCanonDraw:
     def set_highlight_line(self, line):
         if line == self.get_highlight_line(): return
         self.update_highlight_variable(line)
+        self.compile_highlight(line)
+
+    def compile_highlight(self, line):
         highlight = self.dlist('highlight')
         glNewList(highlight, GL_COMPILE)
-        if line is not None and self.canon is not None:
+        if line is not None and self.canon is not None and not self.preview_loading:
             if self.is_foam():
                 glPushMatrix()
                 glTranslatef(0, 0, self.get_foam_z()) 
@@ -1076,16 +1190,21 @@ class GlCanonDraw:
                 glEnable(GL_BLEND)
                 glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
-            if self.get_show_rapids():
-                glCallList(self.dlist('program_rapids', gen=self.make_main_list))
-            glCallList(self.dlist('program_norapids', gen=self.make_main_list))
+            if self.preview_loading:
+                self.draw_preview_batches()
+            elif self.vertex_buffers_usable():
+                self.draw_program_buffer()
+            else:
+                if self.get_show_rapids():
+                    glCallList(self.dlist('program_rapids', gen=self.make_main_list))
+                glCallList(self.dlist('program_norapids', gen=self.make_main_list))
             glCallList(self.dlist('highlight'))
 
             if self.get_program_alpha():
                 glDisable(GL_BLEND)
                 glEnable(GL_DEPTH_TEST)
 
-            if self.get_show_extents():
+            if self.get_show_extents() and not self.preview_loading:
                 self.show_extents()
 
         if self.get_show_live_plot() or self.get_show_program():
@@ -1783,16 +1902,6 @@ class GlCanonDraw:
             size = [3, 3, 3]
         return mid, size
 
-    def make_selection_list(self, unused=None):
-        select_rapids = self.dlist('select_rapids')
-        select_program = self.dlist('select_norapids')
-        glNewList(select_rapids, GL_COMPILE)
-        if self.canon: self.canon.draw(1, False)
-        glEndList()
-        glNewList(select_program, GL_COMPILE)
-        if self.canon: self.canon.draw(1, True)
-        glEndList()
-
     def make_main_list(self, unused=None):
         program = self.dlist('program_norapids')
         rapids = self.dlist('program_rapids')
@@ -1804,20 +1913,100 @@ class GlCanonDraw:
         if self.canon: self.canon.draw(0, False)
         glEndList()
 
+    def make_dwell_list(self, unused=None):
+        glNewList(self.dlist('program_dwells'), GL_COMPILE)
+        if self.canon:
+            glLineWidth(2)
+            self.canon.draw_dwells(self.canon.dwells,
+                self.canon.colors.get('dwell_alpha', 1/3.), 0)
+            glLineWidth(1)
+        glEndList()
+
+    def vertex_buffers_usable(self):
+        """Decide whether the program is drawn from vertex buffers
+
+        Foam cutter previews draw every segment twice in different
+        colours, so they keep using display lists."""
+        if self.use_vertex_buffers is None:
+            self.use_vertex_buffers = rs274.vertexbuffer.supported()
+        return (self.use_vertex_buffers and self.canon is not None
+            and not self.canon.is_foam)
+
+    def draw_program_buffer(self):
+        if self.program_buffer is None:
+            self.program_buffer = rs274.vertexbuffer.ProgramBuffer(self.canon)
+        self.program_buffer.update_colors(self.canon.colors)
+        self.program_buffer.draw(self.get_show_rapids())
+        glCallList(self.dlist('program_dwells', gen=self.make_dwell_list))
+
     def load_preview(self, f, canon, *args):
         self.set_canon(canon)
-        result, seq = gcode.parse(f, canon, *args)
+        result, seq = parse_preview(self.preview_cache, f, canon, *args)
 
         if result <= gcode.MIN_ERROR:
             self.canon.progress.nextphase(1)
             canon.calc_extents()
-            self.stale_dlist('program_rapids')
-            self.stale_dlist('program_norapids')
-            self.stale_dlist('select_rapids')
-            self.stale_dlist('select_norapids')
+            canon.pick_index()
+            self.stale_program_dlists()
 
         return result, seq
 
+    def stale_program_dlists(self):
+        self.stale_dlist('program_rapids')
+        self.stale_dlist('program_norapids')
+        self.stale_dlist('program_dwells')
+        if self.program_buffer is not None:
+            self.program_buffer.delete()
+            self.program_buffer = None
+
+    def begin_preview(self, canon):
+        """Show canon's segments while a PreviewThread is still filling it
+
+        Each redraw compiles the segments that arrived since the previous
+        one into a new display list, so the plot fills in progressively
+        without recompiling what is already there."""
+        self.set_canon(canon)
+        self.delete_preview_batches()
+        self.stale_program_dlists()
+        self._preview_counts = (0, 0, 0, 0)
+        self.preview_loading = True
+
+    def end_preview(self):
+        """Switch back to the normal display lists once loading stopped"""
+        self.preview_loading = False
+        self.delete_preview_batches()
+        if self.canon is not None:
+            self.canon.calc_extents()
+        self.stale_program_dlists()
+        # a line picked while loading got an empty highlight list
+        if self.highlight_line is not None:
+            self.compile_highlight(self.highlight_line)
+
+    def delete_preview_batches(self):
+        for base in self._preview_batches:
+            glDeleteLists(base, 2)
+        self._preview_batches = []
+
+    def draw_preview_batches(self):
+        if self.canon is None: return
+        # the preview thread is still adding segments; the counts only
+        # take in complete ones (see rs274.segments)
+        counts = self.canon.segment_counts()
+        if counts != self._preview_counts:
+            base = glGenLists(2)
+            glNewList(base, GL_COMPILE)
+            self.canon.draw_range(self._preview_counts, counts, 0, True)
+            glEndList()
+            glNewList(base+1, GL_COMPILE)
+            self.canon.draw_range(self._preview_counts, counts, 0, False)
+            glEndList()
+            self._preview_batches.append(base)
+            self._preview_counts = counts
+        show_rapids = self.get_show_rapids()
+        for base in self._preview_batches:
+            if show_rapids: glCallList(base+1)
+            glCallList(base)
+
     def from_internal_units(self, pos, unit=None):
         if unit is None:
             unit = self.stat.linear_units
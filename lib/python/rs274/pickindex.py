@@ -0,0 +1,204 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Spatial index for picking lines of the program preview
+
+Picking with GL_SELECT renders the whole program again for every click,
+which takes seconds on big programs.  Instead, the drawn line pieces are
+put in a bounding volume hierarchy once, and a click becomes a query for
+the piece nearest to the eye along the pick ray.
+
+The hierarchy is implicit:  the pieces are sorted along a Z-order curve
+and grouped LEAF at a time, and each level above is the pairwise union of
+the boxes of the level below.  The whole tree is a few NumPy arrays, and
+a query walks it one level at a time.
+"""
+
+import numpy
+from rs274.vertexbuffer import line_vertices, BATCH
+
+# line pieces per leaf of the tree
+LEAF = 8
+# Z-order curve resolution per axis, in bits
+MORTON_BITS = 10
+
+def _spread_bits(x):
+    # insert two zero bits between each of the low 10 bits of x
+    x = x.astype(numpy.int64) & 0x3ff
+    x = (x | (x << 16)) & 0x030000ff
+    x = (x | (x << 8)) & 0x0300f00f
+    x = (x | (x << 4)) & 0x030c30c3
+    x = (x | (x << 2)) & 0x09249249
+    return x
+
+def morton_order(points):
+    """Return the permutation that sorts points along a Z-order curve"""
+    lo = points.min(0)
+    span = points.max(0) - lo
+    span[span == 0] = 1
+    q = ((points - lo) / span * ((1 << MORTON_BITS) - 1)).astype(numpy.int64)
+    code = (_spread_bits(q[:, 0]) | (_spread_bits(q[:, 1]) << 1)
+        | (_spread_bits(q[:, 2]) << 2))
+    return numpy.argsort(code, kind='mergesort')
+
+class SegmentIndex:
+    """A bounding volume hierarchy over line pieces tagged with line numbers
+
+    p0 and p1 are (n, 3) arrays of the piece ends; a point is a piece
+    whose ends are equal."""
+    def __init__(self, p0, p1, lineno):
+        n = len(lineno)
+        self.levels = []
+        if not n: return
+        order = morton_order((p0 + p1) / 2)
+        nleaves = 1
+        while nleaves * LEAF < n: nleaves *= 2
+        size = nleaves * LEAF
+
+        self.p0 = numpy.zeros((size, 3), dtype=numpy.float32)
+        self.p1 = numpy.zeros((size, 3), dtype=numpy.float32)
+        self.lineno = numpy.empty(size, dtype=numpy.int32)
+        self.p0[:n] = p0[order]
+        self.p1[:n] = p1[order]
+        self.lineno[:n] = lineno[order]
+        self.lineno[n:] = -1
+
+        # empty boxes for the padding, so that no query ever selects it
+        lo = numpy.empty((size, 3), dtype=numpy.float32)
+        hi = numpy.empty((size, 3), dtype=numpy.float32)
+        lo[:n] = numpy.minimum(self.p0[:n], self.p1[:n])
+        hi[:n] = numpy.maximum(self.p0[:n], self.p1[:n])
+        lo[n:] = numpy.inf
+        hi[n:] = -numpy.inf
+
+        lo = lo.reshape(nleaves, LEAF, 3).min(1)
+        hi = hi.reshape(nleaves, LEAF, 3).max(1)
+        levels = [(lo, hi)]
+        while len(lo) > 1:
+            lo = lo.reshape(-1, 2, 3).min(1)
+            hi = hi.reshape(-1, 2, 3).max(1)
+            levels.append((lo, hi))
+        levels.reverse()
+        self.levels = levels
+
+    def __len__(self):
+        if not self.levels: return 0
+        return int((self.lineno >= 0).sum())
+
+    def candidates(self, origin, direction, radius, spread):
+        """Return the indices of the pieces whose bounding box may be
+        within radius + spread * t of the point origin + t * direction
+
+        direction must be a unit vector; only t >= 0 is considered."""
+        if not self.levels: return numpy.zeros(0, dtype=numpy.intp)
+        nodes = numpy.zeros(1, dtype=numpy.intp)
+        last = len(self.levels) - 1
+        for depth, (lo, hi) in enumerate(self.levels):
+            lo = lo[nodes]
+            hi = hi[nodes]
+            # test the bounding sphere of each box against the cone
+            c = (lo + hi) / 2
+            h = numpy.sqrt(((hi - lo) ** 2).sum(1)) / 2
+            w = c - origin
+            t = w.dot(direction)
+            dist = numpy.sqrt(numpy.maximum((w * w).sum(1) - t * t, 0))
+            reach = radius + spread * numpy.maximum(t + h, 0)
+            nodes = nodes[(t + h >= 0) & (dist - h <= reach)]
+            if not len(nodes): return nodes
+            if depth != last:
+                nodes = (nodes[:, None] * 2 + numpy.arange(2)).ravel()
+        idx = (nodes[:, None] * LEAF + numpy.arange(LEAF)).ravel()
+        return idx[self.lineno[idx] >= 0]
+
+    def nearest(self, origin, direction, radius, spread):
+        """Return (t, line number) of the piece nearest to origin that
+        passes within radius + spread * t of the ray origin + t * direction,
+        or None if there is no such piece"""
+        origin = numpy.asarray(origin, dtype=numpy.float64)
+        direction = numpy.asarray(direction, dtype=numpy.float64)
+        direction = direction / numpy.sqrt(direction.dot(direction))
+        with numpy.errstate(invalid='ignore'):
+            idx = self.candidates(origin, direction, radius, spread)
+        if not len(idx): return None
+
+        # closest points between the ray (as a line) and each piece
+        p0 = self.p0[idx].astype(numpy.float64)
+        v = self.p1[idx] - p0
+        w0 = origin - p0
+        b = v.dot(direction)
+        c = (v * v).sum(1)
+        d = w0.dot(direction)
+        e = (v * w0).sum(1)
+        denom = c - b * b
+        s = numpy.zeros(len(idx))
+        ok = denom > 1e-12 * numpy.maximum(c, 1e-300)
+        s[ok] = (e[ok] - b[ok] * d[ok]) / denom[ok]
+        s = numpy.clip(s, 0, 1)
+        q = p0 + s[:, None] * v
+        t = (q - origin).dot(direction)
+        r = q - origin - t[:, None] * direction
+        dist = numpy.sqrt((r * r).sum(1))
+
+        hit = (t >= -radius) & (dist <= radius + spread * numpy.maximum(t, 0))
+        if not hit.any(): return None
+        t = t[hit]
+        lineno = self.lineno[idx][hit]
+        best = numpy.lexsort((lineno, t))[0]
+        return float(t[best]), int(lineno[best])
+
+def _pieces(views, lists):
+    p0s = []; p1s = []; lines = []
+    for l in lists:
+        lineno, coords, tool = l.arrays()
+        for geometry, z in views:
+            for i in range(0, len(coords), BATCH):
+                v, count = line_vertices(geometry, coords[i:i+BATCH])
+                v = v.reshape(-1, 2, 3)
+                if z: v[:, :, 2] += z
+                p0s.append(v[:, 0])
+                p1s.append(v[:, 1])
+                lines.append(numpy.repeat(lineno[i:i+BATCH], count // 2))
+    return p0s, p1s, lines
+
+def _make_index(p0s, p1s, lines):
+    if not lines:
+        empty = numpy.zeros((0, 3))
+        return SegmentIndex(empty, empty, numpy.zeros(0, dtype=numpy.int32))
+    return SegmentIndex(numpy.concatenate(p0s), numpy.concatenate(p1s),
+        numpy.concatenate(lines))
+
+def index_canon(canon):
+    """Index the preview of canon the way GLCanon.draw shows it
+
+    Returns a pair of SegmentIndexes: one for the traverses, and one for
+    the feeds, arcs and dwells."""
+    if canon.is_foam:
+        views = (('XY', canon.foam_z), ('UV', canon.foam_w))
+    else:
+        views = ((canon.geometry, 0),)
+    rapids = _make_index(*_pieces(views, [canon.traverse]))
+
+    p0s, p1s, lines = _pieces(views, [canon.feed, canon.arcfeed])
+    if canon.dwells:
+        dwells = numpy.array([d[2:5] for d in canon.dwells],
+            dtype=numpy.float32)
+        p0s.append(dwells)
+        p1s.append(dwells)
+        lines.append(numpy.array([d[0] for d in canon.dwells],
+            dtype=numpy.int32))
+    return rapids, _make_index(p0s, p1s, lines)
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,264 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""On-disk cache of program previews
+
+Running the interpreter over a big program takes a long time, and the GUIs
+do it again every time the program is opened or reloaded.  The result only
+depends on the program text and the interpreter context (startup codes,
+parameter file, tool table, INI file and subroutines), so the preview of
+an unchanged program is stored under a hash of all of those.
+
+Each entry is a single file: a magic line, a one-line JSON header and the
+raw segment arrays.  Loading an entry memory-maps the file, so a reload
+costs little more than the hash of the program.  The least recently used
+entries are removed when the cache grows beyond its size budget.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import numpy
+
+from rs274.segments import SegmentList, ToolOffsetTable
+
+MAGIC = "LinuxCNC preview cache 3\n"
+SUFFIX = ".preview"
+ALIGN = 16
+DEFAULT_SIZE = 256 # megabytes
+
+def default_directory():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "linuxcnc", "preview")
+
+def file_digest(h, filename):
+    """Feed the contents of filename (if it exists) to the hash h"""
+    if not filename or not os.path.isfile(filename):
+        h.update("-\0")
+        return
+    f = open(filename, "rb")
+    try:
+        while 1:
+            block = f.read(1 << 20)
+            if not block: break
+            h.update(block)
+    finally:
+        f.close()
+    h.update("\0")
+
+def directory_signature(directories):
+    """Describe the files in directories by name, size and mtime"""
+    result = []
+    for d in directories:
+        if not os.path.isdir(d): continue
+        for name in sorted(os.listdir(d)):
+            try:
+                st = os.stat(os.path.join(d, name))
+            except OSError:
+                continue
+            result.append((d, name, st.st_size, int(st.st_mtime)))
+    return repr(result)
+
+class PreviewCache:
+    def __init__(self, directory=None, budget=DEFAULT_SIZE << 20):
+        self.directory = directory or default_directory()
+        self.budget = budget
+        # strings describing the interpreter configuration, see from_ini
+        self.context = []
+
+    @classmethod
+    def from_ini(cls, inifile, inifilename=None):
+        """Make the cache configured by [DISPLAY]PREVIEW_CACHE_SIZE and
+        PREVIEW_CACHE_DIR, or return None if it is disabled"""
+        size = inifile.find("DISPLAY", "PREVIEW_CACHE_SIZE")
+        try:
+            size = float(size) if size else DEFAULT_SIZE
+        except ValueError:
+            print >>sys.stderr, "Error: invalid [DISPLAY] PREVIEW_CACHE_SIZE in INI file"
+            size = DEFAULT_SIZE
+        if size <= 0: return None
+        directory = inifile.find("DISPLAY", "PREVIEW_CACHE_DIR")
+        if directory: directory = os.path.expanduser(directory)
+        self = cls(directory, int(size * 1024 * 1024))
+
+        inifilename = inifilename or os.environ.get("INI_FILE_NAME")
+        h = hashlib.sha1()
+        file_digest(h, inifilename)
+        self.context.append(h.hexdigest())
+        inidir = os.path.dirname(os.path.abspath(inifilename or "."))
+        paths = []
+        for option in ("SUBROUTINE_PATH", "USER_M_PATH"):
+            for p in (inifile.find("RS274NGC", option) or "").split(":"):
+                if p: paths.append(os.path.join(inidir, os.path.expanduser(p)))
+        self.context.append(directory_signature(paths))
+        return self
+
+    def key(self, filename, canon, args):
+        """Return the cache key for previewing filename with canon
+
+        args are the extra arguments passed to gcode.parse (unit and
+        startup codes, interpreter name)."""
+        h = hashlib.sha1()
+        h.update(MAGIC)
+        file_digest(h, filename)
+        h.update(repr(args))
+        file_digest(h, getattr(canon, 'parameter_file', None))
+        tools = getattr(canon, 'tools', None)
+        if tools is not None:
+            h.update(repr([tuple(t) for t in tools]))
+        h.update(repr(getattr(canon, 'arcdivision', None)))
+        for c in self.context:
+            h.update(c)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def load(self, key, canon):
+        """Fill canon from the cache entry key
+
+        Returns the (result, seq) of the original gcode.parse, or None if
+        there is no usable entry.  The segment lists of canon become
+        read-only views of the memory-mapped entry."""
+        filename = self.path(key)
+        try:
+            f = open(filename, "rb")
+        except IOError:
+            return None
+        try:
+            if f.readline() != MAGIC: return None
+            header = json.loads(f.readline())
+        except ValueError:
+            return None
+        finally:
+            f.close()
+
+        data = numpy.memmap(filename, dtype=numpy.uint8, mode='r')
+        arrays = {}
+        for name, (dtype, shape, offset) in header['arrays'].items():
+            dtype = numpy.dtype(str(dtype))
+            nbytes = int(numpy.prod(shape)) * dtype.itemsize
+            arrays[name] = data[offset:offset+nbytes].view(dtype).reshape(shape)
+
+        tool_offsets = ToolOffsetTable.from_array(arrays['tool_offsets'])
+        canon.tool_offsets = tool_offsets
+        for name, has_feed in (('traverse', False), ('feed', True), ('arcfeed', True)):
+            setattr(canon, name, SegmentList.from_arrays(tool_offsets, has_feed,
+                arrays[name + '_lineno'], arrays[name + '_coords'],
+                arrays[name + '_tool']))
+        canon.dwells = [(int(l), (r, g, b), x, y, z, int(p))
+            for l, r, g, b, x, y, z, p in arrays['dwells'].tolist()]
+        canon.dwell_time = header['dwell_time']
+        canon.foam_z = header['foam_z']
+        canon.foam_w = header['foam_w']
+        canon.tool_changes = [(tuple(counts), tool)
+            for counts, tool in header['tool_changes']]
+        if hasattr(canon, 'notify_messages'):
+            canon.notify_messages = header.get('notify_messages', [])
+
+        # mark the entry as recently used
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+        return header['result'], header['seq']
+
+    def store(self, key, canon, result, seq):
+        """Save the preview in canon as the cache entry key"""
+        arrays = [('tool_offsets', canon.tool_offsets.as_array())]
+        for name in ('traverse', 'feed', 'arcfeed'):
+            lineno, coords, tool = getattr(canon, name).arrays()
+            arrays.extend([(name + '_lineno', lineno),
+                (name + '_coords', coords), (name + '_tool', tool)])
+        dwells = [(l, c[0], c[1], c[2], x, y, z, p)
+            for l, c, x, y, z, p in canon.dwells]
+        arrays.append(('dwells',
+            numpy.array(dwells, dtype=numpy.float64).reshape(-1, 8)))
+
+        size = sum(a.nbytes + ALIGN for n, a in arrays)
+        if size > self.budget: return
+
+        header = {
+            'result': result, 'seq': seq,
+            'dwell_time': canon.dwell_time,
+            'foam_z': canon.foam_z, 'foam_w': canon.foam_w,
+            'tool_changes': canon.tool_changes,
+            'notify_messages': list(getattr(canon, 'notify_messages', [])),
+            'arrays': {},
+        }
+        # The header holds the offsets of the arrays, and the offsets
+        # depend on the length of the header; a second pass settles it.
+        start = 0
+        for i in range(2):
+            offset = start
+            for name, a in arrays:
+                offset = (offset + ALIGN - 1) // ALIGN * ALIGN
+                header['arrays'][name] = (a.dtype.str, a.shape, offset)
+                offset += a.nbytes
+            text = MAGIC + json.dumps(header) + "\n"
+            start = len(text)
+
+        filename = self.path(key)
+        temp = filename + ".%d.tmp" % os.getpid()
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            f = open(temp, "wb")
+            try:
+                f.write(text)
+                for name, a in arrays:
+                    f.write("\0" * (header['arrays'][name][2] - f.tell()))
+                    numpy.ascontiguousarray(a).tofile(f)
+            finally:
+                f.close()
+            os.rename(temp, filename)
+        except (IOError, OSError), detail:
+            print >>sys.stderr, "Could not write preview cache: %s" % detail
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits
+        in its budget"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(SUFFIX): continue
+            filename = os.path.join(self.directory, name)
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, filename))
+        entries.sort()
+        total = sum(size for mtime, size, filename in entries)
+        while entries and total > self.budget:
+            mtime, size, filename = entries.pop(0)
+            try:
+                os.unlink(filename)
+            except OSError:
+                pass
+            total -= size
+
+# vim:ts=8:sts=4:sw=4:et:
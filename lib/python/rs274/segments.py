@@ -0,0 +1,265 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Compact storage for the segments of a program preview
+
+A preview of a big 3D surfacing program easily holds millions of segments.
+Keeping each of them as a tuple of Python lists costs several hundred bytes
+per segment, so the canon stores them in flat arrays instead:  one row of
+ROW float64 values per segment (start position, end position, feedrate),
+one int32 line number and one int32 index into a ToolOffsetTable that is
+shared by all the segment lists of a canon.
+
+SegmentList still behaves like the old list of tuples when indexed or
+iterated, so existing code keeps working; code that wants speed uses
+arrays() to get NumPy views of the columns.  A SegmentList can also wrap
+existing (for example memory-mapped) NumPy arrays; such a list is
+read-only.
+
+The preview thread adds segments while the GUI draws the ones it already
+has.  A segment's line number is appended last, so len() only counts
+complete rows and the GUI can draw up to a length it read at any time.
+The NumPy views of arrays() need more: a list that has handed them out
+copies its storage before it grows again, so they never see a buffer
+that was moved; add() and arrays() hold a lock for that.
+"""
+
+import array
+import threading
+import numpy
+
+# columns of a segment row
+START = slice(0, 9)
+END = slice(9, 18)
+FEEDRATE = 18
+ROW = 19
+
+# number of segments handed to linuxcnc.draw_lines at a time
+CHUNK = 4096
+
+class ToolOffsetTable:
+    """The distinct tool length offsets seen in a program
+
+    Programs only use a handful of different tool offsets, so segments
+    store an index into this table instead of their own 3-element list.
+    """
+    def __init__(self):
+        self.offsets = []
+        self._index = {}
+
+    @classmethod
+    def from_array(cls, offsets):
+        """Make a table from the (n, 3) array returned by as_array()"""
+        self = cls()
+        for x, y, z in offsets.tolist():
+            self.add(x, y, z)
+        return self
+
+    def add(self, x, y, z):
+        """Return the index of the offset (x, y, z), adding it if needed"""
+        key = (x, y, z)
+        i = self._index.get(key)
+        if i is None:
+            i = self._index[key] = len(self.offsets)
+            self.offsets.append(key)
+        return i
+
+    def __getitem__(self, i):
+        return list(self.offsets[i])
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def as_array(self):
+        """Return the table as an (n, 3) float64 array"""
+        if not self.offsets:
+            return numpy.zeros((0, 3))
+        return numpy.array(self.offsets, dtype=numpy.float64)
+
+class SegmentList(object):
+    """A list of preview segments of one kind (traverse, feed or arc feed)
+
+    Items read back in the format the canon has always used:
+        traverse:  (line number, [start], [end], [tlo x, tlo y, tlo z])
+        feed, arc: (line number, [start], [end], feedrate, [tlo x, tlo y, tlo z])
+    """
+    def __init__(self, tool_offsets, has_feed=True):
+        self.tool_offsets = tool_offsets
+        self.has_feed = has_feed
+        self._lineno = array.array('i')
+        self._coords = array.array('d')
+        self._tool = array.array('i')
+        self._arrays = None
+        self._line_index = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_arrays(cls, tool_offsets, has_feed, lineno, coords, tool):
+        """Make a read-only list from the three arrays returned by arrays()"""
+        self = cls(tool_offsets, has_feed)
+        self._lineno = lineno
+        self._coords = coords.reshape(-1)
+        self._tool = tool
+        return self
+
+    def add(self, lineno, start, end, feedrate, tool):
+        """Append one segment; tool is an index into the ToolOffsetTable"""
+        with self._lock:
+            if self._arrays is not None:
+                # growing could move the memory the views point into
+                self._lineno = self._lineno[:]
+                self._coords = self._coords[:]
+                self._tool = self._tool[:]
+                self._arrays = None
+            coords = self._coords
+            coords.extend(start)
+            coords.extend(end)
+            coords.append(feedrate)
+            self._tool.append(tool)
+            # publishes the segment: len() counts it from here on
+            self._lineno.append(lineno)
+
+    def append(self, item):
+        """Append one segment given in the tuple format"""
+        if self.has_feed:
+            lineno, start, end, feedrate, tlo = item
+        else:
+            lineno, start, end, tlo = item
+            feedrate = 0
+        self.add(lineno, start, end, feedrate, self.tool_offsets.add(*tlo))
+
+    def _item(self, i):
+        c = self._coords[i*ROW:(i+1)*ROW].tolist()
+        tlo = self.tool_offsets[self._tool[i]]
+        if self.has_feed:
+            return (int(self._lineno[i]), c[START], c[END], c[FEEDRATE], tlo)
+        return (int(self._lineno[i]), c[START], c[END], tlo)
+
+    def __len__(self):
+        return len(self._lineno)
+
+    def __nonzero__(self):
+        return len(self._lineno) != 0
+
+    def __getitem__(self, i):
+        n = len(self._lineno)
+        if isinstance(i, slice):
+            return [self._item(j) for j in xrange(*i.indices(n))]
+        if i < 0: i += n
+        if not 0 <= i < n: raise IndexError, "segment index out of range"
+        return self._item(i)
+
+    def __iter__(self):
+        for i in xrange(len(self._lineno)):
+            yield self._item(i)
+
+    def chunks(self, size=CHUNK):
+        """Yield the segments as lists of at most size tuples
+
+        linuxcnc.draw_lines only accepts real lists; feeding it a chunk at
+        a time keeps the temporary tuples from ever existing all at once.
+        """
+        for i in xrange(0, len(self._lineno), size):
+            yield self[i:i+size]
+
+    def arrays(self):
+        """Return NumPy views (line numbers, coordinate rows, tool indices)
+
+        The coordinate rows have shape (n, ROW).  The views share memory
+        with the list, and do not see the segments added after them.
+        """
+        with self._lock:
+            if self._arrays is None:
+                n = len(self._lineno)
+                if isinstance(self._lineno, numpy.ndarray):
+                    self._arrays = (self._lineno,
+                        self._coords.reshape(n, ROW), self._tool)
+                elif n:
+                    self._arrays = (
+                        numpy.frombuffer(self._lineno, dtype=numpy.int32),
+                        numpy.frombuffer(self._coords, dtype=numpy.float64).reshape(n, ROW),
+                        numpy.frombuffer(self._tool, dtype=numpy.int32))
+                else:
+                    self._arrays = (
+                        numpy.zeros(0, dtype=numpy.int32),
+                        numpy.zeros((0, ROW)),
+                        numpy.zeros(0, dtype=numpy.int32))
+            return self._arrays
+
+    def line_indices(self, lineno):
+        """Return the indices of the segments of line lineno, in order
+
+        Segments arrive in line order except where a subroutine or loop
+        repeats lines, so the index is usually just the line number column
+        itself; otherwise it is a stable sort of it.  Either way a lookup
+        is a binary search, whatever the size of the program.  The index
+        is rebuilt when the list has grown.
+        """
+        n = len(self._lineno)
+        if self._line_index is None or self._line_index[0] != n:
+            lines = self.arrays()[0]
+            if n and (lines[1:] < lines[:-1]).any():
+                order = numpy.argsort(lines, kind='mergesort')
+                self._line_index = len(lines), lines[order], order
+            else:
+                self._line_index = len(lines), lines, None
+        n, lines, order = self._line_index
+        # a key of another type would make searchsorted convert the array
+        lineno = lines.dtype.type(lineno)
+        lo = int(lines.searchsorted(lineno, 'left'))
+        hi = int(lines.searchsorted(lineno, 'right'))
+        if order is None: return range(lo, hi)
+        return order[lo:hi].tolist()
+
+    def extents(self):
+        """Return (min, max, min with tool, max with tool) of the XYZ motion
+
+        The same points as gcode.calc_extents are considered: the start of
+        every segment and the end of the last one.  Returns None when the
+        list is empty.
+        """
+        if not len(self._lineno): return None
+        lineno, coords, tool = self.arrays()
+        tlo = self.tool_offsets.as_array()[tool]
+        pts = numpy.vstack((coords[:, 0:3], coords[-1:, 9:12]))
+        tpts = pts + numpy.vstack((tlo, tlo[-1:]))
+        return pts.min(0), pts.max(0), tpts.min(0), tpts.max(0)
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the segment data"""
+        return (self._lineno.itemsize * len(self._lineno)
+            + self._coords.itemsize * len(self._coords)
+            + self._tool.itemsize * len(self._tool))
+
+def calc_extents(*lists):
+    """Combine the extents of several SegmentLists
+
+    Returns four 3-element lists like gcode.calc_extents does.
+    """
+    mins = [9e99] * 3; maxs = [-9e99] * 3
+    mints = [9e99] * 3; maxts = [-9e99] * 3
+    for l in lists:
+        e = l.extents()
+        if e is None: continue
+        mn, mx, mnt, mxt = e
+        mins = [min(a, float(b)) for a, b in zip(mins, mn)]
+        maxs = [max(a, float(b)) for a, b in zip(maxs, mx)]
+        mints = [min(a, float(b)) for a, b in zip(mints, mnt)]
+        maxts = [max(a, float(b)) for a, b in zip(maxts, mxt)]
+    return mins, maxs, mints, maxts
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,203 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Distances and run time estimate of a previewed program
+
+ProgramStatistics works on the segment arrays of a GLCanon, so even a
+program of millions of moves is summarised in a fraction of a second.
+All lengths are in the canon's internal units (inches, and degrees for
+rotary axes), all times in seconds.
+
+The run time estimate gives every move a trapezoidal velocity profile
+limited by the programmed feed rate and by the velocity and acceleration
+limits of the axes that take part in it, as read by MachineLimits.  Moves
+start and end at rest, except that the pieces an arc was broken into are
+treated as one move.  Blending between moves is not modelled, so the
+estimate errs on the long side for programs of many short moves.
+"""
+
+import numpy
+from rs274.segments import START, END, FEEDRATE
+
+AXES = "XYZABCUVW"
+ROTARY = (3, 4, 5)
+inf = float('inf')
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def units_per_mm(value):
+    """Return machine units per millimeter for a [TRAJ]LINEAR_UNITS value"""
+    if value is None: return 1.0
+    value = value.strip().lower()
+    if value in ("mm", "metric", "millimeter", "millimeters"): return 1.0
+    if value in ("in", "inch", "inches", "imperial"): return 1 / 25.4
+    return _float(value) or 1.0
+
+class MachineLimits:
+    """The velocity and acceleration limits of the axes XYZABCUVW, in
+    inches (degrees for ABC) per second and per second squared"""
+    def __init__(self, max_velocity=None, max_acceleration=None,
+            max_linear_velocity=None):
+        self.max_velocity = numpy.array(max_velocity or [inf] * 9, dtype=float)
+        self.max_acceleration = numpy.array(max_acceleration or [inf] * 9,
+            dtype=float)
+        self.max_linear_velocity = max_linear_velocity or inf
+
+    @classmethod
+    def from_ini(cls, inifile):
+        """Read [AXIS_<letter>]MAX_VELOCITY and MAX_ACCELERATION, and
+        [TRAJ]MAX_LINEAR_VELOCITY (or MAX_VELOCITY)"""
+        units = (inifile.find("TRAJ", "LINEAR_UNITS")
+            or inifile.find("AXIS_X", "UNITS"))
+        scale = 1 / (units_per_mm(units) * 25.4)
+        velocity = []
+        acceleration = []
+        for i, letter in enumerate(AXES):
+            section = "AXIS_%s" % letter
+            s = 1 if i in ROTARY else scale
+            v = _float(inifile.find(section, "MAX_VELOCITY"))
+            a = _float(inifile.find(section, "MAX_ACCELERATION"))
+            velocity.append(v * s if v else inf)
+            acceleration.append(a * s if a else inf)
+        traj = _float(inifile.find("TRAJ", "MAX_LINEAR_VELOCITY")
+            or inifile.find("TRAJ", "MAX_VELOCITY"))
+        return cls(velocity, acceleration, traj * scale if traj else None)
+
+def format_duration(seconds):
+    """Format a time in seconds as hours:minutes:seconds"""
+    seconds = int(round(seconds))
+    return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+def move_time(length, velocity, acceleration):
+    """Time for moves of length with a trapezoidal profile that starts and
+    ends at rest; all arguments are arrays"""
+    t = numpy.zeros(len(length))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        cruise = length >= velocity * velocity / acceleration
+        ok = cruise & (length > 0) & (velocity < inf)
+        t[ok] = length[ok] / velocity[ok] + velocity[ok] / acceleration[ok]
+        ok = ~cruise & (length > 0)
+        t[ok] = 2 * numpy.sqrt(length[ok] / acceleration[ok])
+    return t
+
+def _group_starts(lineno, coords):
+    """Indices of the first piece of each arc: a new arc starts where the
+    line number changes or a piece does not continue the previous one"""
+    if not len(lineno): return numpy.zeros(0, dtype=numpy.intp)
+    new = numpy.ones(len(lineno), dtype=bool)
+    new[1:] = ((lineno[1:] != lineno[:-1])
+        | (coords[1:, START] != coords[:-1, END]).any(1))
+    return numpy.flatnonzero(new)
+
+class ProgramStatistics:
+    """Distances and estimated run time of the program in a GLCanon
+
+    rapid_distance, feed_distance:  XYZ path length of traverses and of
+        feeds and arcs
+    axis_travel:  the distance each of the axes XYZABCUVW moves
+    rapid_time, feed_time, dwell_time, run_time:  the time estimate
+    line_distance, line_time:  arrays indexed by line number
+    tool_order:  the tools in the order they are loaded
+    tool_distance:  {tool: (rapid distance, feed distance)}; the moves
+        before the first tool change are counted under tool None
+    """
+    def __init__(self, canon, limits=None):
+        limits = limits or MachineLimits()
+        self.axis_travel = numpy.zeros(9)
+        self.rapid_distance = self.feed_distance = 0.0
+        self.rapid_time = self.feed_time = 0.0
+        self.dwell_time = float(canon.dwell_time)
+        linenos = []; distances = []; times = []
+        tool_changes = getattr(canon, 'tool_changes', [])
+        self.tool_order = [tool for counts, tool in tool_changes]
+        self.tool_distance = {}
+
+        for k, kind in enumerate(('traverse', 'feed', 'arcfeed')):
+            lineno, coords, tool = getattr(canon, kind).arrays()
+            if not len(lineno): continue
+            delta = abs(coords[:, END] - coords[:, START])
+            self.axis_travel += delta.sum(0)
+            xyz = numpy.sqrt((delta[:, 0:3] ** 2).sum(1))
+            uvw = numpy.sqrt((delta[:, 6:9] ** 2).sum(1))
+            abc = numpy.sqrt((delta[:, 3:6] ** 2).sum(1))
+            # the length the feed rate applies to
+            length = numpy.where(xyz > 0, xyz, numpy.where(uvw > 0, uvw, abc))
+
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                ratio = delta / length[:, None]
+                velocity = (limits.max_velocity / ratio).min(1)
+                acceleration = (limits.max_acceleration / ratio).min(1)
+            velocity[xyz > 0] = numpy.minimum(velocity[xyz > 0],
+                limits.max_linear_velocity)
+            if kind != 'traverse':
+                velocity = numpy.minimum(velocity, coords[:, FEEDRATE])
+
+            if kind == 'arcfeed':
+                starts = _group_starts(lineno, coords)
+                t = move_time(numpy.add.reduceat(length, starts),
+                    numpy.minimum.reduceat(velocity, starts),
+                    numpy.minimum.reduceat(acceleration, starts))
+                linenos.append(lineno[starts])
+            else:
+                t = move_time(length, velocity, acceleration)
+                linenos.append(lineno)
+            times.append(t)
+            distances.append((lineno, xyz))
+
+            if kind == 'traverse':
+                self.rapid_distance += float(xyz.sum())
+                self.rapid_time += float(t.sum())
+            else:
+                self.feed_distance += float(xyz.sum())
+                self.feed_time += float(t.sum())
+
+            # split the distance among the tools
+            first = numpy.array([counts[k] for counts, number in tool_changes],
+                dtype=numpy.intp)
+            which = numpy.searchsorted(first, numpy.arange(len(xyz)), 'right')
+            per_tool = numpy.bincount(which, weights=xyz)
+            for i, d in enumerate(per_tool):
+                if not d: continue
+                number = tool_changes[i-1][1] if i else None
+                rapid, feed = self.tool_distance.get(number, (0.0, 0.0))
+                if kind == 'traverse': rapid += d
+                else: feed += d
+                self.tool_distance[number] = rapid, feed
+
+        size = max([int(l.max()) + 1 for l in linenos] or [0])
+        self.line_distance = numpy.zeros(size)
+        self.line_time = numpy.zeros(size)
+        for lineno, xyz in distances:
+            ok = lineno >= 0
+            self.line_distance += numpy.bincount(lineno[ok], xyz[ok], size)
+        for lineno, t in zip(linenos, times):
+            ok = lineno >= 0
+            self.line_time += numpy.bincount(lineno[ok], t[ok], size)
+        self.axis_travel = self.axis_travel.tolist()
+
+    @property
+    def total_distance(self):
+        return self.rapid_distance + self.feed_distance
+
+    @property
+    def run_time(self):
+        return self.rapid_time + self.feed_time + self.dwell_time
+
+# vim:ts=8:sts=4:sw=4:et:
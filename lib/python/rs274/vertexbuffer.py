@@ -0,0 +1,209 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Vertex buffer objects for the program preview
+
+Compiling a program of millions of segments into display lists is slow,
+and some drivers handle such huge lists badly.  ProgramBuffer instead
+turns the segment arrays of a canon into one GL_LINES vertex array with
+NumPy, uploads it once, and draws the traverses, feeds and arcs as
+sub-ranges of it.  Colours live in a second, per-vertex buffer so that a
+colour change only rewrites the range of the affected kind of motion.
+
+The vertices are computed exactly like linuxcnc.draw_lines does: the
+GEOMETRY string is applied to each point, and moves that change a rotary
+axis are split into the same number of pieces.
+"""
+
+import numpy
+from minigl import *
+from rs274.segments import START, END
+
+# segments converted at a time, to bound the size of the temporaries
+BATCH = 65536
+
+# the kinds of motion, in drawing order, with their colour names
+KINDS = (('traverse', 'traverse'), ('feed', 'straight_feed'),
+    ('arcfeed', 'arc_feed'))
+
+def supported():
+    """Return True if the current GL context has buffer objects
+
+    Must be called with a GL context current."""
+    try:
+        version = glGetString(GL_VERSION)
+    except error:
+        return False
+    if not version: return False
+    try:
+        major, minor = version.split()[0].split(".")[:2]
+        return (int(major), int(minor)) >= (1, 5)
+    except ValueError:
+        return False
+
+def _rotate(p, i, j, angle):
+    theta = numpy.radians(angle)
+    c = numpy.cos(theta); s = numpy.sin(theta)
+    pi = p[:, i] * c - p[:, j] * s
+    pj = p[:, i] * s + p[:, j] * c
+    p[:, i] = pi; p[:, j] = pj
+
+def vertex9(geometry, pts):
+    """Like linuxcnc.vertex9, for an (n, 9) array of points"""
+    p = numpy.zeros((len(pts), 3))
+    sign = 1
+    for ch in geometry:
+        if ch == '-':
+            sign = -1
+        elif ch in 'XYZ':
+            p[:, 'XYZ'.index(ch)] += pts[:, 'XYZ'.index(ch)] * sign
+            sign = 1
+        elif ch in 'UVW':
+            p[:, 'UVW'.index(ch)] += pts[:, 6 + 'UVW'.index(ch)] * sign
+            sign = 1
+        elif ch == 'A':
+            _rotate(p, 1, 2, pts[:, 3] * sign)
+            sign = 1
+        elif ch == 'B':
+            _rotate(p, 0, 2, pts[:, 4] * sign)
+            sign = 1
+        elif ch == 'C':
+            _rotate(p, 0, 1, pts[:, 5] * sign)
+            sign = 1
+    return p
+
+def line_vertices(geometry, coords):
+    """Return GL_LINES vertices for segment rows, and the vertex count of
+    each segment
+
+    coords are rows in the SegmentList format.  A move that changes A, B
+    or C becomes ceil(max(10, change/10)) lines, like in linuxcnc.line9.
+    """
+    start = coords[:, START]
+    end = coords[:, END]
+    dc = abs(end[:, 3:6] - start[:, 3:6]).max(1)
+    steps = numpy.where(dc != 0,
+        numpy.ceil(numpy.maximum(10, dc / 10)), 1).astype(numpy.intp)
+    n = len(coords)
+
+    if n and steps.max() == 1:
+        pts = numpy.empty((n, 2, 9))
+        pts[:, 0] = start
+        pts[:, 1] = end
+    else:
+        seg = numpy.repeat(numpy.arange(n), steps)
+        offsets = numpy.cumsum(steps) - steps
+        i = numpy.arange(len(seg)) - offsets[seg]
+        st = steps[seg].astype(numpy.float64)
+        t0 = (i / st)[:, None]
+        t1 = ((i + 1) / st)[:, None]
+        p1 = start[seg]
+        p2 = end[seg]
+        pts = numpy.empty((len(seg), 2, 9))
+        pts[:, 0] = t0 * p2 + (1 - t0) * p1
+        pts[:, 1] = t1 * p2 + (1 - t1) * p1
+    vertices = vertex9(geometry, pts.reshape(-1, 9)).astype(numpy.float32)
+    return vertices, 2 * steps
+
+class ProgramBuffer:
+    """The lines of a canon's preview in a vertex and a colour buffer
+
+    Must be created, drawn and deleted with the GL context current."""
+    def __init__(self, canon):
+        self.ranges = {}
+        self.first = {}
+        self.uploaded_colors = {}
+
+        parts = []
+        total = 0
+        for kind, color in KINDS:
+            lineno, coords, tool = getattr(canon, kind).arrays()
+            counts = [numpy.zeros(1, dtype=numpy.intp)]
+            begin = total
+            for i in range(0, len(coords), BATCH):
+                vertices, count = line_vertices(canon.geometry,
+                    coords[i:i+BATCH])
+                parts.append(vertices)
+                counts.append(count)
+                total += len(vertices)
+            # first[k] is the first vertex of segment k, relative to the
+            # start of this kind's range
+            self.first[kind] = numpy.cumsum(numpy.concatenate(counts))
+            self.ranges[kind] = begin, total - begin
+
+        self.vertex_buffer, self.color_buffer = glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        if parts:
+            glBufferData(GL_ARRAY_BUFFER, numpy.concatenate(parts),
+                GL_STATIC_DRAW)
+        else:
+            glBufferData(GL_ARRAY_BUFFER, 0, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferData(GL_ARRAY_BUFFER, 4 * total, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        glDeleteBuffers([self.vertex_buffer, self.color_buffer])
+        self.vertex_buffer = self.color_buffer = None
+
+    def set_color(self, kind, rgba, lo=0, hi=None):
+        """Colour the segments lo..hi of one kind of motion
+
+        rgba holds four values between 0 and 1."""
+        first = self.first[kind]
+        if hi is None: hi = len(first) - 1
+        begin = self.ranges[kind][0] + first[lo]
+        count = first[hi] - first[lo]
+        if count <= 0: return
+        c = (numpy.clip(rgba, 0, 1) * 255 + .5).astype(numpy.uint8)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferSubData(GL_ARRAY_BUFFER, 4 * int(begin),
+            numpy.tile(c, int(count)))
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def update_colors(self, colors):
+        """Upload the colours of the kinds of motion that changed since
+        the last call"""
+        for kind, name in KINDS:
+            rgba = tuple(colors[name]) + (colors.get(name + '_alpha', 1/3.),)
+            if self.uploaded_colors.get(kind) != rgba:
+                self.set_color(kind, rgba)
+                self.uploaded_colors[kind] = rgba
+
+    def draw_kind(self, kind):
+        begin, count = self.ranges[kind]
+        if count: glDrawArrays(GL_LINES, begin, count)
+
+    def draw(self, show_rapids):
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glVertexPointer(3, GL_FLOAT, 0, 0)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glColorPointer(4, GL_UNSIGNED_BYTE, 0, 0)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        if show_rapids:
+            glEnable(GL_LINE_STIPPLE)
+            self.draw_kind('traverse')
+            glDisable(GL_LINE_STIPPLE)
+        self.draw_kind('feed')
+        self.draw_kind('arcfeed')
+
+        glPopClientAttrib()
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,677 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""A software implementation of the OpenGL subset used by vismach
+
+This module has the same interface as minigl for the calls vismach and
+the model scripts make, and draws into a Framebuffer in memory with
+NumPy, so models can be rendered without a display or a GPU.
+
+It keeps the matrix stacks, materials, per-vertex diffuse lighting
+and display lists (which record calls and replay them).  The
+primitives of a frame are collected in clip coordinates and rasterised
+with a depth buffer when the frame is read back; triangles crossing the
+near plane are dropped rather than clipped.  Everything else (blending,
+stipple, fonts, ...) is accepted and ignored.
+"""
+
+import math
+import numpy
+
+GL_FALSE = 0
+GL_TRUE = 1
+GL_POINTS = 0x0000
+GL_LINES = 0x0001
+GL_LINE_LOOP = 0x0002
+GL_LINE_STRIP = 0x0003
+GL_TRIANGLES = 0x0004
+GL_TRIANGLE_STRIP = 0x0005
+GL_TRIANGLE_FAN = 0x0006
+GL_QUADS = 0x0007
+GL_QUAD_STRIP = 0x0008
+GL_POLYGON = 0x0009
+GL_LESS = 0x0201
+GL_ALWAYS = 0x0207
+GL_ONE = 1
+GL_CONSTANT_ALPHA = 0x8003
+GL_FRONT_AND_BACK = 0x0408
+GL_CULL_FACE = 0x0B44
+GL_LIGHTING = 0x0B50
+GL_DEPTH_TEST = 0x0B71
+GL_NORMALIZE = 0x0BA1
+GL_BLEND = 0x0BE2
+GL_LINE_STIPPLE = 0x0B24
+GL_MATRIX_MODE = 0x0BA0
+GL_MODELVIEW_MATRIX = 0x0BA6
+GL_PROJECTION_MATRIX = 0x0BA7
+GL_VIEWPORT = 0x0BA2
+GL_AMBIENT = 0x1200
+GL_DIFFUSE = 0x1201
+GL_SPECULAR = 0x1202
+GL_POSITION = 0x1203
+GL_AMBIENT_AND_DIFFUSE = 0x1602
+GL_COMPILE = 0x1300
+GL_COMPILE_AND_EXECUTE = 0x1301
+GL_MODELVIEW = 0x1700
+GL_PROJECTION = 0x1701
+GL_LIGHT0 = 0x4000
+GL_LIGHTING_BIT = 0x00000040
+GL_CURRENT_BIT = 0x00000001
+GL_ENABLE_BIT = 0x00002000
+GL_COLOR_BUFFER_BIT = 0x00004000
+GL_DEPTH_BUFFER_BIT = 0x00000100
+GL_CLIENT_VERTEX_ARRAY_BIT = 0x00000002
+GL_V3F = 0x2A21
+GL_C3F_V3F = 0x2A24
+GL_N3F_V3F = 0x2A25
+GL_VERTEX_ARRAY = 0x8074
+GL_NORMAL_ARRAY = 0x8075
+GL_COLOR_ARRAY = 0x8076
+
+class error(Exception): pass
+
+# fragments rasterised at a time, to bound the size of the temporaries
+CHUNK = 1 << 21
+
+class Framebuffer:
+    """A color and a depth buffer of width by height pixels
+
+    color is a (height, width, 3) float array with values between 0 and
+    1, depth a (height, width) array of window depths between 0 and 1.
+    Row 0 is the bottom of the picture, as in OpenGL."""
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.color = numpy.zeros((height, width, 3), dtype=numpy.float32)
+        self.depth = numpy.ones((height, width), dtype=numpy.float32)
+        self.triangles = []
+        self.lines = []
+
+    def clear(self, color, depth=True):
+        self.triangles = []
+        self.lines = []
+        self.color[:] = color
+        if depth: self.depth[:] = 1
+
+    def image(self):
+        """Rasterise the pending primitives and return the picture as a
+        (height, width, 3) uint8 array, top row first"""
+        self.flush()
+        return (numpy.clip(self.color[::-1], 0, 1) * 255 + .5).astype(numpy.uint8)
+
+    def depth_image(self):
+        """Rasterise the pending primitives and return the depth buffer,
+        top row first"""
+        self.flush()
+        return self.depth[::-1].copy()
+
+    def flush(self):
+        fragments = []
+        if self.triangles:
+            clip = numpy.concatenate([t[0] for t in self.triangles])
+            colors = numpy.concatenate([t[1] for t in self.triangles])
+            fragments.extend(self._raster_triangles(clip, colors))
+        if self.lines:
+            clip = numpy.concatenate([l[0] for l in self.lines])
+            colors = numpy.concatenate([l[1] for l in self.lines])
+            fragments.extend(self._raster_lines(clip, colors))
+        self.triangles = []
+        self.lines = []
+        if fragments:
+            self._depth_test(*[numpy.concatenate(f)
+                for f in zip(*fragments)])
+
+    def _window(self, clip):
+        # clip coordinates (..., 4) to window x, y and depth
+        xyz = clip[..., :3] / clip[..., 3:4]
+        x = (xyz[..., 0] + 1) * (self.width / 2.)
+        y = (xyz[..., 1] + 1) * (self.height / 2.)
+        return x, y, (xyz[..., 2] + 1) / 2
+
+    def _raster_triangles(self, clip, colors):
+        keep = (clip[:, :, 3] > 1e-9).all(1)
+        clip = clip[keep]; colors = colors[keep]
+        x, y, z = self._window(clip)
+        x0 = numpy.floor(x.min(1)).clip(0, self.width - 1).astype(numpy.intp)
+        x1 = numpy.ceil(x.max(1)).clip(0, self.width - 1).astype(numpy.intp)
+        y0 = numpy.floor(y.min(1)).clip(0, self.height - 1).astype(numpy.intp)
+        y1 = numpy.ceil(y.max(1)).clip(0, self.height - 1).astype(numpy.intp)
+        area = ((x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0])
+            - (x[:, 2] - x[:, 0]) * (y[:, 1] - y[:, 0]))
+        visible = ((x.max(1) >= 0) & (x.min(1) <= self.width)
+            & (y.max(1) >= 0) & (y.min(1) <= self.height) & (area != 0))
+
+        # triangles are grouped by the power of two that covers their
+        # bounding box, and each group is tested against a k by k grid
+        size = numpy.maximum(x1 - x0, y1 - y0) + 1
+        k = 1 << numpy.ceil(numpy.log2(size)).astype(numpy.intp)
+        for side in numpy.unique(k[visible]):
+            which = numpy.flatnonzero(visible & (k == side))
+            step = max(1, CHUNK // (side * side))
+            grid = numpy.arange(side * side)
+            for i in range(0, len(which), step):
+                t = which[i:i+step]
+                px = x0[t, None] + grid % side
+                py = y0[t, None] + grid // side
+                inside = (px <= x1[t, None]) & (py <= y1[t, None])
+                cx = px + .5; cy = py + .5
+                tx = x[t]; ty = y[t]
+                a = area[t, None]
+                w0 = ((tx[:, 1, None] - cx) * (ty[:, 2, None] - cy)
+                    - (tx[:, 2, None] - cx) * (ty[:, 1, None] - cy)) / a
+                w1 = ((tx[:, 2, None] - cx) * (ty[:, 0, None] - cy)
+                    - (tx[:, 0, None] - cx) * (ty[:, 2, None] - cy)) / a
+                w2 = 1 - w0 - w1
+                inside &= (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+                row, col = numpy.nonzero(inside)
+                if not len(row): continue
+                b0 = w0[row, col]; b1 = w1[row, col]; b2 = w2[row, col]
+                tt = t[row]
+                depth = b0 * z[tt, 0] + b1 * z[tt, 1] + b2 * z[tt, 2]
+                color = (b0[:, None] * colors[tt, 0] + b1[:, None] * colors[tt, 1]
+                    + b2[:, None] * colors[tt, 2])
+                yield (py[row, col] * self.width + px[row, col], depth, color)
+
+    def _raster_lines(self, clip, colors):
+        keep = (clip[:, :, 3] > 1e-9).all(1)
+        clip = clip[keep]; colors = colors[keep]
+        x, y, z = self._window(clip)
+        steps = numpy.ceil(numpy.maximum(abs(x[:, 1] - x[:, 0]),
+            abs(y[:, 1] - y[:, 0]))).clip(0, 4 * (self.width + self.height))
+        steps = steps.astype(numpy.intp) + 1
+        seg = numpy.repeat(numpy.arange(len(x)), steps)
+        offsets = numpy.cumsum(steps) - steps
+        f = ((numpy.arange(len(seg)) - offsets[seg])
+            / numpy.maximum(steps[seg] - 1, 1).astype(float))
+        px = numpy.floor(x[seg, 0] + f * (x[seg, 1] - x[seg, 0])).astype(numpy.intp)
+        py = numpy.floor(y[seg, 0] + f * (y[seg, 1] - y[seg, 0])).astype(numpy.intp)
+        depth = z[seg, 0] + f * (z[seg, 1] - z[seg, 0])
+        color = colors[seg, 0] + f[:, None] * (colors[seg, 1] - colors[seg, 0])
+        ok = (px >= 0) & (px < self.width) & (py >= 0) & (py < self.height)
+        yield (py[ok] * self.width + px[ok], depth[ok], color[ok])
+
+    def _depth_test(self, pixel, depth, color):
+        # the nearest fragment of each pixel, if it is nearer than what
+        # the depth buffer holds
+        order = numpy.lexsort((depth, pixel))
+        pixel = pixel[order]
+        first = numpy.ones(len(pixel), dtype=bool)
+        first[1:] = pixel[1:] != pixel[:-1]
+        pixel = pixel[first]
+        depth = depth[order][first]
+        color = color[order][first]
+        zbuf = self.depth.reshape(-1)
+        ok = (depth < zbuf[pixel]) & (depth >= 0)
+        zbuf[pixel[ok]] = depth[ok]
+        self.color.reshape(-1, 3)[pixel[ok]] = color[ok]
+
+class _Light:
+    def __init__(self):
+        self.enabled = False
+        self.position = numpy.array([0., 0., 1., 0.])
+        self.ambient = numpy.zeros(3)
+        self.diffuse = numpy.zeros(3)
+
+class _State:
+    def __init__(self):
+        self.framebuffer = None
+        self.clear_color = (0, 0, 0)
+        self.mode = GL_MODELVIEW
+        self.stacks = {GL_MODELVIEW: [numpy.identity(4)],
+            GL_PROJECTION: [numpy.identity(4)]}
+        self.material = numpy.array([.8, .8, .8])
+        self.color = numpy.array([1., 1., 1.])
+        self.normal = numpy.array([0., 0., 1.])
+        self.lighting = False
+        self.lights = [_Light() for i in range(8)]
+        self.attribs = []
+        self.begin = None
+        self.vertices = []
+        self.normals = []
+        self.arrays = None
+        self.client = []
+        self.lists = {}
+        self.next_list = 1
+        self.compiling = None
+        self.compiling_list = None
+        self.execute = True
+
+_state = _State()
+
+def make_current(framebuffer):
+    """Draw into framebuffer from now on"""
+    _state.framebuffer = framebuffer
+
+def reset():
+    """Forget all GL state except the display lists"""
+    lists, next_list = _state.lists, _state.next_list
+    _state.__init__()
+    _state.lists, _state.next_list = lists, next_list
+
+class Context(object):
+    """A GL state of its own, apart from the frame being drawn
+
+    The GL functions and constants of this module are attributes of a
+    Context; its functions draw into the context instead of the current
+    framebuffer, starting from identity matrices, so that something can
+    be drawn with context.glBegin(...) and so on while a frame is under
+    way."""
+    def __init__(self):
+        self.state = _State()
+        self.state.framebuffer = Framebuffer(1, 1)
+
+    def __getattr__(self, name):
+        if not name.startswith(("gl", "GL_")) or name not in globals():
+            raise AttributeError, name
+        value = globals()[name]
+        if not callable(value): return value
+        state = self.state
+        def call(*args):
+            global _state
+            saved = _state
+            _state = state
+            try:
+                return value(*args)
+            finally:
+                _state = saved
+        call.__name__ = name
+        setattr(self, name, call)
+        return call
+
+    def triangles(self):
+        """The triangles drawn so far as a (t, 3, 3) array in object
+        coordinates"""
+        found = [t[0] for t in self.state.framebuffer.triangles]
+        if not found: return numpy.zeros((0, 3, 3))
+        clip = numpy.concatenate(found)
+        return clip[:, :, :3] / clip[:, :, 3:4]
+
+def _command(f):
+    # a GL command is recorded into the display list being compiled, and
+    # executed unless the list is compiled only
+    def command(*args):
+        if _state.compiling is not None:
+            _state.compiling.append((f, args))
+            if not _state.execute: return
+        return f(*args)
+    command.__name__ = f.__name__
+    command.__doc__ = f.__doc__
+    return command
+
+def _ignore(*args):
+    pass
+
+def _matrix():
+    return _state.stacks[_state.mode][-1]
+
+def _multiply(m):
+    stack = _state.stacks[_state.mode]
+    stack[-1] = numpy.dot(stack[-1], m)
+
+def _rotation(angle, x, y, z):
+    v = numpy.array([x, y, z], dtype=float)
+    l = math.sqrt(numpy.dot(v, v))
+    m = numpy.identity(4)
+    if not l: return m
+    x, y, z = v / l
+    c = math.cos(math.radians(angle)); s = math.sin(math.radians(angle))
+    m[:3, :3] = [[x*x*(1-c)+c, x*y*(1-c)-z*s, x*z*(1-c)+y*s],
+                 [y*x*(1-c)+z*s, y*y*(1-c)+c, y*z*(1-c)-x*s],
+                 [x*z*(1-c)-y*s, y*z*(1-c)+x*s, z*z*(1-c)+c]]
+    return m
+
+@_command
+def glMatrixMode(mode):
+    _state.mode = mode
+
+@_command
+def glLoadIdentity():
+    _state.stacks[_state.mode][-1] = numpy.identity(4)
+
+@_command
+def glPushMatrix():
+    stack = _state.stacks[_state.mode]
+    stack.append(stack[-1].copy())
+
+@_command
+def glPopMatrix():
+    stack = _state.stacks[_state.mode]
+    if len(stack) == 1: raise error, "matrix stack underflow"
+    stack.pop()
+
+@_command
+def glTranslatef(x, y, z):
+    m = numpy.identity(4)
+    m[:3, 3] = x, y, z
+    _multiply(m)
+
+@_command
+def glScalef(x, y, z):
+    _multiply(numpy.diag([x, y, z, 1.]))
+
+@_command
+def glRotatef(angle, x, y, z):
+    _multiply(_rotation(angle, x, y, z))
+
+@_command
+def glMultMatrixd(m):
+    _multiply(numpy.array(m, dtype=float).reshape(4, 4).T)
+
+@_command
+def glOrtho(left, right, bottom, top, near, far):
+    m = numpy.identity(4)
+    m[0, 0] = 2. / (right - left); m[0, 3] = -(right + left) / float(right - left)
+    m[1, 1] = 2. / (top - bottom); m[1, 3] = -(top + bottom) / float(top - bottom)
+    m[2, 2] = -2. / (far - near); m[2, 3] = -(far + near) / float(far - near)
+    _multiply(m)
+
+@_command
+def gluPerspective(fovy, aspect, near, far):
+    f = 1 / math.tan(math.radians(fovy) / 2)
+    m = numpy.zeros((4, 4))
+    m[0, 0] = f / aspect
+    m[1, 1] = f
+    m[2, 2] = (far + near) / float(near - far)
+    m[2, 3] = 2. * far * near / (near - far)
+    m[3, 2] = -1
+    _multiply(m)
+
+@_command
+def gluLookAt(ex, ey, ez, cx, cy, cz, ux, uy, uz):
+    f = numpy.array([cx - ex, cy - ey, cz - ez], dtype=float)
+    f /= math.sqrt(numpy.dot(f, f))
+    s = numpy.cross(f, [ux, uy, uz])
+    s /= math.sqrt(numpy.dot(s, s))
+    u = numpy.cross(s, f)
+    m = numpy.identity(4)
+    m[0, :3] = s; m[1, :3] = u; m[2, :3] = -f
+    _multiply(m)
+    glTranslatef(-ex, -ey, -ez)
+
+def glGetDoublev(pname):
+    if pname == GL_MODELVIEW_MATRIX:
+        return list(_state.stacks[GL_MODELVIEW][-1].T.ravel())
+    if pname == GL_PROJECTION_MATRIX:
+        return list(_state.stacks[GL_PROJECTION][-1].T.ravel())
+    if pname == GL_MATRIX_MODE:
+        return _state.mode
+    if pname == GL_VIEWPORT:
+        fb = _state.framebuffer
+        return [0, 0, fb.width, fb.height]
+    raise error, "glGetDoublev: unsupported parameter %d" % pname
+
+@_command
+def glViewport(x, y, width, height):
+    pass
+
+def glClearColor(r, g, b, a):
+    _state.clear_color = (r, g, b)
+
+def glClear(mask):
+    if mask & GL_COLOR_BUFFER_BIT:
+        _state.framebuffer.clear(_state.clear_color,
+            bool(mask & GL_DEPTH_BUFFER_BIT))
+
+@_command
+def glEnable(cap):
+    _set_enable(cap, True)
+
+@_command
+def glDisable(cap):
+    _set_enable(cap, False)
+
+def _set_enable(cap, value):
+    if cap == GL_LIGHTING:
+        _state.lighting = value
+    elif GL_LIGHT0 <= cap < GL_LIGHT0 + 8:
+        _state.lights[cap - GL_LIGHT0].enabled = value
+
+@_command
+def glLightfv(light, pname, params):
+    l = _state.lights[light - GL_LIGHT0]
+    if pname == GL_POSITION:
+        # like OpenGL, the position is taken in eye coordinates
+        l.position = numpy.dot(_state.stacks[GL_MODELVIEW][-1],
+            numpy.array(params, dtype=float))
+    elif pname == GL_AMBIENT:
+        l.ambient = numpy.array(params[:3], dtype=float)
+    elif pname == GL_DIFFUSE:
+        l.diffuse = numpy.array(params[:3], dtype=float)
+
+@_command
+def glMaterialfv(face, pname, params):
+    if pname in (GL_AMBIENT_AND_DIFFUSE, GL_DIFFUSE):
+        _state.material = numpy.array(params[:3], dtype=float)
+
+@_command
+def glColor3f(r, g, b):
+    _state.color = numpy.array([r, g, b], dtype=float)
+
+@_command
+def glPushAttrib(mask):
+    _state.attribs.append((_state.material, _state.color, _state.lighting,
+        [l.enabled for l in _state.lights]))
+
+@_command
+def glPopAttrib():
+    material, color, lighting, enabled = _state.attribs.pop()
+    _state.material = material
+    _state.color = color
+    _state.lighting = lighting
+    for l, e in zip(_state.lights, enabled): l.enabled = e
+
+@_command
+def glNormal3f(x, y, z):
+    _state.normal = numpy.array([x, y, z], dtype=float)
+
+@_command
+def glBegin(mode):
+    _state.begin = mode
+    _state.vertices = []
+    _state.normals = []
+
+@_command
+def glVertex3f(x, y, z):
+    _state.vertices.append((x, y, z))
+    _state.normals.append(_state.normal)
+
+@_command
+def glEnd():
+    mode = _state.begin
+    _state.begin = None
+    if not _state.vertices: return
+    _primitives(mode, numpy.array(_state.vertices, dtype=float),
+        numpy.array(_state.normals, dtype=float))
+
+def _triangle_indices(mode, n):
+    # the corners of the triangles of a primitive of n vertices
+    if mode == GL_TRIANGLES:
+        return numpy.arange(n - n % 3).reshape(-1, 3)
+    if mode in (GL_TRIANGLE_FAN, GL_POLYGON):
+        i = numpy.arange(1, n - 1)
+        return numpy.column_stack((numpy.zeros_like(i), i, i + 1))
+    if mode == GL_TRIANGLE_STRIP:
+        i = numpy.arange(n - 2)
+        return numpy.column_stack((i, i + 1 + i % 2, i + 2 - i % 2))
+    if mode == GL_QUADS:
+        q = numpy.arange(n - n % 4).reshape(-1, 4)
+        return numpy.concatenate((q[:, :3], q[:, [0, 2, 3]]))
+    if mode == GL_QUAD_STRIP:
+        i = numpy.arange(0, n - 3, 2)
+        return numpy.concatenate((numpy.column_stack((i, i + 1, i + 3)),
+            numpy.column_stack((i, i + 3, i + 2))))
+    return None
+
+def _line_indices(mode, n):
+    if mode == GL_LINES:
+        return numpy.arange(n - n % 2).reshape(-1, 2)
+    if mode in (GL_LINE_STRIP, GL_LINE_LOOP):
+        i = numpy.arange(n - 1)
+        lines = numpy.column_stack((i, i + 1))
+        if mode == GL_LINE_LOOP and n > 2:
+            lines = numpy.vstack((lines, [[n - 1, 0]]))
+        return lines
+    return None
+
+def _shade(eye_normals):
+    if not _state.lighting:
+        return numpy.tile(_state.color, (len(eye_normals), 1))
+    n = eye_normals / numpy.maximum(
+        numpy.sqrt((eye_normals ** 2).sum(1)), 1e-12)[:, None]
+    light = numpy.zeros((len(n), 3)) + .2
+    for l in _state.lights:
+        if not l.enabled: continue
+        d = l.position[:3] / max(math.sqrt(numpy.dot(l.position[:3],
+            l.position[:3])), 1e-12)
+        light += l.ambient + numpy.maximum(n.dot(d), 0)[:, None] * l.diffuse
+    return numpy.clip(light * _state.material, 0, 1)
+
+def _primitives(mode, vertices, normals):
+    """Transform the vertices and queue the primitives they make"""
+    fb = _state.framebuffer
+    modelview = _state.stacks[GL_MODELVIEW][-1]
+    projection = _state.stacks[GL_PROJECTION][-1]
+    v = numpy.hstack((vertices, numpy.ones((len(vertices), 1))))
+    clip = numpy.dot(v, numpy.dot(projection, modelview).T)
+    normal_matrix = numpy.linalg.inv(modelview[:3, :3]).T
+    colors = _shade(numpy.dot(normals, normal_matrix.T))
+    triangles = _triangle_indices(mode, len(vertices))
+    if triangles is not None:
+        if len(triangles):
+            fb.triangles.append((clip[triangles], colors[triangles]))
+        return
+    lines = _line_indices(mode, len(vertices))
+    if lines is not None and len(lines):
+        fb.lines.append((clip[lines], colors[lines]))
+
+@_command
+def glLineWidth(width):
+    pass
+
+def glGenLists(n):
+    first = _state.next_list
+    _state.next_list += n
+    return first
+
+def glNewList(n, mode):
+    if _state.compiling is not None:
+        raise error, "glNewList: already compiling a display list"
+    _state.compiling = []
+    _state.compiling_list = n
+    _state.execute = mode == GL_COMPILE_AND_EXECUTE
+
+def glEndList():
+    _state.lists[_state.compiling_list] = _state.compiling
+    _state.compiling = None
+    _state.execute = True
+
+@_command
+def glCallList(n):
+    for f, args in _state.lists.get(n, ()):
+        f(*args)
+
+def glDeleteLists(first, n):
+    for i in range(first, first + n):
+        _state.lists.pop(i, None)
+
+def glInterleavedArrays(format, stride, data):
+    a = numpy.frombuffer(data, dtype=numpy.float32)
+    if format == GL_N3F_V3F:
+        a = a.reshape(-1, 6)
+        _state.arrays = a[:, 3:], a[:, :3]
+    elif format == GL_V3F:
+        a = a.reshape(-1, 3)
+        _state.arrays = a, None
+    else:
+        raise error, "glInterleavedArrays: unsupported format %d" % format
+
+def glDrawArrays(mode, first, count):
+    vertices, normals = _state.arrays
+    vertices = numpy.array(vertices[first:first+count], dtype=float)
+    if normals is None:
+        normals = numpy.tile(_state.normal, (len(vertices), 1))
+    else:
+        normals = numpy.array(normals[first:first+count], dtype=float)
+    # the arrays are read when the call is compiled, as in OpenGL
+    _command(_primitives)(mode, vertices, normals)
+
+def glPushClientAttrib(mask):
+    _state.client.append(_state.arrays)
+
+def glPopClientAttrib():
+    _state.arrays = _state.client.pop()
+
+def glFlush():
+    if _state.framebuffer: _state.framebuffer.flush()
+
+glFinish = glFlush
+
+class _Quadric: pass
+
+def gluNewQuadric():
+    return _Quadric()
+
+def _circle(slices):
+    a = numpy.arange(slices + 1) * (2 * math.pi / slices)
+    return numpy.sin(a), numpy.cos(a)
+
+@_command
+def gluCylinder(q, base, top, height, slices, stacks):
+    s, c = _circle(slices)
+    z = numpy.linspace(0, height, stacks + 1)
+    r = numpy.linspace(base, top, stacks + 1)
+    # the normals lean with the slope of the side
+    nz = (base - top) / float(height) if height else 0
+    vertices = []; normals = []
+    for j in range(stacks):
+        for rr, zz in ((r[j], z[j]), (r[j+1], z[j+1])):
+            vertices.append(numpy.column_stack((rr * s, rr * c,
+                numpy.repeat(zz, slices + 1))))
+            normals.append(numpy.column_stack((s, c,
+                numpy.repeat(nz, slices + 1))))
+    for j in range(stacks):
+        v = numpy.empty((2 * (slices + 1), 3)); n = numpy.empty_like(v)
+        v[0::2] = vertices[2*j]; v[1::2] = vertices[2*j+1]
+        n[0::2] = normals[2*j]; n[1::2] = normals[2*j+1]
+        _primitives(GL_QUAD_STRIP, v, n)
+
+@_command
+def gluDisk(q, inner, outer, slices, loops):
+    s, c = _circle(slices)
+    r = numpy.linspace(inner, outer, loops + 1)
+    for j in range(loops):
+        v = numpy.empty((2 * (slices + 1), 3))
+        v[0::2] = numpy.column_stack((r[j+1] * s, r[j+1] * c,
+            numpy.zeros(slices + 1)))
+        v[1::2] = numpy.column_stack((r[j] * s, r[j] * c,
+            numpy.zeros(slices + 1)))
+        _primitives(GL_QUAD_STRIP, v, numpy.tile([0., 0., 1.], (len(v), 1)))
+
+@_command
+def gluSphere(q, radius, slices, stacks):
+    s, c = _circle(slices)
+    phi = numpy.linspace(0, math.pi, stacks + 1)
+    for j in range(stacks):
+        n = numpy.empty((2 * (slices + 1), 3))
+        for k, p in ((0, phi[j]), (1, phi[j+1])):
+            n[k::2] = numpy.column_stack((math.sin(p) * s, math.sin(p) * c,
+                numpy.repeat(math.cos(p), slices + 1)))
+        _primitives(GL_QUAD_STRIP, n * radius, n)
+
+# state that has no effect on the picture
+glDepthFunc = glDepthMask = glBlendFunc = glBlendColor = _ignore
+glRasterPos2i = glBitmap = glLineStipple = glPolygonOffset = _ignore
+glEnableClientState = glDisableClientState = _ignore
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -32,7 +32,10 @@ import traceback
 # is not included in the pydoc documentation __All__ should list all 
 # functions in this module
 __all__=["read_file","nodeiterator",
-        "widget_creator","paramiterator","updater","create_vcp"]
+        "widget_creator","paramiterator","watch_widgets","updater","create_vcp"]
+
+# default update period in ms, <pyvcp update_period="..."> changes it
+period = 100
 
 
 
@@ -58,6 +61,13 @@ def read_file():
         print "Error: no pyvcp element in file!"
         sys.exit()
     pyvcproot=e
+    global period
+    if e.getAttribute("update_period"):
+        try:
+            period = max(1, int(e.getAttribute("update_period")))
+        except ValueError:
+            print "Error: update_period must be a number of milliseconds"
+            sys.exit(1)
     nodeiterator(pyvcproot,pyvcp0) 
 
 
@@ -147,12 +157,46 @@ def paramiterator(node):
 
 
 
-def updater():
-     """ calls pyvcp_widgets.update() on each widget repeatedly every 100 ms """
-     global widgets, pycomp
+polled=[]
+watchers={}
+values={}
+def watch_widgets():
+     """
+        sorts the widgets for updater(): those listing their input pins in
+        'halinputs' are updated only when one of the pins changes, the
+        others on every pass
+     """
+     global polled, watchers, values
+     polled, watchers, values = [], {}, {}
      for a in widgets:
+          pins = getattr(a, "halinputs", None)
+          if pins is None:
+               polled.append(a)
+          else:
+               for p in pins:
+                    watchers.setdefault(p, []).append(a)
+
+def updater():
+     """
+        reads all the watched input pins in one pass and calls
+        pyvcp_widgets.update() on the widgets whose pins changed and on the
+        polled widgets, repeatedly every 'period' ms
+     """
+     global pycomp
+     changed = []
+     for p, ws in watchers.iteritems():
+          v = pycomp[p]
+          if p not in values or values[p] != v:
+               values[p] = v
+               changed.extend(ws)
+     done = set()
+     for a in changed:
+          if a not in done:
+               done.add(a)
+               a.update(pycomp)
+     for a in polled:
           a.update(pycomp)
-     pyvcp0.after(100,updater)
+     pyvcp0.after(period,updater)
 
 
 
@@ -175,6 +219,7 @@ def create_vcp(master, comp = None, compname="pyvcp"):
 
     pycomp = comp
     read_file() 
+    watch_widgets()
     updater()
     return comp
     
@@ -0,0 +1,203 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Clearance between the parts of a vismach model
+
+The surface of a part is sampled into points no further apart than a
+given resolution, and the points are kept in a SphereTree: a binary tree
+of bounding spheres and boxes, built once in the part's own coordinates.  The
+distance between two parts in some relative position is found by
+walking both trees at once, a whole level of node pairs per step with
+NumPy, and dropping the pairs whose bounds (a sphere and a box per node)
+are further apart than the distance limit or than a pair already known
+to be closer.  A first
+close pair is found by walking straight down to the nearest leaves, and
+only the few leaves that are left have their points compared.
+
+The distance found is that between the sampled points, so it is correct
+to about the resolution; parts are considered to touch when it is not
+more than the resolution.
+"""
+
+import math
+import numpy
+
+LEAF_SIZE = 16
+# leaf pairs whose points are compared at a time
+BATCH = 32
+
+def surface_points(triangles, spacing):
+    """Points on the (t, 3, 3) triangles, no further than about spacing
+    from their neighbours"""
+    triangles = numpy.asarray(triangles, dtype=float)
+    if not len(triangles): return numpy.zeros((0, 3))
+    # each triangle is walked in rows parallel to its longest edge, from
+    # that edge to the opposite corner, so long thin triangles only get
+    # a few rows
+    edges = numpy.roll(triangles, -1, axis=1) - triangles
+    lengths = numpy.sqrt((edges ** 2).sum(2))
+    first = lengths.argmax(1)
+    rows = numpy.arange(len(triangles))
+    a = triangles[rows, first]
+    b = triangles[rows, (first + 1) % 3]
+    c = triangles[rows, (first + 2) % 3]
+    longest = lengths[rows, first]
+    area = numpy.sqrt((numpy.cross(b - a, c - a) ** 2).sum(1)) / 2
+    height = 2 * area / numpy.maximum(longest, 1e-12)
+    across = numpy.maximum(numpy.ceil(longest / spacing), 1).astype(int)
+    up = numpy.maximum(numpy.ceil(height / spacing), 1).astype(int)
+    points = []
+    for n, m in set(zip(across, up)):
+        which = (across == n) & (up == m)
+        s, t = numpy.mgrid[0:n+1, 0:m+1]
+        s = s.ravel() / float(n); t = t.ravel() / float(m)
+        # the point at s along the edge, moved t of the way to the corner
+        weights = numpy.column_stack(((1 - s) * (1 - t), s * (1 - t), t))
+        corners = numpy.concatenate((a[which], b[which], c[which]), 1)
+        corners = corners.reshape(-1, 3, 3)
+        points.append(numpy.dot(weights, corners).transpose(1, 0, 2).reshape(-1, 3))
+    return numpy.concatenate(points)
+
+class SphereTree:
+    """A bounding sphere tree over a set of points
+
+    center, radius:  the sphere of each node; node 0 is the root
+    low, high:  the bounding box of each node
+    child:  the two children of each node, -1 for leaves
+    leaf:  the index of each leaf node into points, which holds
+        LEAF_SIZE points per leaf (short leaves repeat a point)"""
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        points = numpy.asarray(points, dtype=float).reshape(-1, 3)
+        if not len(points): points = numpy.zeros((1, 3))
+        order = numpy.arange(len(points))
+        center = []; radius = []; child = []; leaf = []; leaves = []
+        lows = []; highs = []
+        # build depth first; a node's children are filled in once they
+        # are numbered
+        stack = [(0, len(points), -1, 0)]
+        while stack:
+            lo, hi, parent, side = stack.pop()
+            node = len(center)
+            if parent >= 0: child[parent][side] = node
+            p = points[order[lo:hi]]
+            low = p.min(0); high = p.max(0)
+            c = (low + high) / 2
+            lows.append(low); highs.append(high)
+            center.append(c)
+            radius.append(math.sqrt(((p - c) ** 2).sum(1).max()))
+            if hi - lo <= leaf_size:
+                child.append([-1, -1])
+                leaf.append(len(leaves))
+                pad = numpy.empty((leaf_size, 3))
+                pad[:] = p[0]
+                pad[:len(p)] = p
+                leaves.append(pad)
+                continue
+            child.append([0, 0])
+            leaf.append(-1)
+            axis = (high - low).argmax()
+            mid = (hi - lo) // 2
+            part = numpy.argpartition(p[:, axis], mid)
+            order[lo:hi] = order[lo:hi][part]
+            stack.append((lo + mid, hi, node, 1))
+            stack.append((lo, lo + mid, node, 0))
+        self.center = numpy.array(center)
+        self.radius = numpy.array(radius)
+        self.low = numpy.array(lows)
+        self.high = numpy.array(highs)
+        self.child = numpy.array(child, dtype=numpy.intp)
+        self.leaf = numpy.array(leaf, dtype=numpy.intp)
+        self.points = numpy.array(leaves)
+
+    def __len__(self):
+        return len(self.center)
+
+def _transform(m, points):
+    return numpy.dot(points, m[:3, :3].T) + m[:3, 3]
+
+def _closest_leaves(a, b, matrix):
+    # walk down both trees towards the nearest children, for a first
+    # distance that is close to the real one
+    i = j = 0
+    while a.child[i, 0] >= 0 or b.child[j, 0] >= 0:
+        if a.child[i, 0] >= 0 and (b.child[j, 0] < 0 or a.radius[i] >= b.radius[j]):
+            c = a.center[a.child[i]] - _transform(matrix, b.center[j])
+            i = a.child[i, (c * c).sum(1).argmin()]
+        else:
+            c = _transform(matrix, b.center[b.child[j]]) - a.center[i]
+            j = b.child[j, (c * c).sum(1).argmin()]
+    return i, j
+
+def _box_distance(low, high, points):
+    gap = numpy.maximum(numpy.maximum(low - points, points - high), 0)
+    return numpy.sqrt((gap * gap).sum(-1))
+
+def _leaf_distance(a, b, matrix, ia, ib):
+    pa = a.points[a.leaf[ia]]
+    pb = _transform(matrix, b.points[b.leaf[ib]])
+    return math.sqrt(((pa[:, :, None] - pb[:, None, :]) ** 2).sum(-1).min())
+
+def clearance(a, b, matrix, limit, tolerance=0):
+    """Return the distance between the points of the SphereTrees a and b,
+    with b placed in the coordinates of a by the 4x4 matrix, or limit if
+    they are further apart than that
+
+    Parts of the trees that cannot bring the distance down by more than
+    tolerance are skipped, so the result may be that much too large."""
+    best = float(limit)
+    inverse = numpy.linalg.inv(matrix)
+    ia = numpy.zeros(1, dtype=numpy.intp)
+    ib = numpy.zeros(1, dtype=numpy.intp)
+    d = math.sqrt(((a.center[0] - _transform(matrix, b.center[0])) ** 2).sum())
+    if d - a.radius[0] - b.radius[0] > best: return best
+    i, j = _closest_leaves(a, b, matrix)
+    best = min(best, _leaf_distance(a, b, matrix, [i], [j]))
+    # once the distance is within tolerance of zero it cannot get
+    # better by more than tolerance
+    while len(ia) and best > tolerance:
+        ra = a.radius[ia]; rb = b.radius[ib]
+        # no point of one node is nearer than the distance from the
+        # box of the other node to the sphere of the first
+        bound = numpy.maximum(
+            _box_distance(a.low[ia], a.high[ia],
+                _transform(matrix, b.center[ib])) - rb,
+            _box_distance(b.low[ib], b.high[ib],
+                _transform(inverse, a.center[ia])) - ra)
+        keep = bound < best - tolerance
+        ia = ia[keep]; ib = ib[keep]; ra = ra[keep]; rb = rb[keep]
+        bound = bound[keep]
+        leaf_a = a.child[ia, 0] < 0
+        leaf_b = b.child[ib, 0] < 0
+        done = leaf_a & leaf_b
+        if done.any():
+            # compare the leaf pairs nearest first, a batch at a time,
+            # until the rest cannot be closer
+            order = bound[done].argsort()
+            bound = bound[done][order]
+            la = ia[done][order]; lb = ib[done][order]
+            k = 0
+            while k < len(la) and bound[k] < best - tolerance:
+                best = min(best, _leaf_distance(a, b, matrix,
+                    la[k:k+BATCH], lb[k:k+BATCH]))
+                k += BATCH
+        # open the bigger sphere of each pair, unless it is a leaf
+        split_a = ~leaf_a & (leaf_b | (ra >= rb))
+        split_b = ~done & ~split_a
+        ia = numpy.concatenate((a.child[ia[split_a]].ravel(),
+            numpy.repeat(ia[split_b], 2)))
+        ib = numpy.concatenate((numpy.repeat(ib[split_a], 2),
+            b.child[ib[split_b]].ravel()))
+    return best
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -14,10 +14,25 @@
 #    along with this program; if not, write to the Free Software
 #    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
-import rs274.OpenGLTk, Tkinter, signal, hal
+import rs274.OpenGLTk, Tkinter, signal, hal, time
+import minigl
 from minigl import *
 from math import *
 import glnav
+import vismesh
+import viscollide
+from functools import partial
+import numpy
+
+def constant(method):
+    '''mark a method whose GL commands are the same on every frame, so
+    that it can be compiled into a display list.  A subclass that
+    overrides the method without marking it is drawn every frame.'''
+    method.constant = True
+    return method
+
+def _is_constant(part, name):
+    return getattr(getattr(part, name), "constant", False)
 
 class Collection(object):
     def __init__(self, parts):
@@ -51,29 +66,129 @@ class Collection(object):
     def set_volume(self,vol):
 	self.vol = vol;
 
+class CompiledModel(object):
+    """Draw a model through as few display lists as possible
+
+    The first traverse flattens the part tree into a list of steps in
+    drawing order.  Runs of steps that are the same on every frame (fixed
+    transforms, colors and shapes) are compiled into one display list
+    each, so that a frame only calls the steps that follow HAL pins
+    (HalTranslate, HalRotate, Track, Capture and parts this module does
+    not know) in between those lists.  Must be traversed with the GL
+    context current."""
+    def __init__(self, model):
+        self.model = model
+        self.steps = None
+        self.lists = []
+
+    def traverse(self):
+        if self.steps is None:
+            self.steps = self.compile()
+        for step in self.steps:
+            step()
+
+    def volume(self):
+        return self.model.volume()
+
+    def flatten(self, parts, steps):
+        """Append (constant, function, part) for each GL step of parts
+        to steps, in the order Collection.traverse calls them"""
+        for p in parts:
+            if hasattr(p, "apply"):
+                steps.append((_is_constant(p, "apply"), p.apply, p))
+            if hasattr(p, "capture"):
+                steps.append((False, p.capture, p))
+            if hasattr(p, "draw"):
+                const = (_is_constant(p, "draw")
+                    and (not hasattr(p, "is_constant") or p.is_constant()))
+                steps.append((const, p.draw, p))
+            if hasattr(p, "traverse"):
+                if getattr(p.traverse, "im_func", None) is Collection.traverse.im_func:
+                    self.flatten(p.parts, steps)
+                else:
+                    steps.append((False, p.traverse, p))
+            if hasattr(p, "unapply"):
+                steps.append((_is_constant(p, "unapply"), p.unapply, p))
+
+    def components(self):
+        """Return the HAL components whose pins the model follows, or
+        None if some part may change without any of their pins changing"""
+        flat = []
+        self.flatten([self.model], flat)
+        result = []
+        for const, function, part in flat:
+            # captures and tracks only follow the transforms around them
+            if const or isinstance(part, (Capture, Collider, Track)): continue
+            found = [v for v in getattr(part, "__dict__", {}).values()
+                if isinstance(v, hal.component)]
+            if not found: return None
+            for c in found:
+                if c not in result: result.append(c)
+        return result
+
+    def compile(self):
+        flat = []
+        self.flatten([self.model], flat)
+        steps = []
+        i = 0
+        while i < len(flat):
+            if not flat[i][0]:
+                steps.append(flat[i][1])
+                i += 1
+                continue
+            j = i
+            while j < len(flat) and flat[j][0]:
+                j += 1
+            # parts with display lists of their own make them first,
+            # because display lists cannot be created while compiling one
+            for const, function, part in flat[i:j]:
+                if hasattr(part, "prepare"):
+                    part.prepare()
+            l = glGenLists(1)
+            glNewList(l, GL_COMPILE)
+            for const, function, part in flat[i:j]:
+                function()
+            glEndList()
+            self.lists.append(l)
+            steps.append(partial(glCallList, l))
+            i = j
+        return steps
+
+    def clear(self):
+        """Delete the display lists, so that the next traverse compiles
+        the model again"""
+        for l in self.lists:
+            glDeleteLists(l, 1)
+        self.lists = []
+        self.steps = None
+
 class Translate(Collection):
     def __init__(self, parts, x, y, z):
 	self.parts = parts
 	self.where = x, y, z
 
-    def apply(self):
-	glPushMatrix()
-	glTranslatef(*self.where)
+    @constant
+    def apply(self, gl=minigl):
+	gl.glPushMatrix()
+	gl.glTranslatef(*self.where)
 
-    def unapply(self):
-	glPopMatrix()
+    @constant
+    def unapply(self, gl=minigl):
+	gl.glPopMatrix()
 
 class Scale(Collection):
     def __init__(self, parts, x, y, z):
 	self.parts = parts
 	self.scaleby = x, y, z
 
-    def apply(self):
-	glPushMatrix()
-	glScalef(*self.scaleby)
+    @constant
+    def apply(self, gl=minigl):
+	gl.glPushMatrix()
+	gl.glScalef(*self.scaleby)
 
-    def unapply(self):
-	glPopMatrix()
+    @constant
+    def unapply(self, gl=minigl):
+	gl.glPopMatrix()
 
 class HalTranslate(Collection):
     def __init__(self, parts, comp, var, x, y, z):
@@ -82,15 +197,16 @@ class HalTranslate(Collection):
 	self.comp = comp
 	self.var = var
 
-    def apply(self):
+    def apply(self, gl=minigl):
 	x, y, z = self.where
 	v = self.comp[self.var]
 	
-	glPushMatrix()
-	glTranslatef(x*v, y*v, z*v)
+	gl.glPushMatrix()
+	gl.glTranslatef(x*v, y*v, z*v)
 
-    def unapply(self):
-	glPopMatrix()
+    @constant
+    def unapply(self, gl=minigl):
+	gl.glPopMatrix()
 
 
 class HalRotate(Collection):
@@ -100,13 +216,14 @@ class HalRotate(Collection):
 	self.comp = comp
 	self.var = var
 
-    def apply(self):
+    def apply(self, gl=minigl):
 	th, x, y, z = self.where
-	glPushMatrix()
-	glRotatef(th * self.comp[self.var], x, y, z)
+	gl.glPushMatrix()
+	gl.glRotatef(th * self.comp[self.var], x, y, z)
 
-    def unapply(self):
-	glPopMatrix()
+    @constant
+    def unapply(self, gl=minigl):
+	gl.glPopMatrix()
 
 
 class Rotate(Collection):
@@ -114,13 +231,15 @@ class Rotate(Collection):
 	self.parts = parts
 	self.where = th, x, y, z
 
-    def apply(self):
+    @constant
+    def apply(self, gl=minigl):
 	th, x, y, z = self.where
-	glPushMatrix()
-	glRotatef(th, x, y, z)
+	gl.glPushMatrix()
+	gl.glRotatef(th, x, y, z)
 
-    def unapply(self):
-	glPopMatrix()
+    @constant
+    def unapply(self, gl=minigl):
+	gl.glPopMatrix()
 
 
 class Track(Collection):
@@ -150,12 +269,12 @@ class Track(Collection):
 	return([wx,wy,wz])
 	
 	
-    def apply(self):
+    def apply(self, gl=minigl):
 	#make sure we have something to work with first
 	if (self.world2view.t == []):
 		#something's borkled - give up
 		print "vismach.py: Track: why am i here? world is not in the scene yet"
-		glPushMatrix()
+		gl.glPushMatrix()
 		return
 	
 	view2world = invert(self.world2view.t)
@@ -171,14 +290,15 @@ class Track(Collection):
 		HUD.strs += ["current coords: %3.4f %3.4f %3.4f " % (px, py, pz)]
 		HUD.strs += ["target coords: %3.4f %3.4f %3.4f" %  (tx, ty, tz)]
 		HUD.strs += ["az,el,r: %3.4f %3.4f %3.4f" %  (az,el,r)]
-	glPushMatrix()
-	glTranslatef(px,py,pz)
-	glRotatef(az-90,0,0,1)
-	glRotatef(el-90,1,0,0)
+	gl.glPushMatrix()
+	gl.glTranslatef(px,py,pz)
+	gl.glRotatef(az-90,0,0,1)
+	gl.glRotatef(el-90,1,0,0)
 
 
-    def unapply(self):
-		glPopMatrix()
+    @constant
+    def unapply(self, gl=minigl):
+		gl.glPopMatrix()
 
 class CoordsBase(object):
     def __init__(self, *args):
@@ -190,9 +310,15 @@ class CoordsBase(object):
 	self._coords = args
 	self.q = gluNewQuadric()
 
+    @constant
     def coords(self):
 	return map(self._coord, self._coords)
 
+    def is_constant(self):
+	# True if the shape does not follow any HAL pin
+	return (_is_constant(self, "coords")
+		and not [v for v in self._coords if isinstance(v, str)])
+
     def _coord(self, v):
 	if isinstance(v, str): return self.comp[v]
 	return v
@@ -200,7 +326,8 @@ class CoordsBase(object):
 # give endpoint X values and radii
 # resulting cylinder is on the X axis
 class CylinderX(CoordsBase):
-    def draw(self):
+    @constant
+    def draw(self, gl=minigl):
 	x1, r1, x2, r2 = self.coords()
 	if x1 > x2:
 	    tmp = x1
@@ -209,25 +336,25 @@ class CylinderX(CoordsBase):
 	    tmp = r1
 	    r1 = r2
 	    r2 = tmp
-	glPushMatrix()
+	gl.glPushMatrix()
 	# GL creates cylinders along Z, so need to rotate
 	z1 = x1
 	z2 = x2
-	glRotatef(90,0,1,0)
+	gl.glRotatef(90,0,1,0)
 	# need to translate the whole thing to z1
-	glTranslatef(0,0,z1)
+	gl.glTranslatef(0,0,z1)
 	# the cylinder starts out at Z=0
-	gluCylinder(self.q, r1, r2, z2-z1, 32, 1)
+	gl.gluCylinder(self.q, r1, r2, z2-z1, 32, 1)
 	# bottom cap
-	glRotatef(180,1,0,0)
-	gluDisk(self.q, 0, r1, 32, 1)
-	glRotatef(180,1,0,0)
+	gl.glRotatef(180,1,0,0)
+	gl.gluDisk(self.q, 0, r1, 32, 1)
+	gl.glRotatef(180,1,0,0)
 	# the top cap needs flipped and translated
-	glPushMatrix()
-	glTranslatef(0,0,z2-z1)
-	gluDisk(self.q, 0, r2, 32, 1)
-	glPopMatrix()
-	glPopMatrix()
+	gl.glPushMatrix()
+	gl.glTranslatef(0,0,z2-z1)
+	gl.gluDisk(self.q, 0, r2, 32, 1)
+	gl.glPopMatrix()
+	gl.glPopMatrix()
 
     def volume(self):
 	x1, r1, x2, r2 = self.coords()
@@ -244,7 +371,8 @@ class CylinderY(CoordsBase):
 	self._coords = y1, r1, y2, r2
 	self.q = gluNewQuadric()
 
-    def draw(self):
+    @constant
+    def draw(self, gl=minigl):
 	y1, r1, y2, r2 = self.coords()
 	if y1 > y2:
 	    tmp = y1
@@ -253,25 +381,25 @@ class CylinderY(CoordsBase):
 	    tmp = r1
 	    r1 = r2
 	    r2 = tmp
-	glPushMatrix()
+	gl.glPushMatrix()
 	# GL creates cylinders along Z, so need to rotate
 	z1 = y1
 	z2 = y2
-	glRotatef(-90,1,0,0)
+	gl.glRotatef(-90,1,0,0)
 	# need to translate the whole thing to z1
-	glTranslatef(0,0,z1)
+	gl.glTranslatef(0,0,z1)
 	# the cylinder starts out at Z=0
-	gluCylinder(self.q, r1, r2, z2-z1, 32, 1)
+	gl.gluCylinder(self.q, r1, r2, z2-z1, 32, 1)
 	# bottom cap
-	glRotatef(180,1,0,0)
-	gluDisk(self.q, 0, r1, 32, 1)
-	glRotatef(180,1,0,0)
+	gl.glRotatef(180,1,0,0)
+	gl.gluDisk(self.q, 0, r1, 32, 1)
+	gl.glRotatef(180,1,0,0)
 	# the top cap needs flipped and translated
-	glPushMatrix()
-	glTranslatef(0,0,z2-z1)
-	gluDisk(self.q, 0, r2, 32, 1)
-	glPopMatrix()
-	glPopMatrix()
+	gl.glPushMatrix()
+	gl.glTranslatef(0,0,z2-z1)
+	gl.gluDisk(self.q, 0, r2, 32, 1)
+	gl.glPopMatrix()
+	gl.glPopMatrix()
 
     def volume(self):
 	y1, r1, y2, r2 = self.coords()
@@ -282,7 +410,8 @@ class CylinderY(CoordsBase):
 
 
 class CylinderZ(CoordsBase):
-    def draw(self):
+    @constant
+    def draw(self, gl=minigl):
 	z1, r1, z2, r2 = self.coords()
 	if z1 > z2:
 	    tmp = z1
@@ -292,20 +421,20 @@ class CylinderZ(CoordsBase):
 	    r1 = r2
 	    r2 = tmp
 	# need to translate the whole thing to z1
-	glPushMatrix()
-	glTranslatef(0,0,z1)
+	gl.glPushMatrix()
+	gl.glTranslatef(0,0,z1)
 	# the cylinder starts out at Z=0
-	gluCylinder(self.q, r1, r2, z2-z1, 32, 1)
+	gl.gluCylinder(self.q, r1, r2, z2-z1, 32, 1)
 	# bottom cap
-	glRotatef(180,1,0,0)
-	gluDisk(self.q, 0, r1, 32, 1)
-	glRotatef(180,1,0,0)
+	gl.glRotatef(180,1,0,0)
+	gl.gluDisk(self.q, 0, r1, 32, 1)
+	gl.glRotatef(180,1,0,0)
 	# the top cap needs flipped and translated
-	glPushMatrix()
-	glTranslatef(0,0,z2-z1)
-	gluDisk(self.q, 0, r2, 32, 1)
-	glPopMatrix()
-	glPopMatrix()
+	gl.glPushMatrix()
+	gl.glTranslatef(0,0,z2-z1)
+	gl.gluDisk(self.q, 0, r2, 32, 1)
+	gl.glPopMatrix()
+	gl.glPopMatrix()
 
     def volume(self):
 	z1, r1, z2, r2 = self.coords()
@@ -316,14 +445,15 @@ class CylinderZ(CoordsBase):
 
 # give center and radius
 class Sphere(CoordsBase):
-    def draw(self):
+    @constant
+    def draw(self, gl=minigl):
 	x, y, z, r = self.coords()
 	# need to translate the whole thing to x,y,z
-	glPushMatrix()
-	glTranslatef(x,y,z)
+	gl.glPushMatrix()
+	gl.glTranslatef(x,y,z)
 	# the sphere starts out at the origin
-	gluSphere(self.q, r, 32, 16)
-	glPopMatrix()
+	gl.gluSphere(self.q, r, 32, 16)
+	gl.glPopMatrix()
 
     def volume(self):
 	x, y, z, r = self.coords()
@@ -335,7 +465,8 @@ class Sphere(CoordsBase):
 # triangular plate in XY plane
 # specify the corners Z values for each side
 class TriangleXY(CoordsBase):
-    def draw(self):
+    @constant
+    def draw(self, gl=minigl):
 	x1, y1, x2, y2, x3, y3, z1, z2 = self.coords()
 	x12 = x1-x2
 	y12 = y1-y2
@@ -359,41 +490,41 @@ class TriangleXY(CoordsBase):
 	y23 = y2-y3
 	x31 = x3-x1
 	y31 = y3-y1
-        glBegin(GL_QUADS)
+        gl.glBegin(gl.GL_QUADS)
 	# side 1-2
 	h = hypot(x12,y12)
-        glNormal3f(-y12/h,x12/h,0)
-        glVertex3f(x1, y1, z1)
-        glVertex3f(x2, y2, z1)
-        glVertex3f(x2, y2, z2)
-        glVertex3f(x1, y1, z2)
+        gl.glNormal3f(-y12/h,x12/h,0)
+        gl.glVertex3f(x1, y1, z1)
+        gl.glVertex3f(x2, y2, z1)
+        gl.glVertex3f(x2, y2, z2)
+        gl.glVertex3f(x1, y1, z2)
 	# side 2-3
 	h = hypot(x23,y23)
-        glNormal3f(-y23/h,x23/h,0)
-        glVertex3f(x2, y2, z1)
-        glVertex3f(x3, y3, z1)
-        glVertex3f(x3, y3, z2)
-        glVertex3f(x2, y2, z2)
+        gl.glNormal3f(-y23/h,x23/h,0)
+        gl.glVertex3f(x2, y2, z1)
+        gl.glVertex3f(x3, y3, z1)
+        gl.glVertex3f(x3, y3, z2)
+        gl.glVertex3f(x2, y2, z2)
 	# side 3-1
 	h = hypot(x31,y31)
-        glNormal3f(-y31/h,x31/h,0)
-        glVertex3f(x3, y3, z1)
-        glVertex3f(x1, y1, z1)
-        glVertex3f(x1, y1, z2)
-        glVertex3f(x3, y3, z2)
-        glEnd()
-        glBegin(GL_TRIANGLES)
+        gl.glNormal3f(-y31/h,x31/h,0)
+        gl.glVertex3f(x3, y3, z1)
+        gl.glVertex3f(x1, y1, z1)
+        gl.glVertex3f(x1, y1, z2)
+        gl.glVertex3f(x3, y3, z2)
+        gl.glEnd()
+        gl.glBegin(gl.GL_TRIANGLES)
 	# upper face
-        glNormal3f(0,0,1)
-        glVertex3f(x1, y1, z2)
-        glVertex3f(x2, y2, z2)
-        glVertex3f(x3, y3, z2)
+        gl.glNormal3f(0,0,1)
+        gl.glVertex3f(x1, y1, z2)
+        gl.glVertex3f(x2, y2, z2)
+        gl.glVertex3f(x3, y3, z2)
 	# lower face
-        glNormal3f(0,0,-1)
-        glVertex3f(x1, y1, z1)
-        glVertex3f(x3, y3, z1)
-        glVertex3f(x2, y2, z1)
-        glEnd()
+        gl.glNormal3f(0,0,-1)
+        gl.glVertex3f(x1, y1, z1)
+        gl.glVertex3f(x3, y3, z1)
+        gl.glVertex3f(x2, y2, z1)
+        gl.glEnd()
 
     def volume(self):
 	x1, y1, x2, y2, x3, y3, z1, z2 = self.coords()
@@ -411,17 +542,19 @@ class TriangleXY(CoordsBase):
 
 # triangular plate in XZ plane
 class TriangleXZ(TriangleXY):
+    @constant
     def coords(self):
 	x1, z1, x2, z2, x3, z3, y1, y2 = TriangleXY.coords(self)
 	return x1, z1, x2, z2, x3, z3, -y1, -y2
     
-    def draw(self):
-	glPushMatrix()
-	glRotatef(90,1,0,0)
+    @constant
+    def draw(self, gl=minigl):
+	gl.glPushMatrix()
+	gl.glRotatef(90,1,0,0)
 	# create the triangle in XY plane
-	TriangleXY.draw(self)
+	TriangleXY.draw(self, gl)
 	# bottom cap
-	glPopMatrix()
+	gl.glPopMatrix()
 
     def volume(self):
 	vol = TriangleXY.volume(self)
@@ -430,17 +563,19 @@ class TriangleXZ(TriangleXY):
 
 # triangular plate in YZ plane
 class TriangleYZ(TriangleXY):
+    @constant
     def coords(self):
 	y1, z1, y2, z2, y3, z3, x1, x2 = TriangleXY.coords(self)
 	return z1, y1, z2, y2, z3, y3, -x1, -x2
     
-    def draw(self):
-	glPushMatrix()
-	glRotatef(90,0,-1,0)
+    @constant
+    def draw(self, gl=minigl):
+	gl.glPushMatrix()
+	gl.glRotatef(90,0,-1,0)
 	# create the triangle in XY plane
-	TriangleXY.draw(self)
+	TriangleXY.draw(self, gl)
 	# bottom cap
-	glPopMatrix()
+	gl.glPopMatrix()
 
     def volume(self):
 	vol = TriangleXY.volume(self)
@@ -449,7 +584,8 @@ class TriangleYZ(TriangleXY):
 
 
 class ArcX(CoordsBase):
-    def draw(self):
+    @constant
+    def draw(self, gl=minigl):
 	x1, x2, r1, r2, a1, a2, steps = self.coords()
 	if x1 > x2:
 	    tmp = x1
@@ -464,75 +600,75 @@ class ArcX(CoordsBase):
 	astep = ((a2-a1)/steps)*(pi/180)
 	a1rads = a1 * (pi/180)
 	# positive X end face
-	glBegin(GL_QUAD_STRIP)
-	glNormal3f(1,0,0)
+	gl.glBegin(gl.GL_QUAD_STRIP)
+	gl.glNormal3f(1,0,0)
 	n = 0
 	while n <= steps:
 	    angle = a1rads+n*astep
 	    s = sin(angle)
 	    c = cos(angle)
-	    glVertex3f(x2, r1*s, r1*c)
-	    glVertex3f(x2, r2*s, r2*c)
+	    gl.glVertex3f(x2, r1*s, r1*c)
+	    gl.glVertex3f(x2, r2*s, r2*c)
 	    n = n + 1
 
-	glEnd()
+	gl.glEnd()
 	# negative X end face
-	glBegin(GL_QUAD_STRIP)
-	glNormal3f(-1,0,0)
+	gl.glBegin(gl.GL_QUAD_STRIP)
+	gl.glNormal3f(-1,0,0)
 	n = 0
 	while n <= steps:
 	    angle = a1rads+n*astep
 	    s = sin(angle)
 	    c = cos(angle)
-	    glVertex3f(x1, r1*s, r1*c)
-	    glVertex3f(x1, r2*s, r2*c)
+	    gl.glVertex3f(x1, r1*s, r1*c)
+	    gl.glVertex3f(x1, r2*s, r2*c)
 	    n = n + 1
-	glEnd()
+	gl.glEnd()
 	# inner diameter
-	glBegin(GL_QUAD_STRIP)
+	gl.glBegin(gl.GL_QUAD_STRIP)
 	n = 0
 	while n <= steps:
 	    angle = a1rads+n*astep
 	    s = sin(angle)
 	    c = cos(angle)
-	    glNormal3f(0,-s, -c)
-	    glVertex3f(x1, r1*s, r1*c)
-	    glVertex3f(x2, r1*s, r1*c)
+	    gl.glNormal3f(0,-s, -c)
+	    gl.glVertex3f(x1, r1*s, r1*c)
+	    gl.glVertex3f(x2, r1*s, r1*c)
 	    n = n + 1
-	glEnd()
+	gl.glEnd()
 	# outer diameter
-	glBegin(GL_QUAD_STRIP)
+	gl.glBegin(gl.GL_QUAD_STRIP)
 	n = 0
 	while n <= steps:
 	    angle = a1rads+n*astep
 	    s = sin(angle)
 	    c = cos(angle)
-	    glNormal3f(0, s, c)
-	    glVertex3f(x1, r2*s, r2*c)
-	    glVertex3f(x2, r2*s, r2*c)
+	    gl.glNormal3f(0, s, c)
+	    gl.glVertex3f(x1, r2*s, r2*c)
+	    gl.glVertex3f(x2, r2*s, r2*c)
 	    n = n + 1
-	glEnd()
+	gl.glEnd()
 	# end plates
-	glBegin(GL_QUADS)
+	gl.glBegin(gl.GL_QUADS)
 	# first end plate
 	angle = a1 * (pi/180)
 	s = sin(angle)
 	c = cos(angle)
-	glNormal3f(0, -c, s)
-	glVertex3f(x1, r2*s, r2*c)
-	glVertex3f(x2, r2*s, r2*c)
-	glVertex3f(x2, r1*s, r1*c)
-	glVertex3f(x1, r1*s, r1*c)
+	gl.glNormal3f(0, -c, s)
+	gl.glVertex3f(x1, r2*s, r2*c)
+	gl.glVertex3f(x2, r2*s, r2*c)
+	gl.glVertex3f(x2, r1*s, r1*c)
+	gl.glVertex3f(x1, r1*s, r1*c)
 	# other end
 	angle = a2 * (pi/180)	
 	s = sin(angle)
 	c = cos(angle)
-	glNormal3f(0, c, -s)
-	glVertex3f(x1, r2*s, r2*c)
-	glVertex3f(x2, r2*s, r2*c)
-	glVertex3f(x2, r1*s, r1*c)
-	glVertex3f(x1, r1*s, r1*c)
-	glEnd()
+	gl.glNormal3f(0, c, -s)
+	gl.glVertex3f(x1, r2*s, r2*c)
+	gl.glVertex3f(x2, r2*s, r2*c)
+	gl.glVertex3f(x2, r1*s, r1*c)
+	gl.glVertex3f(x1, r1*s, r1*c)
+	gl.glEnd()
 
     def volume(self):
 	x1, x2, r1, r2, a1, a2, steps = self.coords()
@@ -558,7 +694,8 @@ class ArcX(CoordsBase):
 
 # six coordinate version - specify each side of the box
 class Box(CoordsBase):
-    def draw(self):
+    @constant
+    def draw(self, gl=minigl):
         x1, y1, z1, x2, y2, z2 = self.coords()
         if x1 > x2:
 	    tmp = x1
@@ -573,44 +710,44 @@ class Box(CoordsBase):
 	    z1 = z2
 	    z2 = tmp
 
-        glBegin(GL_QUADS)
+        gl.glBegin(gl.GL_QUADS)
 	# bottom face
-        glNormal3f(0,0,-1)
-        glVertex3f(x2, y1, z1)
-        glVertex3f(x1, y1, z1)
-        glVertex3f(x1, y2, z1)
-        glVertex3f(x2, y2, z1)
+        gl.glNormal3f(0,0,-1)
+        gl.glVertex3f(x2, y1, z1)
+        gl.glVertex3f(x1, y1, z1)
+        gl.glVertex3f(x1, y2, z1)
+        gl.glVertex3f(x2, y2, z1)
 	# positive X face
-        glNormal3f(1,0,0)
-        glVertex3f(x2, y1, z1)
-        glVertex3f(x2, y2, z1)
-        glVertex3f(x2, y2, z2)
-        glVertex3f(x2, y1, z2)
+        gl.glNormal3f(1,0,0)
+        gl.glVertex3f(x2, y1, z1)
+        gl.glVertex3f(x2, y2, z1)
+        gl.glVertex3f(x2, y2, z2)
+        gl.glVertex3f(x2, y1, z2)
 	# positive Y face
-        glNormal3f(0,1,0)
-        glVertex3f(x1, y2, z1)
-        glVertex3f(x1, y2, z2)
-        glVertex3f(x2, y2, z2)
-        glVertex3f(x2, y2, z1)
+        gl.glNormal3f(0,1,0)
+        gl.glVertex3f(x1, y2, z1)
+        gl.glVertex3f(x1, y2, z2)
+        gl.glVertex3f(x2, y2, z2)
+        gl.glVertex3f(x2, y2, z1)
 	# negative Y face
-        glNormal3f(0,-1,0)
-        glVertex3f(x2, y1, z2)
-        glVertex3f(x1, y1, z2)
-        glVertex3f(x1, y1, z1)
-        glVertex3f(x2, y1, z1)
+        gl.glNormal3f(0,-1,0)
+        gl.glVertex3f(x2, y1, z2)
+        gl.glVertex3f(x1, y1, z2)
+        gl.glVertex3f(x1, y1, z1)
+        gl.glVertex3f(x2, y1, z1)
 	# negative X face
-        glNormal3f(-1,0,0)
-        glVertex3f(x1, y1, z1)
-        glVertex3f(x1, y1, z2)
-        glVertex3f(x1, y2, z2)
-        glVertex3f(x1, y2, z1)
+        gl.glNormal3f(-1,0,0)
+        gl.glVertex3f(x1, y1, z1)
+        gl.glVertex3f(x1, y1, z2)
+        gl.glVertex3f(x1, y2, z2)
+        gl.glVertex3f(x1, y2, z1)
 	# top face
-        glNormal3f(0,0,1)
-        glVertex3f(x1, y2, z2)
-        glVertex3f(x1, y1, z2)
-        glVertex3f(x2, y1, z2)
-        glVertex3f(x2, y2, z2)
-        glEnd()
+        gl.glNormal3f(0,0,1)
+        gl.glVertex3f(x1, y2, z2)
+        gl.glVertex3f(x1, y1, z2)
+        gl.glVertex3f(x2, y1, z2)
+        gl.glVertex3f(x2, y2, z2)
+        gl.glEnd()
 
     def volume(self):
         x1, y1, z1, x2, y2, z2 = self.coords()
@@ -645,6 +782,108 @@ class Capture(object):
     def volume(self):
 	return 0.0
 
+class Collider(Collection):
+    """parts whose clearance to other Colliders is checked by a
+    CollisionChecker.  The parts are drawn as usual; they must not move
+    relative to each other, because their shape is only read once."""
+    def __init__(self, name, parts):
+        self.name = name
+        self.parts = parts
+        self.vol = 0
+        self.t = []
+        self.tree = None
+
+    def capture(self):
+        self.t = glGetDoublev(GL_MODELVIEW_MATRIX)
+
+    def matrix(self):
+        return numpy.array(self.t, dtype=float).reshape(4, 4).T
+
+    def build(self, resolution):
+        if self.tree is None:
+            points = viscollide.surface_points(_triangles(self.parts),
+                resolution)
+            self.tree = viscollide.SphereTree(points)
+        return self.tree
+
+def _draw(parts, gl):
+    # Collection.traverse without the captures, drawing with gl
+    for p in parts:
+        if hasattr(p, "apply"):
+            p.apply(gl)
+        if hasattr(p, "draw"):
+            p.draw(gl)
+        if hasattr(p, "traverse"):
+            if getattr(p.traverse, "im_func", None) is Collection.traverse.im_func:
+                _draw(p.parts, gl)
+            else:
+                p.traverse(gl)
+        if hasattr(p, "unapply"):
+            p.unapply(gl)
+
+def _triangles(parts):
+    """The triangles parts draw, in their own coordinates
+
+    The parts are drawn into a softgl Context, whatever GL the model is
+    shown with, so their apply, draw and unapply methods must take the GL
+    to draw with as an argument, as those of the parts in this module do."""
+    import softgl
+    gl = softgl.Context()
+    _draw(parts, gl)
+    return gl.triangles()
+
+class CollisionChecker(object):
+    """check the clearance between pairs of Colliders after each frame
+
+    The results go to the pins of a HAL component of its own:
+        <a>.<b>.clearance (float out): distance between the Colliders
+            named a and b, or limit if they are further apart
+        <a>.<b>.collision (bit out): they touch or overlap
+        clearance (float out): the smallest of the clearances
+        collision (bit out): some pair touches
+        check-time (float out): the time the last check took, in ms
+
+    resolution is the spacing of the points the surfaces are sampled
+    into, and also how close parts get before they are said to touch."""
+    def __init__(self, pairs, limit, resolution, name="vismach-collision"):
+        self.pairs = pairs
+        self.limit = limit
+        self.resolution = resolution
+        self.comp = hal.component(name)
+        for a, b in pairs:
+            self.comp.newpin("%s.%s.clearance" % (a.name, b.name),
+                hal.HAL_FLOAT, hal.HAL_OUT)
+            self.comp.newpin("%s.%s.collision" % (a.name, b.name),
+                hal.HAL_BIT, hal.HAL_OUT)
+        self.comp.newpin("clearance", hal.HAL_FLOAT, hal.HAL_OUT)
+        self.comp.newpin("collision", hal.HAL_BIT, hal.HAL_OUT)
+        self.comp.newpin("check-time", hal.HAL_FLOAT, hal.HAL_OUT)
+        self.comp.ready()
+        for a, b in pairs:
+            a.build(resolution)
+            b.build(resolution)
+
+    def check(self):
+        """Update the pins from the positions captured by the last
+        traverse of the model; return the pairs that touch"""
+        start = time.time()
+        touching = []
+        smallest = self.limit
+        for a, b in self.pairs:
+            if not len(a.t) or not len(b.t): continue
+            m = numpy.dot(numpy.linalg.inv(a.matrix()), b.matrix())
+            d = viscollide.clearance(a.tree, b.tree, m, self.limit,
+                self.resolution / 2.)
+            hit = d <= self.resolution
+            self.comp["%s.%s.clearance" % (a.name, b.name)] = d
+            self.comp["%s.%s.collision" % (a.name, b.name)] = hit
+            smallest = min(smallest, d)
+            if hit: touching.append((a, b))
+        self.comp["clearance"] = smallest
+        self.comp["collision"] = bool(touching)
+        self.comp["check-time"] = (time.time() - start) * 1000
+        return touching
+
 # function to invert a transform matrix
 # based on http://steve.hollasch.net/cgindex/math/matrix/afforthinv.c
 # with simplifications since we don't do scaling
@@ -678,6 +917,8 @@ class Hud(object):
 		self.strs = []
 		self.messages = []
 		self.showme = 0
+		# a FrameStats to show the frame rate of, or None
+		self.stats = None
 		
 	def show(self, string="xyzzy"):
 		self.showme = 1
@@ -692,6 +933,8 @@ class Hud(object):
 		
 	def draw(self):
 		drawtext = self.strs + self.messages
+		if self.stats and self.stats.text():
+			drawtext = drawtext + [self.stats.text()]
 		self.lines = len(drawtext)
 		#draw head-up-display
 		#see axis.py for more font/color configurability
@@ -761,6 +1004,110 @@ class Hud(object):
 		glMatrixMode(GL_MODELVIEW)
 
 
+class FrameStats(object):
+    """The frame rate and the time spent drawing, over the last frames"""
+    def __init__(self, frames=20):
+        self.frames = frames
+        self.times = []
+
+    def record(self, start, duration):
+        self.times.append((start, duration))
+        del self.times[:-self.frames]
+
+    def text(self):
+        if len(self.times) < 2: return ""
+        span = self.times[-1][0] - self.times[0][0]
+        fps = (len(self.times) - 1) / span if span > 0 else 0
+        drawing = sum(d for s, d in self.times) / len(self.times)
+        return "%.1f fps, %.1f ms/frame" % (fps, drawing * 1000)
+
+class Backplot(object):
+    """The path of the tool tip, in a ring buffer of a fixed number of
+    points
+
+    A point closer than tolerance to the last one is dropped, and one that
+    continues the last line within angle degrees moves the end of that
+    line instead of starting a new one, so straight moves take just two
+    points however long they are."""
+    def __init__(self, length=100000, tolerance=0, angle=1):
+        # one more point than the ring holds: the last one repeats the
+        # first, so that both parts of the ring can be drawn as strips
+        self.points = numpy.zeros((length + 1, 3), dtype=numpy.float32)
+        self.length = length
+        self.tolerance = tolerance
+        self.cos_angle = cos(radians(angle))
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        # the index of the next point to be written
+        self.head = 0
+
+    def __len__(self):
+        return self.count
+
+    def _index(self, back):
+        # the index of the point back places before the newest one
+        return (self.head - 1 - back) % self.length
+
+    def _set(self, i, point):
+        self.points[i] = point
+        if i == 0: self.points[self.length] = point
+
+    def add(self, point):
+        point = numpy.array(point, dtype=numpy.float32)
+        if self.count:
+            last = self.points[self._index(0)]
+            step = point - last
+            d = sqrt(numpy.dot(step, step))
+            if d <= self.tolerance: return
+            if self.count > 1:
+                line = last - self.points[self._index(1)]
+                l = sqrt(numpy.dot(line, line))
+                if l and numpy.dot(line, step) >= self.cos_angle * l * d:
+                    self._set(self._index(0), point)
+                    return
+        self._set(self.head, point)
+        self.head = (self.head + 1) % self.length
+        self.count = min(self.count + 1, self.length)
+
+    def draw(self):
+        if self.count < 2: return
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        if self.count < self.length:
+            # the ring has not wrapped yet: only pass the points written
+            glInterleavedArrays(GL_V3F, 0,
+                self.points[:self.count].tostring())
+            glDrawArrays(GL_LINE_STRIP, 0, self.count)
+        else:
+            glInterleavedArrays(GL_V3F, 0, self.points.tostring())
+            # oldest points up to the wrap, then the newest ones
+            if self.head:
+                glDrawArrays(GL_LINE_STRIP, self.head,
+                    self.length + 1 - self.head)
+                glDrawArrays(GL_LINE_STRIP, 0, self.head)
+            else:
+                glDrawArrays(GL_LINE_STRIP, 0, self.length)
+        glPopClientAttrib()
+
+# the lights and material of the model; also used by vismach-render
+def setup_lighting():
+    glLightfv(GL_LIGHT0, GL_POSITION, (1, -1, .5, 0))
+    glLightfv(GL_LIGHT0, GL_AMBIENT, (.2,.2,.2,0))
+    glLightfv(GL_LIGHT0, GL_DIFFUSE, (.6,.6,.4,0))
+    glLightfv(GL_LIGHT0+1, GL_POSITION, (-1, -1, .5, 0))
+    glLightfv(GL_LIGHT0+1, GL_AMBIENT, (.0,.0,.0,0))
+    glLightfv(GL_LIGHT0+1, GL_DIFFUSE, (.0,.0,.4,0))
+    glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE, (1,1,1,0))
+    glDisable(GL_CULL_FACE)
+    glEnable(GL_LIGHTING)
+    glEnable(GL_LIGHT0)
+    glEnable(GL_LIGHT0+1)
+    glDepthFunc(GL_LESS)
+    glEnable(GL_DEPTH_TEST)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+
 class O(rs274.OpenGLTk.Opengl):
     def __init__(self, *args, **kw):
         rs274.OpenGLTk.Opengl.__init__(self, *args, **kw)
@@ -768,35 +1115,25 @@ class O(rs274.OpenGLTk.Opengl):
 	#self.q1 = gluNewQuadric()
 	#self.q2 = gluNewQuadric()
 	#self.q3 = gluNewQuadric()
-	self.plotdata = []
-	self.plotlen = 16000
+	self.backplot = Backplot()
+	self.collisions = None
 	#does not show HUD by default
 	self.hud = Hud()
+	self.stats = FrameStats()
 
     def basic_lighting(self):
         self.activate()
-        glLightfv(GL_LIGHT0, GL_POSITION, (1, -1, .5, 0))
-        glLightfv(GL_LIGHT0, GL_AMBIENT, (.2,.2,.2,0))
-        glLightfv(GL_LIGHT0, GL_DIFFUSE, (.6,.6,.4,0))
-        glLightfv(GL_LIGHT0+1, GL_POSITION, (-1, -1, .5, 0))
-        glLightfv(GL_LIGHT0+1, GL_AMBIENT, (.0,.0,.0,0))
-        glLightfv(GL_LIGHT0+1, GL_DIFFUSE, (.0,.0,.4,0))
-        glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE, (1,1,1,0))
-	glDisable(GL_CULL_FACE)
-        glEnable(GL_LIGHTING)
-        glEnable(GL_LIGHT0)
-        glEnable(GL_LIGHT0+1)
-        glDepthFunc(GL_LESS)
-        glEnable(GL_DEPTH_TEST)
-        glMatrixMode(GL_MODELVIEW)
-        glLoadIdentity()
-  
+        setup_lighting()
 
-		
+    def tkRedraw(self, *args):
+        start = time.time()
+        rs274.OpenGLTk.Opengl.tkRedraw(self, *args)
+        self.stats.record(start, time.time() - start)
 
     def redraw(self, *args):
         if self.winfo_width() == 1: return
         self.model.traverse()
+        if self.collisions: self.collisions.check()
 	# current coords: world
 	# the matrices tool2view, work2view, and world2view
 	# transform from tool/work/world coords to viewport coords
@@ -822,11 +1159,7 @@ class O(rs274.OpenGLTk.Opengl):
 	wz = tx*view2work[2]+ty*view2work[6]+tz*view2work[10]+view2work[14]
 	# wx, wy, wz are the values to use for backplot
 	# so we save them in a buffer
-        if len(self.plotdata) == self.plotlen:
-	    del self.plotdata[:self.plotlen / 10]
-	point = [ wx, wy, wz ]
-	if not self.plotdata or point != self.plotdata[-1]:
-	    self.plotdata.append(point)
+	self.backplot.add((wx, wy, wz))
 
 	# now lets draw something in the tool coordinate system
 	#glPushMatrix()
@@ -866,10 +1199,7 @@ class O(rs274.OpenGLTk.Opengl):
         glLineWidth(2)
         glColor3f(1.0,0.5,0.5)
 
-        glBegin(GL_LINE_STRIP)
-	for p in self.plotdata:
-	    glVertex3f(*p)
-	glEnd()
+	self.backplot.draw()
 
 	glEnable(GL_LIGHTING)
         glColor3f(1,1,1)
@@ -885,121 +1215,88 @@ class Color(Collection):
         self.color = color
         Collection.__init__(self, parts)
 
-    def apply(self):
-        glPushAttrib(GL_LIGHTING_BIT)
-        glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE, self.color)
+    @constant
+    def apply(self, gl=minigl):
+        gl.glPushAttrib(gl.GL_LIGHTING_BIT)
+        gl.glMaterialfv(gl.GL_FRONT_AND_BACK, gl.GL_AMBIENT_AND_DIFFUSE, self.color)
 
-    def unapply(self):
-        glPopAttrib()
+    @constant
+    def unapply(self, gl=minigl):
+        gl.glPopAttrib()
 
-class AsciiSTL:
-    def __init__(self, filename=None, data=None):
-        if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
+class MeshPart:
+    """A triangle mesh, drawn from a display list compiled from one
+    interleaved array"""
+    cull = True
+
+    def __init__(self, mesh):
+        self.mesh = mesh
         self.list = None
-        t = []
-        n = [0,0,0]
-        self.d = d = []
-        for line in data:
-            if line.find("normal") != -1:
-                line = line.split()
-                x, y, z = map(float, line[-3:])
-                n = [x,y,z] 
-            elif line.find("vertex") != -1:
-                line = line.split()
-                x, y, z = map(float, line[-3:])
-                t.append([x,y,z])
-                if len(t) == 3:
-                    if n == [0,0,0]:
-                        dx1 = t[1][0] - t[0][0]
-                        dy1 = t[1][1] - t[0][1]
-                        dz1 = t[1][2] - t[0][2]
-                        dx2 = t[2][0] - t[0][0]
-                        dy2 = t[2][1] - t[0][1]
-                        dz2 = t[2][2] - t[0][2]
-                        n = [y1*z2 - y2*z1, z1*x2 - z2*x1, y1*x2 - y2*x1]
-                    d.append((n, t))
-                    t = []
-                    n = [0,0,0]
 
-    def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = glGenLists(1)
-            glNewList(self.list, GL_COMPILE)
-            glBegin(GL_TRIANGLES)
-            for n, t in self.d:
-                glNormal3f(*n)
-                glVertex3f(*t[0])
-                glVertex3f(*t[1])
-                glVertex3f(*t[2])
-            glEnd()
-            glEndList()
-            del self.d
+    def prepare(self):
+        # OpenGL isn't ready yet in __init__ so the display list
+        # is created before the first draw
+        if self.list is not None: return
+        self.list = glGenLists(1)
+        glNewList(self.list, GL_COMPILE)
+        self.draw_mesh()
+        glEndList()
+
+    def draw_mesh(self, gl=minigl):
+        if not self.cull:
+            gl.glDisable(gl.GL_CULL_FACE)
+        if len(self.mesh):
+            gl.glPushClientAttrib(gl.GL_CLIENT_VERTEX_ARRAY_BIT)
+            gl.glInterleavedArrays(gl.GL_N3F_V3F, 0,
+                self.mesh.interleaved().tostring())
+            gl.glDrawArrays(gl.GL_TRIANGLES, 0, 3 * len(self.mesh))
+            gl.glPopClientAttrib()
+
+    @constant
+    def draw(self, gl=minigl):
+        # the display list only exists in the GL the model is shown with
+        if gl is not minigl:
+            self.draw_mesh(gl)
+            return
+        self.prepare()
         glCallList(self.list)
 
-class AsciiOBJ:
+class AsciiSTL(MeshPart):
+    """A part read from an STL file, ASCII or binary, or from the text
+    of an ASCII STL file given as data"""
     def __init__(self, filename=None, data=None):
         if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
-
-        self.v = v = []
-        self.vn = vn = []
-        self.f = f = []
-        for line in data:
-            if line.startswith("#"): continue
-            if line.startswith("vn"):
-                vn.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("v"):
-                v.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("f"):
-                f.append(self.parse_face(line))
-
-#        print v[:5]
-#        print vn[:5]
-#        print f[:5]
-
-        self.list = None
-
+            mesh = vismesh.load(filename)
+        else:
+            if not isinstance(data, str):
+                data = "\n".join(data)
+            mesh = vismesh.parse_ascii_stl(data)
+        MeshPart.__init__(self, mesh)
 
-    def parse_int(self, i):
-        if i == '': return None
-        return int(i)
+STL = AsciiSTL
 
-    def parse_slash(self, word):
-        return [self.parse_int(i) for i in word.split("/")]
+class AsciiOBJ(MeshPart):
+    """A part read from an OBJ file, or from the text of one given as data"""
+    cull = False
 
-    def parse_face(self, line):
-        return [self.parse_slash(w) for w in line.split()[1:]]
-
-    def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = glGenLists(1)
-            glNewList(self.list, GL_COMPILE)
-            glDisable(GL_CULL_FACE)
-            glBegin(GL_TRIANGLES)
-            #print "obj", len(self.f)
-            for f in self.f:
-                for v, t, n in f:
-                    if n:
-                        glNormal3f(*self.vn[n-1])
-                    glVertex3f(*self.v[v-1])
-            glEnd()
-            glEndList()
-            del self.v
-            del self.vn
-            del self.f
-        glCallList(self.list)
-
-
-def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0):
+    def __init__(self, filename=None, data=None):
+        if data is None:
+            mesh = vismesh.load(filename)
+        else:
+            if not isinstance(data, str):
+                data = "\n".join(data)
+            mesh = vismesh.parse_obj(data)
+        MeshPart.__init__(self, mesh)
+
+
+# main() draws a new frame when a HAL pin that the model follows changed,
+# but at most max_fps times a second.  show_fps adds the frame rate and the
+# time a frame takes to the head up display.  collisions is a
+# CollisionChecker to run after every frame.
+def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0,
+        max_fps=30, show_fps=0, collisions=None):
+    if max_fps <= 0:
+        raise ValueError, "max_fps must be positive, not %r" % (max_fps,)
     app = Tkinter.Tk()
 
     t = O(app, double=1, depth=1)
@@ -1019,23 +1316,42 @@ def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0)
     	t.hud = HUD
 
     t.hud.app = t #HUD needs to know where to draw
+    if show_fps:
+        t.hud.stats = t.stats
+        t.hud.show()
 	
     # need to capture the world coordinate system
     world = Capture()
 
-    t.model = Collection([model, world])
+    t.model = CompiledModel(Collection([model, world]))
     t.distance = size * 3
+    t.backplot.tolerance = size * 1e-4
     t.near = size * 0.01
     t.far = size * 10.0
     t.tool2view = tool
     t.world2view = world
+    t.collisions = collisions
     t.work2view = work
 
     t.pack(fill="both", expand=1)
 
+    # view changes and expose events redraw by themselves; here the HAL
+    # pins are sampled, and the model is only drawn again if they changed
+    components = t.model.components()
+    interval = max(1, int(1000 / max_fps))
+    last = []
     def update():
-	t.tkRedraw()
-	t.after(100, update)
+	start = time.time()
+	if components is None:
+	    state = None
+	else:
+	    state = ([c.getvalues() for c in components],
+		t.hud.strs[:], t.hud.messages[:], t.hud.showme)
+	if state is None or not last or state != last[0]:
+	    last[:] = [state]
+	    t.tkRedraw()
+	elapsed = int((time.time() - start) * 1000)
+	t.after(max(1, interval - elapsed), update)
     update()
 
     def quit(*args):
@@ -0,0 +1,286 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Triangle meshes for vismach models
+
+Machine models are often exported from CAD as STL files of hundreds of
+thousands of triangles.  This module reads binary STL straight from a
+memory-mapped file, and ASCII STL and OBJ with a few NumPy operations,
+into a Mesh: a vertex array, a normal array and an index buffer.
+
+Reading a big ASCII file still takes a while, so the mesh of a model file
+is saved in a cache file next to it (or in ~/.cache/linuxcnc/vismach when
+that directory is not writable), and later loads just map the cache.  A
+cache file is used only while the size and modification time of the
+model file are those it was made from.
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import numpy
+
+MAGIC = "vismach mesh 1\n"
+SUFFIX = ".vmesh"
+ALIGN = 16
+
+# one triangle of a binary STL file
+STL_FACET = numpy.dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2')])
+
+_stl_numbers = re.compile(r"(?:normal|vertex)((?:\s+\S+){3})")
+
+class Mesh:
+    """Triangles as indices into arrays of vertices and normals
+
+    vertices and normals are (n, 3) float32 arrays, indices holds three
+    uint32 entries per triangle."""
+    def __init__(self, vertices, normals, indices):
+        self.vertices = vertices
+        self.normals = normals
+        self.indices = indices
+
+    @classmethod
+    def from_triangles(cls, triangles, normals):
+        """Make a Mesh from (t, 3, 3) arrays of triangle corners and of
+        their normals, sharing the corners that are equal"""
+        corners = numpy.empty((len(triangles) * 3, 6), dtype=numpy.float32)
+        corners[:, :3] = normals.reshape(-1, 3)
+        corners[:, 3:] = triangles.reshape(-1, 3)
+        rows = numpy.ascontiguousarray(corners).view(
+            numpy.dtype((numpy.void, corners.itemsize * 6))).ravel()
+        unique, first, indices = numpy.unique(rows, return_index=True,
+            return_inverse=True)
+        corners = corners[first]
+        return cls(corners[:, 3:].copy(), corners[:, :3].copy(),
+            indices.astype(numpy.uint32))
+
+    def __len__(self):
+        return len(self.indices) // 3
+
+    def bounds(self):
+        """Return the lowest and highest corner of the bounding box"""
+        if not len(self.vertices):
+            return numpy.zeros(3), numpy.zeros(3)
+        return self.vertices.min(0), self.vertices.max(0)
+
+    def interleaved(self):
+        """Return the triangles as rows of normal and vertex, the
+        GL_N3F_V3F layout of glInterleavedArrays"""
+        corners = numpy.hstack((self.normals, self.vertices))
+        return numpy.ascontiguousarray(corners[self.indices],
+            dtype=numpy.float32)
+
+def face_normals(triangles):
+    """Unit normals of (t, 3, 3) triangles following the right hand rule"""
+    n = numpy.cross(triangles[:, 1] - triangles[:, 0],
+        triangles[:, 2] - triangles[:, 0])
+    length = numpy.sqrt((n * n).sum(1))
+    length[length == 0] = 1
+    return n / length[:, None]
+
+def _fill_normals(triangles, normals):
+    # STL writers may leave the normals zero and expect them computed
+    missing = ~normals.any(1)
+    if missing.any():
+        normals[missing] = face_normals(triangles[missing])
+    return normals
+
+def _stl_mesh(triangles, normals):
+    normals = _fill_normals(triangles, normals.astype(numpy.float32))
+    return Mesh.from_triangles(triangles,
+        numpy.repeat(normals[:, None], 3, 1))
+
+def is_binary_stl(size, header):
+    """Tell a binary STL file from an ASCII one by its size, given the
+    first 84 bytes; some binary files start with "solid" too"""
+    if size < 84 or len(header) < 84: return False
+    count = numpy.frombuffer(header[80:84], dtype='<u4')[0]
+    return size == 84 + 50 * int(count)
+
+def parse_binary_stl(facets):
+    """Make a Mesh from an array of STL_FACET"""
+    triangles = numpy.array(facets['vertices'], dtype=numpy.float32)
+    return _stl_mesh(triangles, numpy.array(facets['normal']))
+
+def parse_ascii_stl(data):
+    """Make a Mesh from the text of an ASCII STL file"""
+    numbers = _stl_numbers.findall(data)
+    values = numpy.fromstring(" ".join(numbers), sep=" ")
+    if len(numbers) % 4 or len(values) != 3 * len(numbers):
+        raise ValueError, "malformed ASCII STL data"
+    facets = values.reshape(-1, 4, 3).astype(numpy.float32)
+    return _stl_mesh(facets[:, 1:].copy(), facets[:, 0])
+
+def read_stl(filename):
+    """Read a binary or ASCII STL file"""
+    size = os.path.getsize(filename)
+    f = open(filename, "rb")
+    try:
+        header = f.read(84)
+        if not is_binary_stl(size, header):
+            return parse_ascii_stl(header + f.read())
+    finally:
+        f.close()
+    count = (size - 84) // 50
+    if not count:
+        return parse_binary_stl(numpy.zeros(0, dtype=STL_FACET))
+    return parse_binary_stl(numpy.memmap(filename, dtype=STL_FACET,
+        mode='r', offset=84, shape=(count,)))
+
+def _obj_index(word, count):
+    # OBJ indices count from 1, negative ones from the end of the list
+    if not word: return -1
+    i = int(word)
+    return i - 1 if i > 0 else count + i
+
+def parse_obj(data):
+    """Make a Mesh from the text of an OBJ file
+
+    Polygons are split into triangle fans; corners without a normal get
+    the normal of their face."""
+    vertices = []; normals = []; corners = []
+    for line in data.splitlines():
+        words = line.split()
+        if not words: continue
+        if words[0] == 'v':
+            vertices.append(words[1:4])
+        elif words[0] == 'vn':
+            normals.append(words[1:4])
+        elif words[0] == 'f':
+            face = []
+            for word in words[1:]:
+                parts = word.split("/")
+                n = parts[2] if len(parts) > 2 else ''
+                face.append((_obj_index(parts[0], len(vertices)),
+                    _obj_index(n, len(normals))))
+            for i in range(1, len(face) - 1):
+                corners.extend((face[0], face[i], face[i+1]))
+
+    vertices = numpy.array(vertices, dtype=numpy.float32).reshape(-1, 3)
+    normals = numpy.array(normals, dtype=numpy.float32).reshape(-1, 3)
+    corners = numpy.array(corners, dtype=numpy.intp).reshape(-1, 3, 2)
+    triangles = vertices[corners[:, :, 0]]
+    has_normal = corners[:, :, 1] >= 0
+    corner_normals = numpy.repeat(face_normals(triangles)[:, None], 3, 1)
+    corner_normals = corner_normals.astype(numpy.float32)
+    corner_normals[has_normal] = normals[corners[:, :, 1][has_normal]]
+    return Mesh.from_triangles(triangles, corner_normals)
+
+def read_obj(filename):
+    """Read an OBJ file"""
+    f = open(filename, "r")
+    try:
+        return parse_obj(f.read())
+    finally:
+        f.close()
+
+def cache_paths(filename):
+    """The places the cache of filename may be, in order of preference"""
+    filename = os.path.abspath(filename)
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    name = hashlib.sha1(filename).hexdigest() + SUFFIX
+    return [filename + SUFFIX, os.path.join(base, "linuxcnc", "vismach", name)]
+
+def _source(filename):
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime]
+
+def load_cache(path, source):
+    """Return the Mesh in the cache file path, or None if there is none
+    or it was made from a different version of the model file"""
+    try:
+        f = open(path, "rb")
+    except IOError:
+        return None
+    try:
+        if f.readline() != MAGIC: return None
+        header = json.loads(f.readline())
+    except ValueError:
+        return None
+    finally:
+        f.close()
+    if header['source'] != source: return None
+    nv, ni = header['vertices'], header['indices']
+    if not nv or not ni:
+        return Mesh(numpy.zeros((0, 3), dtype=numpy.float32),
+            numpy.zeros((0, 3), dtype=numpy.float32),
+            numpy.zeros(0, dtype=numpy.uint32))
+    offset = header['offset']
+    vertices = numpy.memmap(path, dtype=numpy.float32, mode='r',
+        offset=offset, shape=(nv, 3))
+    normals = numpy.memmap(path, dtype=numpy.float32, mode='r',
+        offset=offset + vertices.nbytes, shape=(nv, 3))
+    indices = numpy.memmap(path, dtype=numpy.uint32, mode='r',
+        offset=offset + 2 * vertices.nbytes, shape=(ni,))
+    return Mesh(vertices, normals, indices)
+
+def store_cache(path, source, mesh):
+    """Save mesh in the cache file path; return False if that failed"""
+    header = {'source': source, 'vertices': len(mesh.vertices),
+        'indices': len(mesh.indices), 'offset': 0}
+    # the offset of the arrays is part of the header, so leave room for
+    # its digits
+    text = MAGIC + json.dumps(header) + "\n"
+    header['offset'] = (len(text) + 32 + ALIGN - 1) // ALIGN * ALIGN
+    text = MAGIC + json.dumps(header) + "\n"
+    temp = path + ".%d.tmp" % os.getpid()
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        f = open(temp, "wb")
+        try:
+            f.write(text)
+            f.write("\0" * (header['offset'] - len(text)))
+            for a, dtype in ((mesh.vertices, numpy.float32),
+                    (mesh.normals, numpy.float32),
+                    (mesh.indices, numpy.uint32)):
+                numpy.ascontiguousarray(a, dtype=dtype).tofile(f)
+        finally:
+            f.close()
+        os.rename(temp, path)
+    except (IOError, OSError):
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+        return False
+    return True
+
+def load(filename, cache=True):
+    """Read the STL or OBJ file filename, through its cache file if it
+    has an up to date one"""
+    if filename.lower().endswith(".obj"):
+        read = read_obj
+    else:
+        read = read_stl
+    if not cache:
+        return read(filename)
+
+    source = _source(filename)
+    paths = cache_paths(filename)
+    for path in paths:
+        mesh = load_cache(path, source)
+        if mesh is not None: return mesh
+    mesh = read(filename)
+    for path in paths:
+        if store_cache(path, source, mesh): break
+    else:
+        print >>sys.stderr, "vismach: could not write a mesh cache for %s" % filename
+    return mesh
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+This program measures how long pncconf takes to find the pin a signal is on.
+
+It configures two 5i25 cards with 7i76 firmware and sserial channels, plus
+parports, with random signals.  It checks that Data.findsignal gives the
+same answer for every signal as the loops findsignal used before it kept
+an index, then times both.  Some pins are changed again between the
+checks, the way the wizard does, so the index has to follow.
+
+Run it from a run-in-place environment (pncconf needs pygtk to import):
+    . scripts/rip-environment
+    python scripts/pncconf-findsignal-benchmark.py [seed]
+"""
+
+import os
+import sys
+import imp
+import time
+import random
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), ".."))
+BIN = os.path.join(BASE, "bin")
+
+# bin/pncconf is the program; the pncconf package holds its other modules
+app = imp.load_source("pncconf_app", os.path.join(BIN, "pncconf"))
+from pncconf import private_data
+
+FIRMWARE = '7i76x2 -With One 7i76'
+
+def loop_findsignal(d, sig):
+    "The lookup findsignal did before the index, for comparison"
+    _PD = app._PD
+    if d.number_pports:
+        ppinput = {}
+        ppoutput = {}
+        for i in (1,2,3):
+            for s in (2,3,4,5,6,7,8,9,10,11,12,13,15):
+                key = d["pp%d_Ipin%d" %(i,s)]
+                ppinput[key] = "pp%d_Ipin%d" %(i,s)
+            for s in (1,2,3,4,5,6,7,8,9,14,16,17):
+                key = d["pp%d_Opin%d" %(i,s)]
+                ppoutput[key] = "pp%d_Opin%d" %(i,s)
+    mesa = {}
+    for boardnum in range(0,int(d.number_mesa)):
+        for concount,connector in enumerate(d["mesa%d_currentfirmwaredata"% (boardnum)][_PD._NUMOFCNCTRS]) :
+            for s in range(0,24):
+                key =   d["mesa%dc%dpin%d"% (boardnum,connector,s)]
+                mesa[key] = "mesa%dc%dpin%d" %(boardnum,connector,s)
+        if d["mesa%d_numof_sserialports"% boardnum]:
+            sserial = {}
+            port = 0
+            for channel in range (0,d["mesa%d_currentfirmwaredata"% boardnum][_PD._MAXSSERIALCHANNELS]):
+                    if channel ==_PD._NUM_CHANNELS: break
+                    for pin in range (0,_PD._SSCOMBOLEN):
+                        key = d['mesa%dsserial%d_%dpin%d' % (boardnum, port, channel, pin)]
+                        sserial[key] = 'mesa%dsserial%d_%dpin%d' % (boardnum, port, channel, pin)
+    try:
+        return mesa[sig]
+    except:
+        try:
+            return sserial[sig]
+        except:
+            pass
+    if d.number_pports:
+        try:
+            return ppinput[sig]
+        except:
+            try:
+                return ppoutput[sig]
+            except:
+                return None
+    else: return None
+
+def configure(d, rnd, names):
+    _PD = app._PD
+    firm = [f for f in _PD.MESA_INTERNAL_FIRMWAREDATA if f[_PD._FIRMWARE] == FIRMWARE][0]
+    d.number_mesa = 2
+    d.number_pports = 1
+    for b in (0, 1):
+        d["mesa%d_currentfirmwaredata" % b] = firm
+        d["mesa%d_numof_sserialports" % b] = 1
+        for c in firm[_PD._NUMOFCNCTRS]:
+            for s in range(24):
+                d["mesa%dc%dpin%d" % (b, c, s)] = rnd.choice(names)
+        for port in range(2):
+            for ch in range(8):
+                for pin in range(_PD._SSCOMBOLEN):
+                    d["mesa%dsserial%d_%dpin%d" % (b, port, ch, pin)] = rnd.choice(names)
+    for i in (1, 2, 3):
+        for s in range(1, 18):
+            d["pp%d_Ipin%d" % (i, s)] = rnd.choice(names)
+            d["pp%d_Opin%d" % (i, s)] = rnd.choice(names)
+    return firm
+
+def check(d, queries):
+    for q in queries:
+        new, old = d.findsignal(q), loop_findsignal(d, q)
+        if new != old:
+            raise SystemExit, "findsignal(%r): %r, loops give %r" % (q, new, old)
+
+def bench(label, f, d, queries):
+    t = time.time()
+    for q in queries: f(d, q)
+    t = time.time() - t
+    print "%-20s %8.3f ms per lookup" % (label, t * 1000 / len(queries))
+    return t
+
+def main():
+    seed = 1
+    if len(sys.argv) > 1: seed = int(sys.argv[1])
+    rnd = random.Random(seed)
+    _PD = app._PD = private_data.Private_Data(None, BIN, BASE)
+    d = app.Data(_PD)
+    names = ["sig-%d" % i for i in range(400)] + ["unused-input", "unused-output"]
+    firm = configure(d, rnd, names)
+    queries = names + ["nothing"]
+    check(d, queries)
+
+    # change some pins again, as the wizard does
+    for k in range(300):
+        key = rnd.choice([
+            "mesa1c%dpin%d" % (rnd.choice(firm[_PD._NUMOFCNCTRS]), rnd.randrange(24)),
+            "pp2_Ipin%d" % rnd.choice((2,3,4,5,6,7,8,9,10,11,12,13,15)),
+            "mesa1sserial0_%dpin%d" % (rnd.randrange(8), rnd.randrange(_PD._SSCOMBOLEN))])
+        d[key] = rnd.choice(names + ["new-%d" % k])
+    queries += ["new-%d" % k for k in range(300)]
+    check(d, queries)
+    d.number_mesa = 1
+    check(d, queries)
+    d.number_mesa = 2
+    print "findsignal and the old loops agree on %d signals" % len(queries)
+
+    old = bench("loops", loop_findsignal, d, queries)
+    new = bench("index", app.Data.findsignal, d, queries)
+    print "%.0f times faster" % (old / new)
+
+if __name__ == '__main__':
+    main()
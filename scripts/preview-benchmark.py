@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+This program measures how long it takes to load the preview of a large
+program and how much memory the preview segments need.
+
+It writes a 3D surfacing program with the requested number of segments
+(one million by default), runs it through the interpreter with the same
+canon the GUIs use, and prints timings and the memory used by the segment
+store next to an estimate for the old list-of-tuples format.  It also
+times building the vertex arrays that are uploaded to vertex buffers.
+Then it stores the preview in a preview cache and times reading it back.
+Finally it times looking up the segments of one line, as highlighting
+does, in programs of different sizes.
+
+Run it from a run-in-place environment:
+    . scripts/rip-environment
+    python scripts/preview-benchmark.py [segments]
+"""
+
+import os
+import sys
+import time
+import math
+import random
+import shutil
+import resource
+import tempfile
+
+import numpy
+import gcode
+from rs274.glcanon import GLCanon, GlCanonDraw
+from rs274.previewcache import PreviewCache
+from rs274.segments import SegmentList, ROW
+from rs274.vertexbuffer import line_vertices, BATCH, KINDS
+
+class BenchCanon(GLCanon):
+    parameter_file = ""
+    def get_tool(self, pocket):
+        return -1, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0
+    def get_external_angular_units(self): return 1.0
+    def get_external_length_units(self): return 1.0
+    def get_axis_mask(self): return 7
+    def get_block_delete(self): return False
+    def is_lathe(self): return False
+
+def write_program(f, segments):
+    "A zig-zag surfacing pass over a wavy surface, one G1 per line"
+    rows = max(1, int(math.sqrt(segments)))
+    cols = segments // rows
+    print >>f, "G20 G90 G17 F60"
+    print >>f, "G0 X0 Y0 Z.1"
+    for r in range(rows):
+        y = r * .01
+        for c in range(cols):
+            x = (c if r % 2 == 0 else cols - 1 - c) * .01
+            z = -.05 + .04 * math.sin(x * 3) * math.cos(y * 2)
+            print >>f, "G1 X%.4f Y%.4f Z%.4f" % (x, y, z)
+    print >>f, "G0 Z.1"
+    print >>f, "M2"
+
+def deep_size(o):
+    if isinstance(o, (tuple, list)):
+        return sys.getsizeof(o) + sum(deep_size(i) for i in o)
+    return sys.getsizeof(o)
+
+def tuple_size(item):
+    "Size of one segment tuple; its start list was the previous end list"
+    return deep_size(item) - deep_size(item[1])
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def mb(n):
+    return "%.1fMB" % (n / 1048576.)
+
+def main(segments):
+    td = tempfile.mkdtemp()
+    try:
+        fn = os.path.join(td, "bench.ngc")
+        t0 = time.time()
+        f = open(fn, "w")
+        write_program(f, segments)
+        f.close()
+        print "generate:      %8.2fs  (%s)" % (time.time() - t0,
+                mb(os.path.getsize(fn)))
+
+        rss0 = maxrss()
+        canon = BenchCanon(GlCanonDraw.colors, 'XYZ')
+        t0 = time.time()
+        result, seq = gcode.parse(fn, canon, "G20", "")
+        t1 = time.time()
+        if result > gcode.MIN_ERROR:
+            raise SystemExit, "parse error %s on line %d" % (
+                gcode.strerror(result), seq)
+        canon.calc_extents()
+        t2 = time.time()
+        rss1 = maxrss()
+
+        n = len(canon.traverse) + len(canon.feed) + len(canon.arcfeed)
+        store = canon.traverse.nbytes + canon.feed.nbytes + canon.arcfeed.nbytes
+        legacy = sum(tuple_size(l[0]) * len(l)
+            for l in (canon.traverse, canon.feed, canon.arcfeed) if l)
+        print "parse:         %8.2fs  (%.2fus/segment)" % (t1 - t0,
+                (t1 - t0) * 1e6 / max(n, 1))
+        print "calc_extents:  %8.2fs" % (t2 - t1)
+        print "segments:      %8d" % n
+        print "segment store: %10s  (%d bytes/segment)" % (mb(store),
+                store / max(n, 1))
+        print "tuple lists:   %10s  (estimated, %d bytes/segment)" % (
+                mb(legacy), legacy / max(n, 1))
+        print "peak RSS grew: %10s" % mb(rss1 - rss0)
+
+        t0 = time.time()
+        nv = 0
+        for kind, color in KINDS:
+            lineno, coords, tool = getattr(canon, kind).arrays()
+            for i in range(0, len(coords), BATCH):
+                nv += len(line_vertices(canon.geometry, coords[i:i+BATCH])[0])
+        print "vertex arrays: %8.2fs  (%s)" % (time.time() - t0, mb(nv * 16))
+
+        cache = PreviewCache(os.path.join(td, "cache"), 1 << 40)
+        t0 = time.time()
+        key = cache.key(fn, canon, ("G20", ""))
+        t1 = time.time()
+        cache.store(key, canon, result, seq)
+        t2 = time.time()
+        cached = BenchCanon(GlCanonDraw.colors, 'XYZ')
+        cache.load(cache.key(fn, cached, ("G20", "")), cached)
+        cached.calc_extents()
+        t3 = time.time()
+        print "cache key:     %8.2fs" % (t1 - t0)
+        print "cache store:   %8.2fs  (%s)" % (t2 - t1,
+                mb(os.path.getsize(cache.path(key))))
+        print "cache reload:  %8.2fs  (key, load and calc_extents)" % (t3 - t2)
+    finally:
+        shutil.rmtree(td)
+
+    highlight_benchmark()
+
+def highlight_benchmark(sizes=(10000, 100000, 1000000, 4000000), lookups=1000):
+    "Time GLCanon.line_segments on programs of several sizes"
+    for n in sizes:
+        canon = BenchCanon(GlCanonDraw.colors, 'XYZ')
+        canon.feed = SegmentList.from_arrays(canon.tool_offsets, True,
+            numpy.arange(n, dtype=numpy.int32), numpy.zeros((n, ROW)),
+            numpy.zeros(n, dtype=numpy.int32))
+        lines = [random.randrange(n) for i in range(lookups)]
+        t0 = time.time()
+        canon.line_segments(0)
+        t1 = time.time()
+        for l in lines:
+            canon.line_segments(l)
+        t2 = time.time()
+        print "highlight:     %8d segments, index %.3fs, %.1fus/line" % (
+                n, t1 - t0, (t2 - t1) * 1e6 / lookups)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -173,6 +173,9 @@ GLCALL2V(glDeleteLists, "ii", int, int)
 GLCALL2V(glBlendFunc, "ii", int, int)
 GLCALL0V(glFlush)
 GLCALL2V(glPixelStorei, "ii", int, int)
+GLCALL2V(glBindBuffer, "ii", int, int)
+GLCALL1V(glEnableClientState, "i", int)
+GLCALL1V(glDisableClientState, "i", int)
 
 static PyObject *pyglBitmap(PyObject *s, PyObject *o) {
     int width, height, nbitmap;
@@ -376,6 +379,120 @@ static PyObject *pyglReadPixels(PyObject *s, PyObject *o) {
     return res;
 }
 
+static PyObject *pyglGenBuffers(PyObject *s, PyObject *o) {
+    int n, i;
+    GLuint *buffers;
+    PyObject *r;
+    if(!PyArg_ParseTuple(o, "i:glGenBuffers", &n)) return NULL;
+    if(n < 1) {
+        PyErr_SetString(PyExc_ValueError, "Must generate at least one buffer");
+        return NULL;
+    }
+    buffers = malloc(sizeof(GLuint) * n);
+    if(!buffers) return PyErr_NoMemory();
+    glGenBuffers(n, buffers);
+    r = PyList_New(n);
+    for(i=0; i<n; i++)
+        PyList_SetItem(r, i, PyInt_FromLong(buffers[i]));
+    free(buffers);
+    return r;
+}
+
+static PyObject *pyglDeleteBuffers(PyObject *s, PyObject *o) {
+    PyObject *seq;
+    GLuint *buffers;
+    int n, i;
+    if(!PyArg_ParseTuple(o, "O:glDeleteBuffers", &seq)) return NULL;
+    seq = PySequence_Fast(seq, "glDeleteBuffers requires a sequence");
+    if(!seq) return NULL;
+    n = PySequence_Fast_GET_SIZE(seq);
+    buffers = malloc(sizeof(GLuint) * (n ? n : 1));
+    if(!buffers) { Py_DECREF(seq); return PyErr_NoMemory(); }
+    for(i=0; i<n; i++) {
+        buffers[i] = PyInt_AsLong(PySequence_Fast_GET_ITEM(seq, i));
+    }
+    Py_DECREF(seq);
+    if(PyErr_Occurred()) { free(buffers); return NULL; }
+    glDeleteBuffers(n, buffers);
+    free(buffers);
+    CHECK_ERROR;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+// The data may be a string or anything else that offers a buffer, such
+// as a numpy array; a size instead of data allocates uninitialized storage
+static PyObject *pyglBufferData(PyObject *s, PyObject *o) {
+    int target, usage;
+    PyObject *data;
+    const void *buf = NULL;
+    Py_ssize_t sz;
+    if(!PyArg_ParseTuple(o, "iOi:glBufferData", &target, &data, &usage))
+        return NULL;
+    if(PyInt_Check(data) || PyLong_Check(data)) {
+        sz = PyInt_AsSsize_t(data);
+        if(sz < 0) {
+            if(!PyErr_Occurred())
+                PyErr_SetString(PyExc_ValueError, "Size must not be negative");
+            return NULL;
+        }
+    } else if(PyObject_AsReadBuffer(data, &buf, &sz) < 0) {
+        return NULL;
+    }
+    glBufferData(target, sz, buf, usage);
+    CHECK_ERROR;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *pyglBufferSubData(PyObject *s, PyObject *o) {
+    int target, offset;
+    PyObject *data;
+    const void *buf;
+    Py_ssize_t sz;
+    if(!PyArg_ParseTuple(o, "iiO:glBufferSubData", &target, &offset, &data))
+        return NULL;
+    if(PyObject_AsReadBuffer(data, &buf, &sz) < 0) return NULL;
+    glBufferSubData(target, offset, sz, buf);
+    CHECK_ERROR;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+// Only the buffer object form is supported: pointer is a byte offset into
+// the buffer bound to GL_ARRAY_BUFFER
+static PyObject *pyglVertexPointer(PyObject *s, PyObject *o) {
+    int size, type, stride, offset;
+    if(!PyArg_ParseTuple(o, "iiii:glVertexPointer",
+                &size, &type, &stride, &offset))
+        return NULL;
+    glVertexPointer(size, type, stride, (const char *)NULL + offset);
+    CHECK_ERROR;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *pyglColorPointer(PyObject *s, PyObject *o) {
+    int size, type, stride, offset;
+    if(!PyArg_ParseTuple(o, "iiii:glColorPointer",
+                &size, &type, &stride, &offset))
+        return NULL;
+    glColorPointer(size, type, stride, (const char *)NULL + offset);
+    CHECK_ERROR;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *pyglGetString(PyObject *s, PyObject *o) {
+    int name;
+    const GLubyte *r;
+    if(!PyArg_ParseTuple(o, "i:glGetString", &name)) return NULL;
+    r = glGetString(name);
+    CHECK_ERROR;
+    if(!r) { Py_INCREF(Py_None); return Py_None; }
+    return PyString_FromString((const char *)r);
+}
+
 typedef struct {
     PyObject_HEAD
     GLUquadric *q;
@@ -737,6 +854,16 @@ METH(glStencilOp, "specify the stencil buffer operation"),
 METH(glFlush, "force execution of GL commands in finite time"),
 METH(glDrawBuffer, "specify which color buffers are to be drawn into"),
 METH(glDrawArrays, "render primitives from array data"),
+METH(glGenBuffers, "generate buffer object names"),
+METH(glDeleteBuffers, "delete named buffer objects"),
+METH(glBindBuffer, "bind a named buffer object"),
+METH(glBufferData, "create and initialize a buffer object's data store"),
+METH(glBufferSubData, "update a subset of a buffer object's data store"),
+METH(glVertexPointer, "define an array of vertex data"),
+METH(glColorPointer, "define an array of colors"),
+METH(glEnableClientState, "enable or disable client-side capability"),
+METH(glDisableClientState, "enable or disable client-side capability"),
+METH(glGetString, "return a string describing the current GL connection"),
 METH(glDrawPixels, "write a block of pixels to the frame buffer"),
 METH(glMatrixMode, "specify which matrix is the current matrix"),
 METH(glOrtho, "multiply the current matrix with an orthographic matrix"),
@@ -831,6 +958,7 @@ void initminigl(void) {
     CONST(GL_UNPACK_ALIGNMENT);
     CONST(GL_V3F);
     CONST(GL_C3F_V3F);
+    CONST(GL_N3F_V3F);
     CONST(GL_C4UB_V3F);
     CONST(GL_VIEWPORT);
     CONST(GL_LIGHT0);
@@ -870,5 +998,13 @@ void initminigl(void) {
     CONST(GL_UNPACK_ALIGNMENT);
     CONST(GL_LUMINANCE);
     CONST(GL_UNSIGNED_BYTE);
+    CONST(GL_FLOAT);
+    CONST(GL_VERSION);
+    CONST(GL_ARRAY_BUFFER);
+    CONST(GL_STATIC_DRAW);
+    CONST(GL_DYNAMIC_DRAW);
+    CONST(GL_VERTEX_ARRAY);
+    CONST(GL_COLOR_ARRAY);
+    CONST(GL_CLIENT_VERTEX_ARRAY_BIT);
 
 }
@@ -59,7 +59,9 @@ import gcode
 sys.setdlopenflags(old_flags)
 from rs274.OpenGLTk import *
 from rs274.interpret import StatMixin
-from rs274.glcanon import GLCanon, GlCanonDraw
+from rs274.glcanon import GLCanon, GlCanonDraw, PreviewThread
+from rs274.previewcache import PreviewCache
+from rs274.statistics import ProgramStatistics, MachineLimits
 from hershey import Hershey
 from propertywindow import properties
 import rs274.options
@@ -387,7 +389,6 @@ class MyOpengl(GlCanonDraw, Opengl):
         self.bind('<Button1-Motion>', self.select_cancel, add=True)
         self.highlight_line = None
         self.select_event = None
-        self.select_buffer_size = 100
         self.select_primed = None
         self.last_position = None
         self.last_homed = None
@@ -951,7 +952,7 @@ class DummyProgress:
     def done(self): pass
 
 class Progress:
-    def __init__(self, phases, total):
+    def __init__(self, phases, total, grab=True):
         self.num_phases = phases
         self.phase = 0
         self.total = total or 1
@@ -963,18 +964,20 @@ class Progress:
                     "-highlightthickness", 0,
                     "-borderwidth", 2, "-relief", "sunken",
                     "-cursor", "watch")
-        root_window.configure(cursor="watch")
-        root_window.tk.call(".menu", "configure", "-cursor", "watch")
-        t.configure(cursor="watch")
-        root_window.tk.call("bind", ".info.progress", "<Key>", "break")
+        if grab:
+            root_window.configure(cursor="watch")
+            root_window.tk.call(".menu", "configure", "-cursor", "watch")
+            t.configure(cursor="watch")
+            root_window.tk.call("bind", ".info.progress", "<Key>", "break")
         root_window.tk.call("pack", ".info.progress", "-side", "left",
                                 "-fill", "both", "-expand", "1")
         root_window.tk.call(".info.progress", "create", "rectangle",
                                 (-10, -10, -10, -10),
                                 "-fill", "blue", "-outline", "blue")
         root_window.update_idletasks()
-        root_window.tk.call("focus", "-force", ".info.progress")
-        root_window.tk.call("patient_grab", ".info.progress")
+        if grab:
+            root_window.tk.call("focus", "-force", ".info.progress")
+            root_window.tk.call("patient_grab", ".info.progress")
 
     def update(self, count, force=0):
         if force or count - self.lastcount > 400:
@@ -997,6 +1000,8 @@ class Progress:
         self.update(0, True)
 
     def done(self):
+        if not root_window.tk.call("winfo", "exists", ".info.progress"):
+            return
         root_window.tk.call("destroy", ".info.progress")
         root_window.tk.call("grab", "release", ".info.progress")
         root_window.tk.call("focus", self.old_focus)
@@ -1025,6 +1030,7 @@ class AxisCanon(GLCanon, StatMixin):
         self.progress = progress
         self.aborted = False
         self.arcdivision = arcdivision
+        self.notify_messages = []
 
     def change_tool(self, pocket):
         GLCanon.change_tool(self, pocket)
@@ -1035,17 +1041,136 @@ class AxisCanon(GLCanon, StatMixin):
     def do_cancel(self, event):
         self.aborted = True
 
+    # The preview is parsed in a PreviewThread, so these must not touch
+    # Tk; PreviewLoad.poll picks up the progress and notifications.
     def check_abort(self):
-        root_window.update()
         if self.aborted: raise KeyboardInterrupt
 
     def next_line(self, st):
         GLCanon.next_line(self, st)
-        self.progress.update(self.lineno)
         if self.notify:
-            notifications.add("info",self.notify_message)
+            self.notify_messages.append(self.notify_message)
             self.notify = 0
 
+class PreviewLoad:
+    """The preview of a program being loaded in the background
+
+    The interpreter runs in a PreviewThread while this polls it from the
+    Tk event loop: the plot fills in as segments arrive, the program text
+    is inserted a chunk at a time, and the rest of AXIS (jogging, estop,
+    ...) stays usable.  Anything that needs the complete preview or the
+    gcode module calls wait_preview() first."""
+    poll_interval = 100 # ms
+    text_chunk = 2000   # lines inserted into the text widget per poll
+
+    def __init__(self, f, canon, lines, progress, *args):
+        self.filename = f
+        self.canon = canon
+        self.lines = lines
+        self.nlines = 0
+        self.nmessages = 0
+        self.progress = progress
+        self.callbacks = []
+        self.parsed = False
+        self.finished = False
+        self.thread = PreviewThread(o.preview_cache, f, canon, *args)
+        o.begin_preview(canon)
+        self.thread.start()
+        self.after = root_window.after(self.poll_interval, self.poll)
+
+    def fill_text(self, count):
+        if self.nlines >= len(self.lines): return
+        code = []
+        end = min(self.nlines + count, len(self.lines))
+        for i in range(self.nlines, end):
+            l = self.lines[i].expandtabs().replace("\r", "")
+            code.extend(["%6d: " % (i+1), "lineno", l, ""])
+        self.nlines = end
+        t.configure(state="normal")
+        t.insert("end", *code)
+        t.configure(state="disabled")
+
+    # The messages stay in the canon so the preview cache can save them
+    def show_notifications(self):
+        messages = self.canon.notify_messages
+        while self.nmessages < len(messages):
+            notifications.add("info", messages[self.nmessages])
+            self.nmessages += 1
+
+    def poll(self):
+        self.after = None
+        self.fill_text(self.text_chunk)
+        self.show_notifications()
+        if not self.parsed:
+            if self.thread.isAlive():
+                self.progress.update(self.canon.lineno)
+                o.tkRedraw()
+            else:
+                self.finish_parse()
+        if self.parsed and self.nlines >= len(self.lines):
+            self.finish()
+        else:
+            self.after = root_window.after(self.poll_interval, self.poll)
+
+    def finish_parse(self):
+        self.parsed = True
+        self.show_notifications()
+        result, seq = self.thread.result
+        o.end_preview()
+        self.progress.done()
+        self.canon.progress = DummyProgress()
+        if self.thread.exc_info is not None:
+            notifications.add("error", str(self.thread.exc_info[1]))
+        # According to the documentation, MIN_ERROR is the largest value that is
+        # not an error.  Crazy though that sounds...
+        elif result > gcode.MIN_ERROR:
+            error_str = _(gcode.strerror(result))
+            root_window.tk.call("nf_dialog", ".error",
+                    _("G-Code error in %s") % os.path.basename(self.filename),
+                    _("Near line %(seq)d of %(f)s:\n%(error_str)s") % {'seq': seq, 'f': self.filename, 'error_str': error_str},
+                    "error",0,_("OK"))
+        o.lp.set_depth(from_internal_linear_unit(o.get_foam_z()),
+                       from_internal_linear_unit(o.get_foam_w()))
+        o.tkRedraw()
+
+    def finish(self):
+        global preview_load
+        if self.finished: return
+        self.finished = True
+        if self.after is not None:
+            root_window.after_cancel(self.after)
+            self.after = None
+        if preview_load is self:
+            preview_load = None
+        for callback in self.callbacks:
+            callback()
+        root_window.tk.call("set_mode_from_tab")
+
+    def wait(self):
+        self.thread.join()
+        self.fill_text(len(self.lines))
+        if not self.parsed:
+            self.finish_parse()
+        self.finish()
+
+    def cancel(self):
+        self.canon.aborted = True
+        self.wait()
+
+preview_load = None
+
+def wait_preview():
+    """Block until the preview being loaded (if any) is complete"""
+    if preview_load is not None:
+        preview_load.wait()
+
+def after_preview(callback):
+    """Call callback once the preview being loaded (if any) is complete"""
+    if preview_load is not None:
+        preview_load.callbacks.append(callback)
+    else:
+        callback()
+
 
 progress_re = re.compile("^FILTER_PROGRESS=(\\d*)$")
 def filter_program(program_filter, infilename, outfilename):
@@ -1110,6 +1235,9 @@ def cancel_open(event=None):
 
 loaded_file = None
 def open_file_guts(f, filtered=False, addrecent=True):
+    global preview_load
+    if preview_load is not None:
+        preview_load.cancel()
     s.poll()
     save_task_mode = s.task_mode
     ensure_mode(linuxcnc.MODE_MANUAL)
@@ -1135,9 +1263,9 @@ def open_file_guts(f, filtered=False, addrecent=True):
 
     ensure_mode(save_task_mode)
     set_first_line(0)
-    t0 = time.time()
 
     canon = None
+    progress = None
     o.deselect(None) # remove highlight line from last program
     try:
         # Force a sync of the interpreter, which writes out the var file.
@@ -1145,25 +1273,14 @@ def open_file_guts(f, filtered=False, addrecent=True):
         c.wait_complete()
         c.program_open(f)
         lines = open(f).readlines()
-        progress = Progress(2, len(lines))
+        progress = Progress(1, len(lines), grab=False)
         t.configure(state="normal")
         t.tk.call("delete_all", t)
-        code = []
-        i = 0
-        for i, l in enumerate(lines):
-            l = l.expandtabs().replace("\r", "")
-            #t.insert("end", "%6d: " % (i+1), "lineno", l)
-            code.extend(["%6d: " % (i+1), "lineno", l, ""])
-            if i % 1000 == 0:
-                t.insert("end", *code)
-                del code[:]
-                progress.update(i)
-        if code:
-            t.insert("end", *code)
-        progress.nextphase(len(lines))
+        t.configure(state="disabled")
         f = os.path.abspath(f)
-        o.canon = canon = AxisCanon(o, widgets.text, i, progress, arcdivision)
+        o.canon = canon = AxisCanon(o, widgets.text, max(len(lines)-1, 0), progress, arcdivision)
         root_window.bind_class(".info.progress", "<Escape>", cancel_open)
+        root_window.bind_class(".info.progress", "<Button-1>", cancel_open)
 
         parameter = inifile.find("RS274NGC", "PARAMETER_FILE")
         temp_parameter = os.path.join(tempdir, os.path.basename(parameter))
@@ -1209,43 +1326,17 @@ def open_file_guts(f, filtered=False, addrecent=True):
                 if i in (0,1): continue
                 if m == -1: continue
                 initcodes.append("M%d" % m)
-        try:
-            result, seq = o.load_preview(f, canon, initcodes, interpname)
-        except KeyboardInterrupt:
-            result, seq = 0, 0
-        # According to the documentation, MIN_ERROR is the largest value that is
-        # not an error.  Crazy though that sounds...
-        if result > gcode.MIN_ERROR:
-            error_str = _(gcode.strerror(result))
-            root_window.tk.call("nf_dialog", ".error",
-                    _("G-Code error in %s") % os.path.basename(f),
-                    _("Near line %(seq)d of %(f)s:\n%(error_str)s") % {'seq': seq, 'f': f, 'error_str': error_str},
-                    "error",0,_("OK"))
-
-        t.configure(state="disabled")
-        o.lp.set_depth(from_internal_linear_unit(o.get_foam_z()),
-                       from_internal_linear_unit(o.get_foam_w()))
+        preview_load = PreviewLoad(f, canon, lines, progress, initcodes, interpname)
+        # show the first screenful of the program right away
+        preview_load.fill_text(100)
+        progress.update(0, True)
 
     except Exception, e:
         notifications.add("error", str(e))
-    finally:
-        # Before unbusying, I update again, so that any keystroke events
-        # that reached the program while it was busy are sent to the
-        # label, not to another window in the application.  If this
-        # update call is removed, the events are only handled after that
-        # widget is destroyed and focus has passed to some other widget,
-        # which will handle the keystrokes instead, leading to the
-        # R-while-loading bug.
-        #print "load_time", time.time() - t0
-        root_window.update()
-        root_window.tk.call("destroy", ".info.progress")
-        root_window.tk.call("grab", "release", ".info.progress")
+        if progress is not None:
+            progress.done()
         if canon:
             canon.progress = DummyProgress()
-        try:
-            progress.done()
-        except UnboundLocalError:
-            pass
         o.tkRedraw()
         root_window.tk.call("set_mode_from_tab")
 
@@ -1494,6 +1585,7 @@ class DummyCanon:
         self.number = p
 
 def parse_gcode_expression(e):
+    wait_preview() # the gcode module can only parse one program at a time
     f = os.path.devnull
     canon = DummyCanon()
 
@@ -1741,9 +1833,6 @@ property_names = [
     ('c', _("C bounds:"))
 ]
 
-def dist((x,y,z),(p,q,r)):
-    return ((x-p)**2 + (y-q)**2 + (z-r)**2) ** .5
-
 # returns units/sec
 def get_jog_speed(a):
     if vars.teleop_mode.get():
@@ -1787,6 +1876,7 @@ def get_max_jog_speed_map(a):
     return get_max_jog_speed(a)
 
 def run_warn():
+    wait_preview()
     warnings = []
     if o.canon:
         machine_limit_min, machine_limit_max = soft_limits()
@@ -1822,7 +1912,7 @@ def reload_file(refilter=True):
         tempfile = os.path.join(tempdir, os.path.basename(loaded_file))
         open_file_guts(tempfile, True, False)
     if line:
-        o.set_highlight_line(line)
+        after_preview(lambda: o.set_highlight_line(line))
 
 def ja_from_rbutton():
     # radiobuttons for joints set ja_rbutton to numeric value [0,MAX_JOINTS)
@@ -1935,6 +2025,7 @@ class TclCommands(nf.TclCommands):
 
 
     def gcode_properties(event=None):
+        wait_preview()
         props = {}
         if not loaded_file:
             props['name'] = _("No file loaded")
@@ -1962,20 +2053,14 @@ class TclCommands(nf.TclCommands):
                 units = _("in")
                 fmt = "%.4f"
 
-            mf = vars.max_speed.get()
-            #print o.canon.traverse[0]
+            stats = ProgramStatistics(o.canon, machine_limits)
+            gt = stats.run_time
 
-            g0 = sum(dist(l[1][:3], l[2][:3]) for l in o.canon.traverse)
-            g1 = (sum(dist(l[1][:3], l[2][:3]) for l in o.canon.feed) +
-                sum(dist(l[1][:3], l[2][:3]) for l in o.canon.arcfeed))
-            gt = (sum(dist(l[1][:3], l[2][:3])/min(mf, l[3]) for l in o.canon.feed) +
-                sum(dist(l[1][:3], l[2][:3])/min(mf, l[3])  for l in o.canon.arcfeed) +
-                sum(dist(l[1][:3], l[2][:3])/mf  for l in o.canon.traverse) +
-                o.canon.dwell_time
-                )
- 
-            props['g0'] = "%f %s".replace("%f", fmt) % (from_internal_linear_unit(g0, conv), units)
-            props['g1'] = "%f %s".replace("%f", fmt) % (from_internal_linear_unit(g1, conv), units)
+            props['g0'] = "%f %s".replace("%f", fmt) % (from_internal_linear_unit(stats.rapid_distance, conv), units)
+            props['g1'] = "%f %s".replace("%f", fmt) % (from_internal_linear_unit(stats.feed_distance, conv), units)
+            props['g'] = "%f %s".replace("%f", fmt) % (from_internal_linear_unit(stats.total_distance, conv), units)
+            if stats.tool_order:
+                props['tools'] = " ".join(str(t) for t in stats.tool_order)
             if gt > 120:
                 props['run'] = _("%.1f minutes") % (gt/60)
             else:
@@ -3646,6 +3731,8 @@ c.wait_complete()
 
 o = MyOpengl(widgets.preview_frame, width=400, height=300, double=1, depth=1)
 o.last_line = 1
+o.preview_cache = PreviewCache.from_ini(inifile, sys.argv[2])
+machine_limits = MachineLimits.from_ini(inifile)
 o.pack(fill="both", expand=1)
 
 def match_grid_size(v):
@@ -3804,6 +3891,13 @@ def remove_tempdir(t):
 tempdir = tempfile.mkdtemp()
 atexit.register(remove_tempdir, tempdir)
 
+@atexit.register
+def stop_preview_load():
+    # the preview thread reads the parameter file copied to tempdir
+    if preview_load is not None:
+        preview_load.canon.aborted = True
+        preview_load.thread.join()
+
 activate_ja_widget(0, True)
 set_hal_jogincrement()
 
@@ -3825,18 +3919,22 @@ else:
 if os.path.exists(initialfile):
     open_file_guts(initialfile, False, addrecent)
 
-if lathe:
-    if lathe_backtool:
-        commands.set_view_y2()
+def set_initial_view():
+    if lathe:
+        if lathe_backtool:
+            commands.set_view_y2()
+        else:
+            commands.set_view_y()
     else:
-        commands.set_view_y()
-else:
-    commands.set_view_p()
-if o.canon:
-    x = (o.canon.min_extents[0] + o.canon.max_extents[0])/2
-    y = (o.canon.min_extents[1] + o.canon.max_extents[1])/2
-    z = (o.canon.min_extents[2] + o.canon.max_extents[2])/2
-    o.set_centerpoint(x, y, z)
+        commands.set_view_p()
+    if o.canon:
+        x = (o.canon.min_extents[0] + o.canon.max_extents[0])/2
+        y = (o.canon.min_extents[1] + o.canon.max_extents[1])/2
+        z = (o.canon.min_extents[2] + o.canon.max_extents[2])/2
+        o.set_centerpoint(x, y, z)
+set_initial_view()
+if preview_load is not None:
+    preview_load.callbacks.append(set_initial_view)
 
 def destroy_splash():
     try:
@@ -31,11 +31,13 @@ except:
 import numpy.core
 plus_inf = numpy.core.Inf
 
-from rs274.author import Gcode
+from rs274.author import Gcode, douglas
 import rs274.options
 
 from math import *
 import operator
+import itertools
+import multiprocessing
 
 epsilon = 1e-5
 
@@ -76,6 +78,88 @@ def make_tool_shape(f, wdia, resp):
     n = n - n.min()
     return n
 
+# rows of the image given to each process of the pool
+TILE = 256
+# scanlines simplified at a time by each process of the pool
+LINES = 4
+
+def running_max(a, k):
+    """The maximum of each k consecutive columns of a, found in a fixed
+    number of passes however large k is (van Herk / Gil-Werman)"""
+    rows, n = a.shape
+    m = -(-n // k) * k
+    padded = numpy.empty((rows, m), dtype=a.dtype)
+    padded[:, :n] = a
+    padded[:, n:] = -plus_inf
+    blocks = padded.reshape(rows, m // k, k)
+    # the maximum from the start of each block, and to its end
+    fwd = numpy.maximum.accumulate(blocks, axis=2).reshape(rows, m)
+    bwd = numpy.maximum.accumulate(blocks[:, :, ::-1], axis=2)
+    bwd = bwd[:, :, ::-1].reshape(rows, m)
+    return numpy.maximum(bwd[:, :n-k+1], fwd[:, k-1:n])
+
+def _envelope(args):
+    image, tool = args
+    th, tw = tool.shape
+    rows = image.shape[0] - th + 1
+    cols = image.shape[1] - tw + 1
+    result = numpy.empty((rows, cols), dtype=numpy.float32)
+    result.fill(-plus_inf)
+    # the tool is taken a row at a time; a row that is flat across all
+    # of its width is one sliding maximum, others one pass per pixel
+    for a in range(th):
+        b = numpy.flatnonzero(tool[a] != plus_inf)
+        if not len(b): continue
+        values = tool[a, b]
+        band = image[a:a+rows]
+        if b[-1] - b[0] + 1 == len(b) and (values == values[0]).all():
+            m = running_max(band, len(b))[:, b[0]:b[0]+cols]
+            m -= values[0]
+            numpy.maximum(result, m, result)
+        else:
+            for bb, v in zip(b, values):
+                numpy.maximum(result, band[:, bb:bb+cols] - v, result)
+    return result
+
+def tool_envelope(image, tool, pool=None):
+    """The height of the tool tip over each pixel of image: the grey-scale
+    dilation of the image by the tool shape, so that
+    tool_envelope(image, tool)[y, x] == (image[y:y+ts, x:x+ts] - tool).max()
+
+    The image is cut into bands of TILE rows, which are worked on by the
+    multiprocessing pool if one is given."""
+    th, tw = tool.shape
+    rows = image.shape[0] - th + 1
+    cols = image.shape[1] - tw + 1
+    if rows <= 0 or cols <= 0:
+        return numpy.zeros((max(rows, 0), max(cols, 0)), dtype=numpy.float32)
+    bands = [(image[j:j+TILE+th-1], tool) for j in range(0, rows, TILE)]
+    if pool: bands = pool.imap(_envelope, bands)
+    else: bands = itertools.imap(_envelope, bands)
+    result = []
+    for band in bands:
+        progress(len(result) * TILE, rows)
+        result.append(band)
+    return numpy.concatenate(result)
+
+def _simplify(args):
+    return list(douglas(*args))
+
+def slopes(z, step):
+    """The slopes of z along its two axes: central differences, except
+    for one sided ones at the edges"""
+    dy = numpy.zeros(z.shape)
+    dx = numpy.zeros(z.shape)
+    if z.shape[0] > 1:
+        dy[1:-1] = (z[2:] - z[:-2]) / (2 * step)
+        dy[0] = (z[1] - z[0]) / step
+        dy[-1] = (z[-1] - z[-2]) / step
+    if z.shape[1] > 1:
+        dx[:, 1:-1] = (z[:, 2:] - z[:, :-2]) / (2 * step)
+        dx[:, 0] = (z[:, 1] - z[:, 0]) / step
+        dx[:, -1] = (z[:, -1] - z[:, -2]) / step
+    return dx, dy
+
 def amax(seq):
     res = 0
     for i in seq:
@@ -210,7 +294,7 @@ class Converter:
             image, units, tool_shape, pixelsize, pixelstep, safetyheight, \
             tolerance, feed, convert_rows, convert_cols, cols_first_flag,
             entry_cut, spindle_speed, roughing_offset, roughing_delta,
-            roughing_feed):
+            roughing_feed, processes=None):
         self.image = image
         self.units = units
         self.tool = tool_shape
@@ -227,8 +311,9 @@ class Converter:
         self.roughing_offset = roughing_offset
         self.roughing_delta = roughing_delta
         self.roughing_feed = roughing_feed
-
-        self.cache = {}
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.processes = processes
 
         w, h = self.w, self.h = image.shape
         ts = self.ts = tool_shape.shape[0]
@@ -242,6 +327,10 @@ class Converter:
         g = self.g
         g.set_feed(self.feed)
 
+        self.z = numpy.minimum(0,
+            numpy.maximum(self.rd, self.envelope.astype(float)) + self.ro)
+        self.dz_dx, self.dz_dy = slopes(self.z, self.pixelsize)
+
         if self.convert_cols and self.cols_first_flag:
             self.g.set_plane(19)
             self.mill_cols(self.convert_cols, True)
@@ -267,6 +356,17 @@ class Converter:
         g.begin()
         g.continuous(self.tolerance)
         g.safety()
+        if self.processes > 1:
+            self.pool = multiprocessing.Pool(self.processes)
+        else:
+            self.pool = None
+        try:
+            self.convert_passes()
+        finally:
+            if self.pool: self.pool.terminate()
+        g.end()
+
+    def convert_passes(self):
         if self.roughing_delta and self.roughing_offset:
             base_image = self.image
             rough = make_tool_shape(ball_tool,
@@ -277,11 +377,8 @@ class Converter:
             h1 = h + th
             nim1 = numpy.zeros((w1, h1), dtype=numpy.float32) + base_image.min()
             nim1[tw/2:tw/2+w, th/2:th/2+h] = base_image
-            self.image = numpy.zeros((w,h), dtype=numpy.float32)
-            for j in range(0, w):
-                progress(j,w)
-                for i in range(0, h):
-                    self.image[j,i] = (nim1[j:j+tw,i:i+th] - rough).max()
+            self.image = tool_envelope(nim1, rough, self.pool)[:w, :h]
+            self.envelope = tool_envelope(self.image, self.tool, self.pool)
             self.feed = self.roughing_feed
             r = -self.roughing_delta
             m = self.image.min()
@@ -294,32 +391,21 @@ class Converter:
                 self.rd = m
                 self.one_pass()
             self.image = base_image
-            self.cache.clear()
+        self.envelope = tool_envelope(self.image, self.tool, self.pool)
         self.feed = self.base_feed
         self.ro = 0
         self.rd = self.image.min()
         self.one_pass()
-        g.end()
 
+    # the heights and slopes of the current pass, computed by one_pass
     def get_z(self, x, y):
-        try:
-            return min(0, max(self.rd, self.cache[x,y]) + self.ro)
-        except KeyError:
-            m1 = self.image[y:y+self.ts, x:x+self.ts]
-            self.cache[x,y] = d = (m1 - self.tool).max()
-            return min(0, max(self.rd, d) + self.ro)
-        
+        return self.z[y, x]
+
     def get_dz_dy(self, x, y):
-        y1 = max(0, y-1)
-        y2 = min(self.image.shape[0]-1, y+1)
-        dy = self.pixelsize * (y2-y1)
-        return (self.get_z(x, y2) - self.get_z(x, y1)) / dy
-        
+        return self.dz_dy[y, x]
+
     def get_dz_dx(self, x, y):
-        x1 = max(0, x-1)
-        x2 = min(self.image.shape[1]-1, x+1)
-        dx = self.pixelsize * (x2-x1)
-        return (self.get_z(x2, y) - self.get_z(x1, y)) / dx
+        return self.dz_dx[y, x]
 
     def mill_rows(self, convert_scan, primary):
         w1 = self.w1; h1 = self.h1;
@@ -328,21 +414,20 @@ class Converter:
         if w1-1 not in jrange: jrange.append(w1-1)
         irange = range(h1)
 
-        for j in jrange:
-            progress(jrange.index(j), len(jrange))
-            y = (w1-j) * pixelsize
-            scan = []
-            for i in irange:
-                x = i * pixelsize
-                milldata = (i, (x, y, self.get_z(i, j)),
-                    self.get_dz_dx(i, j), self.get_dz_dy(i, j))
-                scan.append(milldata)
-            for flag, points in convert_scan(primary, scan):
-                if flag:
-                    self.entry_cut(self, points[0][0], j, points)
-                for p in points:
-                    self.g.cut(*p[1])
-            self.g.flush()
+        def lines():
+            for j in jrange:
+                y = (w1-j) * pixelsize
+                z = self.z[j].tolist()
+                dz_dx = self.dz_dx[j].tolist()
+                dz_dy = self.dz_dy[j].tolist()
+                scan = []
+                for i in irange:
+                    x = i * pixelsize
+                    milldata = (i, (x, y, z[i]), dz_dx[i], dz_dy[i])
+                    scan.append(milldata)
+                yield [(flag, points, points[0][0], j)
+                    for flag, points in convert_scan(primary, scan)]
+        self.mill(lines(), len(jrange))
 
     def mill_cols(self, convert_scan, primary):
         w1 = self.w1; h1 = self.h1;
@@ -352,21 +437,52 @@ class Converter:
         if h1-1 not in jrange: jrange.append(h1-1)
         jrange.reverse()
 
-        for j in jrange:
-            progress(jrange.index(j), len(jrange))
-            x = j * pixelsize
-            scan = []
-            for i in irange:
-                y = (w1-i) * pixelsize
-                milldata = (i, (x, y, self.get_z(j, i)),
-                    self.get_dz_dy(j, i), self.get_dz_dx(j, i))
-                scan.append(milldata)
-            for flag, points in convert_scan(primary, scan):
-                if flag:
-                    self.entry_cut(self, j, points[0][0], points)
-                for p in points:
-                    self.g.cut(*p[1])
-            self.g.flush()
+        def lines():
+            for j in jrange:
+                x = j * pixelsize
+                z = self.z[:, j].tolist()
+                dz_dx = self.dz_dx[:, j].tolist()
+                dz_dy = self.dz_dy[:, j].tolist()
+                scan = []
+                for i in irange:
+                    y = (w1-i) * pixelsize
+                    milldata = (i, (x, y, z[i]), dz_dy[i], dz_dx[i])
+                    scan.append(milldata)
+                yield [(flag, points, j, points[0][0])
+                    for flag, points in convert_scan(primary, scan)]
+        self.mill(lines(), len(jrange))
+
+    def mill(self, lines, count):
+        """Cut the scanlines of lines, each a list of (flag, points, i, j)
+        spans.  The spans are simplified in the pool, a batch of lines at
+        a time, while the batch before is written out."""
+        g = self.g
+        if self.pool: size = self.processes * LINES
+        else: size = 1
+        pending = []
+        done = 0
+        while 1:
+            batch = list(itertools.islice(lines, size))
+            if batch:
+                spans = [([p[1] for p in points], g.tolerance, g.plane)
+                    for line in batch for flag, points, i, j in line]
+                if self.pool:
+                    result = self.pool.map_async(_simplify, spans)
+                else:
+                    result = map(_simplify, spans)
+                pending.append((batch, result))
+                if self.pool and len(pending) < 2: continue
+            if not pending: break
+            batch, result = pending.pop(0)
+            if self.pool: result = result.get()
+            moves = iter(result)
+            for line in batch:
+                progress(done, count)
+                done += 1
+                for flag, points, i, j in line:
+                    if flag:
+                        self.entry_cut(self, i, j, points)
+                    g.moves(moves.next())
 
 def convert(*args, **kw):
     return Converter(*args, **kw).convert()
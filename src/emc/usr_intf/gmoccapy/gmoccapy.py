@@ -39,9 +39,9 @@ import subprocess          # to launch onboard and other processes
 import vte                 # To get the embedded terminal
 import tempfile            # needed only if the user click new in edit mode to open a new empty file
 import linuxcnc            # to get our own error system
-import gobject             # needed to add the timer for periodic
 import locale              # for setting the language of the GUI
 import gettext             # to extract the strings to be translated
+import rs274.statistics     # to show the run time estimate of the loaded program
 
 from gladevcp.gladebuilder import GladeBuilder
 
@@ -160,7 +160,9 @@ class gmoccapy(object):
         # needed components to comunicate with hal and linuxcnc
         self.halcomp = hal.component("gmoccapy")
         self.command = linuxcnc.command()
-        self.stat = linuxcnc.stat()
+        # the status is polled by the status hub, shared with the widgets
+        self.status_hub = hal_glib.StatusHub()
+        self.stat = self.status_hub.stat
 
         self.error_channel = linuxcnc.error_channel()
         # initial poll, so all is up to date
@@ -605,11 +607,12 @@ class gmoccapy(object):
 
         # since the main loop is needed to handle the UI and its events, blocking calls like sleep()
         # will block the UI as well, so everything goes through event handlers (aka callbacks)
-        # The gobject.timeout_add() function sets a function to be called at regular intervals
-        # the time between calls to the function, in milliseconds
+        # The status hub calls _periodic at regular intervals, after it polled linuxcnc;
+        # the interval is the time between calls, in milliseconds
         # CYCLE_TIME = time, in milliseconds, that display will sleep between polls
         cycle_time = self.get_ini_info.get_cycle_time()
-        gobject.timeout_add( cycle_time, self._periodic )  # time between calls to the function, in milliseconds
+        self.status_hub.subscribe( self._periodic, interval = cycle_time,  # time between calls, in milliseconds
+                                   error = self._status_lost )
 
     def set_motion_mode(self, state):
         # 1:teleop, 0: joint
@@ -1135,6 +1138,7 @@ class gmoccapy(object):
         self.widgets.gremlin.set_property( "metric_units", int( self.stat.linear_units ) )
         self.widgets.gremlin.set_property( "mouse_btn_mode", self.prefs.getpref( "mouse_btn_mode", 4, int ) )
         self.widgets.gremlin.set_property( "use_commanded", not self.dro_actual)
+        self.widgets.gremlin.connect( "program-loaded", self.on_gremlin_program_loaded )
         self.widgets.eb_program_label.modify_bg(gtk.STATE_NORMAL, gtk.gdk.Color(0, 0, 0))
         self.widgets.eb_blockheight_label.modify_bg(gtk.STATE_NORMAL, gtk.gdk.Color(0, 0, 0))
 
@@ -1547,16 +1551,14 @@ class gmoccapy(object):
             self.widgets.ntb_preview.set_current_page(0)
             self.widgets.ntb_info.set_current_page(0)
 
-    # every 100 milli seconds this gets called
-    # check linuxcnc for status, error and then update the readout
-    def _periodic(self):
-        # we put the poll comand in a try, so if the linuxcnc pid is killed
-        # from an external command, we also quit the GUI
-        try:
-            self.stat.poll()
-        except:
-            raise SystemExit, "gmoccapy can not poll linuxcnc status any more"
+    # if the linuxcnc pid is killed from an external command,
+    # the status hub can not poll any more and we also quit the GUI
+    def _status_lost(self, error):
+        raise SystemExit, "gmoccapy can not poll linuxcnc status any more"
 
+    # every cycle_time milli seconds this gets called after the status hub polled
+    # check linuxcnc for error and then update the readout
+    def _periodic(self, stat = None, changed = None):
         error = self.error_channel.poll()
         if error:
             self._show_error(error)
@@ -1580,9 +1582,6 @@ class gmoccapy(object):
 
         self.widgets.lbl_time.set_label(strftime("%H:%M:%S") + "\n" + strftime("%d.%m.%Y"))
 
-        # keep the timer running
-        return True
-
     def _show_error(self, error):
         kind, text = error
         # print kind,text
@@ -1723,6 +1722,16 @@ class gmoccapy(object):
             self._sensitize_widgets(widgetlist, False)
             self.widgets.lbl_program.set_text(_("No file loaded"))
 
+    def on_gremlin_program_loaded(self, widget, stats):
+        if self.stat.linear_units == 1:
+            conv, units = 25.4, "mm"
+        else:
+            conv, units = 1, "in"
+        text = _("Estimated run time: %s\nRapid distance: %.1f %s\nFeed distance: %.1f %s") % (
+            rs274.statistics.format_duration(stats.run_time),
+            stats.rapid_distance * conv, units, stats.feed_distance * conv, units)
+        self.widgets.lbl_program.set_tooltip_text(text)
+
     def on_hal_status_line_changed(self, widget, line):
         self.halcomp["program.current-line"] = line
         # this test is only necessary, because of remap and toolchange, it will emit a file loaded signal
@@ -42,13 +42,15 @@ import gtk.gdkgl
 import gtk.gdk
 
 import glnav
-import gobject
 import pango
 
 import rs274.glcanon
 import rs274.interpret
+import rs274.previewcache
+import rs274.statistics
 import linuxcnc
 import gcode
+from hal_glib import StatusHub
 
 import time
 import re
@@ -106,7 +108,13 @@ class Gremlin(gtk.gtkgl.widget.DrawingArea, glnav.GlNavBase,
         )
         thread.start_new_thread(self.logger.start, (.01,))
 
-        rs274.glcanon.GlCanonDraw.__init__(self, linuxcnc.stat(), self.logger)
+        self.status_hub = StatusHub()
+        self.status_subscription = None
+        rs274.glcanon.GlCanonDraw.__init__(self, self.status_hub.stat, self.logger)
+        self.preview_cache = rs274.previewcache.PreviewCache.from_ini(inifile)
+        self.machine_limits = rs274.statistics.MachineLimits.from_ini(inifile)
+        # rs274.statistics.ProgramStatistics of the loaded program
+        self.program_statistics = None
 
         self.current_view = 'z'
 
@@ -202,7 +210,9 @@ class Gremlin(gtk.gtkgl.widget.DrawingArea, glnav.GlNavBase,
         self.logger.clear()
 
     def map(self, *args):
-        gobject.timeout_add(50, self.poll)
+        if self.status_subscription is None:
+            self.status_subscription = self.status_hub.subscribe(
+                self.status_changed, interval=50)
 
     def poll(self):
         s = self.stat
@@ -210,6 +220,12 @@ class Gremlin(gtk.gtkgl.widget.DrawingArea, glnav.GlNavBase,
             s.poll()
         except:
             return
+        self.status_changed(s)
+        return True
+
+    def status_changed(self, s, changed=None):
+        # the backplot and the limits are not status fields, so this is
+        # called after every poll and compares them itself
         fingerprint = (self.logger.npts, self.soft_limits(),
             s.actual_position, s.joint_actual_position,
             s.homed, s.g5x_offset, s.g92_offset, s.limit, s.tool_in_spindle,
@@ -219,9 +235,6 @@ class Gremlin(gtk.gtkgl.widget.DrawingArea, glnav.GlNavBase,
             self.fingerprint = fingerprint
             self.queue_draw()
 
-        # return self.visible
-        return True
-
     @rs274.glcanon.with_context
     def realize(self, widget):
         self.set_current_view()
@@ -255,6 +268,7 @@ class Gremlin(gtk.gtkgl.widget.DrawingArea, glnav.GlNavBase,
 
         td = tempfile.mkdtemp()
         self._current_file = filename
+        self.program_statistics = None
         try:
             random = int(self.inifile.find("EMCIO", "RANDOM_TOOLCHANGER") or 0)
             canon = StatCanon(self.colors, self.get_geometry(),self.lathe_option, s, random)
@@ -269,6 +283,9 @@ class Gremlin(gtk.gtkgl.widget.DrawingArea, glnav.GlNavBase,
             result, seq = self.load_preview(filename, canon, unitcode, initcode)
             if result > gcode.MIN_ERROR:
                 self.report_gcode_error(result, seq, filename)
+            else:
+                self.program_statistics = rs274.statistics.ProgramStatistics(
+                    canon, self.machine_limits)
 
         finally:
             shutil.rmtree(td)
@@ -11,6 +11,7 @@
 # GNU General Public License for more details.
 
 import math
+import numpy
 
 
 class emc_control:
@@ -289,7 +290,7 @@ class emc_control:
             return self.emcstat.task_mode
 
 class emc_status:
-        def __init__(self, data, emc):
+        def __init__(self, data, emc, stat=None):
             self.data = data
             self.emc = emc
             self.resized_dro = 0
@@ -297,8 +298,9 @@ class emc_status:
             self.machine_units_mm=0
             self.unit_convert=[1]*9
             self.actual = 1
-            self.emcstat = emc.stat()
-            self.emcerror = emc.error_channel()
+            # without a stat of its own, the caller polls it
+            self.emcstat = stat or emc.stat()
+            self.own_stat = stat is None
 
         def get_feedrate(self):
             return self.emcstat.feedrate
@@ -358,52 +360,34 @@ class emc_status:
                 return 1
 
         def periodic(self):
-            self.emcstat.poll()
-            am = self.emcstat.axis_mask
-            lathe = not (self.emcstat.axis_mask & 2)
-            dtg = self.emcstat.dtg
+            if self.own_stat:
+                self.emcstat.poll()
+            stat = self.emcstat
+            am = stat.axis_mask
+            lathe = not (am & 2)
 
             if self.actual:
-                p = self.emcstat.actual_position
+                p = numpy.array(stat.actual_position)
             else:
-                p = self.emcstat.position
-
-            x = p[0] - self.emcstat.g5x_offset[0] - self.emcstat.tool_offset[0]
-            y = p[1] - self.emcstat.g5x_offset[1] - self.emcstat.tool_offset[1]
-            z = p[2] - self.emcstat.g5x_offset[2] - self.emcstat.tool_offset[2]
-            a = p[3] - self.emcstat.g5x_offset[3] - self.emcstat.tool_offset[3]
-            b = p[4] - self.emcstat.g5x_offset[4] - self.emcstat.tool_offset[4]
-            c = p[5] - self.emcstat.g5x_offset[5] - self.emcstat.tool_offset[5]
-            u = p[6] - self.emcstat.g5x_offset[6] - self.emcstat.tool_offset[6]
-            v = p[7] - self.emcstat.g5x_offset[7] - self.emcstat.tool_offset[7]
-            w = p[8] - self.emcstat.g5x_offset[8] - self.emcstat.tool_offset[8]
-
-            if self.emcstat.rotation_xy != 0:
-                t = math.radians(-self.emcstat.rotation_xy)
-                xr = x * math.cos(t) - y * math.sin(t)
-                yr = x * math.sin(t) + y * math.cos(t)
-                x = xr
-                y = yr
-
-            x -= self.emcstat.g92_offset[0] 
-            y -= self.emcstat.g92_offset[1] 
-            z -= self.emcstat.g92_offset[2] 
-            a -= self.emcstat.g92_offset[3] 
-            b -= self.emcstat.g92_offset[4] 
-            c -= self.emcstat.g92_offset[5] 
-            u -= self.emcstat.g92_offset[6] 
-            v -= self.emcstat.g92_offset[7] 
-            w -= self.emcstat.g92_offset[8] 
-
-            relp = [x, y, z, a, b, c, u, v, w]
+                p = numpy.array(stat.position)
+            dtg = numpy.array(stat.dtg)
+
+            relp = p - stat.g5x_offset - stat.tool_offset
+            if stat.rotation_xy != 0:
+                t = math.radians(-stat.rotation_xy)
+                c, s = math.cos(t), math.sin(t)
+                relp[:2] = numpy.dot(((c, -s), (s, c)), relp[:2])
+            relp -= stat.g92_offset
 
             if self.mm != self.machine_units_mm:
-                p = self.convert_units_list(p)
-                relp = self.convert_units_list(relp)
-                dtg = self.convert_units_list(dtg)
+                p *= self.unit_convert
+                relp *= self.unit_convert
+                dtg *= self.unit_convert
+            p = p.tolist(); relp = relp.tolist(); dtg = dtg.tolist()
+            homed = stat.homed
             for letter in self.data.axis_list:
                 count = "xyzabcuvws".index(letter)
-                self.data["%s_is_homed"% letter] = self.emcstat.homed[count]
+                self.data["%s_is_homed"% letter] = homed[count]
                 self.data["%s_abs"% letter] = p[count]
                 self.data["%s_rel"% letter] = relp[count]
                 self.data["%s_dtg"% letter] = dtg[count]
@@ -60,6 +60,7 @@ import vte
 import time
 from time import strftime,localtime
 import hal_glib
+import rs274.statistics
 
 #--------------------------------------------------------
 # limit number of times err msgs are displayed
@@ -538,10 +539,15 @@ class Gscreen:
                 print "**** GSCREEN WARNING: Audio test failed - Is gstreamer0.10-plugins-base installed?"
                 self.data.audio_available = False
 
+        # the status is polled once per tick by the status hub, which the
+        # widgets share.  The error channel lives as long as the screen.
+        self.status_hub = hal_glib.StatusHub()
+        self.emcstat = self.status_hub.stat
+        self.emcerror = linuxcnc.error_channel()
         # access to EMC control
         self.emc = emc_interface.emc_control(linuxcnc)
         # access to EMC status
-        self.status = emc_interface.emc_status( self.data, linuxcnc)
+        self.status = emc_interface.emc_status( self.data, linuxcnc, self.emcstat)
         # access to MDI
         mdi_labels = mdi_eventboxes = []
         self.mdi_control = mdi.mdi_control(gtk, linuxcnc, mdi_labels, mdi_eventboxes)
@@ -784,6 +790,10 @@ class Gscreen:
         # see if there are user messages in the ini file 
         self.message_setup()
 
+        # time spent in each display update, to tune CYCLE_TIME
+        self.halcomp.newpin("debug-tick-time-out", hal.HAL_FLOAT, hal.HAL_OUT)
+        self.halcomp.newpin("debug-tick-overruns-out", hal.HAL_S32, hal.HAL_OUT)
+
         # ok everything that might make HAL pins should be done now - let HAL know that
         self.halcomp.ready()
         try:
@@ -800,10 +810,13 @@ class Gscreen:
             self.add_alarm_entry(_("CYCLE_TIME in [DISPLAY] of INI file is too small: defaulting to 100ms"))
             temp = 100
         print _("timeout %d" % int(temp))
+        self.cycle_time = int(temp)
         if "timer_interrupt" in dir(self.handler_instance):
-            gobject.timeout_add(int(temp), self.handler_instance.timer_interrupt)
+            self.tick_function = self.handler_instance.timer_interrupt
         else:
-            gobject.timeout_add(int(temp), self.timer_interrupt)
+            self.tick_function = self.timer_interrupt
+        self.tick_subscription = self.status_hub.subscribe(self.status_tick,
+            interval=self.cycle_time)
 
 
         # print out gscreen functions and docstrings so users know
@@ -2802,6 +2815,19 @@ class Gscreen:
         self.widgets.gcode_tab.set_text(name)
         self.add_alarm_entry(_("Program loaded: %s"%filename))
 
+    def on_gremlin_program_loaded(self,widget,stats):
+        """This is a callback function called when the plot has loaded a program.
+            It adds an alarm entry with the estimated run time and distances
+            stats is a rs274.statistics.ProgramStatistics
+        """
+        if self.data.dro_units == self.data._MM:
+            conv, units = 25.4, "mm"
+        else:
+            conv, units = 1, "in"
+        self.add_alarm_entry(_("Estimated run time: %(time)s, rapid %(g0).1f %(units)s, feed %(g1).1f %(units)s")%
+            {'time': rs274.statistics.format_duration(stats.run_time),
+             'g0': stats.rapid_distance * conv, 'g1': stats.feed_distance * conv, 'units': units})
+
     def on_toggle_keyboard(self,widget,args="",x="",y=""):
         """This is a callback function to display a virtual keyboard
             It will try to grab focus to mdi widget or gcode display widget
@@ -3109,6 +3135,7 @@ class Gscreen:
         signal_list = [
                         ["","button_estop","clicked", "on_estop_clicked"],
                         ["","gremlin","motion-notify-event", "on_gremlin_motion"],
+                        ["","gremlin","program-loaded", "on_gremlin_program_loaded"],
                         ["","button_mode","button_press_event", "on_mode_clicked"],
                         ["","button_menu","button_press_event", "on_mode_select_clicked"],
                         ["","button_plus","pressed", "on_button_plus_pressed"],
@@ -4377,11 +4404,23 @@ class Gscreen:
         settings.set_string_property("gtk-theme-name", theme, "")
 
     # check linuxcnc for status, error and then update the readout
+    # called by the status hub every CYCLE_TIME ms, right after it polled
+    # the status.  The time the update takes goes to the debug-tick-time-out
+    # pin (in ms), and updates longer than CYCLE_TIME are counted on the
+    # debug-tick-overruns-out pin.
+    def status_tick(self, stat, changed):
+        start = time.time()
+        keep = self.tick_function()
+        elapsed = (time.time() - start) * 1000
+        self.halcomp["debug-tick-time-out"] = elapsed
+        if elapsed > self.cycle_time:
+            self.halcomp["debug-tick-overruns-out"] += 1
+        # like a gobject timeout, a tick function stops by returning False
+        if not keep:
+            self.tick_subscription.cancel()
+
     def timer_interrupt(self):
         self.emc.mask()
-        self.emcstat = linuxcnc.stat()
-        self.emcerror = linuxcnc.error_channel()
-        self.emcstat.poll()
         self.data.task_mode = self.emcstat.task_mode 
         self.status.periodic()
         self.data.system = self.status.get_current_system()
@@ -23,6 +23,7 @@
 import os
 import time
 import shutil
+import halnet
 
 class HAL:
     def __init__(self,app):
@@ -33,7 +34,22 @@ class HAL:
         self.a = app    # The parent, pncconf
         global _PD
         _PD = app._p    # private data
+        self.graph = {}
+        self.netlist = None
 
+    # The connection graph: every signal that is on a pin, mapped to that pin.
+    # write_halfile builds it once and the sections query it instead of
+    # searching the pin data for each signal.
+    def pin(self, sig):
+        return self.graph.get(sig)
+
+    # HAL name of the pin carrying sig, or None
+    def halpin(self, sig):
+        try:
+            return self._halpins[sig]
+        except KeyError:
+            name = self._halpins[sig] = self.d.make_pinname(self.graph.get(sig))
+            return name
 
 
 
@@ -46,6 +62,8 @@ class HAL:
             print path,name,ext
             shutil.copy(origname ,os.path.join(base,"backups",name + str(time.time()).replace('.', '') + ext) )
         self._substitution_list = []
+        self.graph = self.d.connections()
+        self._halpins = {}
         axis_convert = ("x","y","z","a")
         halui_cmd_count = 0
         filename = os.path.join(base, self.d.machinename + ".hal")
@@ -101,35 +119,35 @@ class HAL:
         spindle_on = spindle_cw = spindle_ccw = False
         mist = flood = brake = at_speed = bldc = False
 
-        if self.d.findsignal("s-encoder-a"):
+        if "s-encoder-a" in self.graph:
             spindle_enc = True        
-        if self.d.findsignal("probe"):
+        if "probe" in self.graph:
             probe = True
-        if self.d.findsignal("s-pwm-pulse"):
+        if "s-pwm-pulse" in self.graph:
             pwm = True
-        if self.d.findsignal("charge-pump"):
+        if "charge-pump" in self.graph:
             pump = True
-        if self.d.findsignal("estop-ext"):
+        if "estop-ext" in self.graph:
             estop = True
-        if self.d.findsignal("spindle-on"):
+        if "spindle-on" in self.graph:
             spindle_on = True
-        if self.d.findsignal("spindle-cw"):
+        if "spindle-cw" in self.graph:
             spindle_cw = True
-        if self.d.findsignal("spindle-ccw"):
+        if "spindle-ccw" in self.graph:
             spindle_ccw = True
-        if self.d.findsignal("coolant-mist"):
+        if "coolant-mist" in self.graph:
             mist = True
-        if self.d.findsignal("coolant-flood"):
+        if "coolant-flood" in self.graph:
             flood = True
-        if self.d.findsignal("spindle-brake"):
+        if "spindle-brake" in self.graph:
             brake = True
-        if self.d.findsignal("spindle-at-speed"):
+        if "spindle-at-speed" in self.graph:
             at_speed = True
         for i in self.d.available_axes:
             if self.d[i+"bldc_option"]:
                 bldc = True
                 break
-        chargepump = self.d.findsignal("charge-pump-out")
+        chargepump = self.pin("charge-pump-out")
         # load PID compnent:
         # if axis needs PID- (has pwm signal) then add its letter to pidlist
         temp = ""
@@ -479,7 +497,7 @@ class HAL:
             print >>file
 
         # check for shared MPG 
-        pinname = self.d.make_pinname(self.d.findsignal("select-mpg-a"))
+        pinname = self.halpin("select-mpg-a")
         if pinname:
             print "shared MPG", pinname
             ending = ""
@@ -507,7 +525,7 @@ class HAL:
         # check for dedicated axis MPG jogging option
         for axletter in axis_convert:
             if axletter in self.d.available_axes:
-                pinname = self.d.make_pinname(self.d.findsignal(axletter+"-mpg-a"))
+                pinname = self.halpin(axletter+"-mpg-a")
                 if pinname:
                     ending = ""
                     if "enc" in pinname: ending = ".count"
@@ -550,7 +568,7 @@ class HAL:
                 print >>file
 
         # check for dedicated feed override MPG
-        pinname = self.d.make_pinname(self.d.findsignal("fo-mpg-a"))
+        pinname = self.halpin("fo-mpg-a")
         if pinname:
             ending = ""
             if "enc" in pinname: ending = ".count"
@@ -569,7 +587,7 @@ class HAL:
                 print >>file, "    setp halui.feed-override.direct-value false"
                 print >>file, "    setp halui.feed-override.scale .01"
                 if pinname: # dedicated MPG
-                    if self.d.findsignal("fo-enable"): # make it enable-able externally 
+                    if "fo-enable" in self.graph: # make it enable-able externally 
                         print >>file, "net  fo-enable           => halui.feed-override.count-enable"
                     else:
                         print >>file, "    setp halui.feed-override.count-enable true"
@@ -600,7 +618,7 @@ class HAL:
                 print >>file
 
         # check for dedicated max velocity MPG
-        pinname = self.d.make_pinname(self.d.findsignal("mvo-mpg-a"))
+        pinname = self.halpin("mvo-mpg-a")
         if pinname:
             ending = ""
             if "enc" in pinname: ending = ".count"
@@ -623,7 +641,7 @@ class HAL:
                 print >>file, "    setp halui.max-velocity.direct-value false"
                 print >>file, "    setp halui.max-velocity.scale %04f"% scale
                 if pinname: # dedicated MPG
-                    if self.d.findsignal("mvo-enable"): # make it enable-able externally 
+                    if "mvo-enable" in self.graph: # make it enable-able externally 
                         print >>file, "net mvo-enable           =>  halui.max-velocity.count-enable"
                     else:
                         print >>file, "    setp halui.max-velocity.count-enable true"
@@ -654,7 +672,7 @@ class HAL:
                 print >>file
 
         # check for dedicated spindle override MPG
-        pinname = self.d.make_pinname(self.d.findsignal("so-mpg-a"))
+        pinname = self.halpin("so-mpg-a")
         if pinname:
             ending = ""
             if "enc" in pinname: ending = ".count"
@@ -672,7 +690,7 @@ class HAL:
                 print >>file, "    setp halui.spindle.0.override.direct-value false"
                 print >>file, "    setp halui.spindle.0.override.scale .01"
                 if pinname: # dedicated MPG
-                    if self.d.findsignal("so-enable"): # make it enable-able externally
+                    if "so-enable" in self.graph: # make it enable-able externally
                         print >>file, "net so-enable             =>  halui.spindle.0.override.count-enable"
                     else:
                         print >>file, "    setp halui.spindle.0.override.count-enable true"
@@ -710,11 +728,11 @@ class HAL:
         print >>file
         for i in range(4):
             dout = "dout-%02d" % i
-            if self.d.findsignal(dout):
+            if dout in self.graph:
                 print >>file, "net %s     <=  motion.digital-out-%02d" % (dout, i)
         for i in range(4):
             din = "din-%02d" % i
-            if self.d.findsignal(din):
+            if din in self.graph:
                 print >>file, "net %s     =>  motion.digital-in-%02d" % (din, i)
         print >>file, _("#  ---estop signals---")
         print >>file
@@ -966,6 +984,12 @@ class HAL:
                   print "Master PYVCP file: %s missing from configurable_options dir"% self.d.pyvcpname
         file.close()
         self.d.add_md5sum(filename)
+        # keep the graph of what was written, for comparing configurations
+        try:
+            self.netlist = halnet.read(filename)
+        except ValueError, detail:
+            print "**** ERROR in generated HAL file:", detail
+            self.netlist = None
 
     def write_gs2_vfd(self,filename):
         p = self.d.gs2_vfd_port
@@ -1136,29 +1160,29 @@ class HAL:
         if let == 's':
             title = 'SPINDLE'
         closedloop = False
-        pwmpin = self.a.pwmgen_sig(let)
+        pwmpin = self.pin(let + "-pwm-pulse")
         pwmpinname = self.d.make_pinname(pwmpin)
         if pwmpinname and not 'serial' in pwmpin: # TODO allow sserial PWM to be inverted
             pwminvertlist = self.a.pwmgen_invert_pins(pwmpin)
         if not pwmpin == None:
-            pwmtype = self.a.pwmgen_sig(let)+"type"
+            pwmtype = pwmpin+"type"
         else:
             pwmtype = None
-        tppwmpinname = self.d.make_pinname(self.a.tppwmgen_sig(let))
-        tppwm_six = self.a.tppwmgen_has_6(let)
-        steppinname = self.d.make_pinname(self.a.stepgen_sig(let))
+        tppwmpinname = self.halpin(let + "-tppwm-a")
+        tppwm_six = self.pin(let + "-tppwm-anot")
+        steppinname = self.halpin(let + "-stepgen-step")
         try:
             bldc_control = self.d[let+"bldc_option"]
         except:
             bldc_control = False
         if steppinname:
-            stepinvertlist = self.a.stepgen_invert_pins(self.a.stepgen_sig(let))
-        encoderpinname = self.d.make_pinname(self.a.encoder_sig(let))
-        amp8i20pinname = self.d.make_pinname(self.a.amp_8i20_sig(let))
-        resolverpinname = self.d.make_pinname(self.a.resolver_sig(let))
-        potpinname = self.d.make_pinname(self.a.potoutput_sig(let))
+            stepinvertlist = self.a.stepgen_invert_pins(self.pin(let + "-stepgen-step"))
+        encoderpinname = self.halpin(let + "-encoder-a")
+        amp8i20pinname = self.halpin(let + "-8i20")
+        resolverpinname = self.halpin(let + "-resolver")
+        potpinname = self.halpin(let + "-pot-output")
         if potpinname:
-            potinvertlist = self.a.spindle_invert_pins(self.a.potoutput_sig(let))
+            potinvertlist = self.a.spindle_invert_pins(self.pin(let + "-pot-output"))
         if steppinname and encoderpinname and not let == 's': closedloop = True
         if (encoderpinname or resolverpinname) and (pwmpinname or tppwmpinname or amp8i20pinname): closedloop = True
         print let + " is closedloop? "+ str(closedloop)
@@ -1432,7 +1456,7 @@ class HAL:
             print >>file, "net spindle-vel-fb-rps         =>  spindle.0.speed-in"
             print >>file, "net spindle-index-enable      <=>  spindle.0.index-enable"
             print >>file
-            if not self.d.findsignal("spindle-at-speed"):
+            if not "spindle-at-speed" in self.graph:
                 print >>file, "# ---Setup spindle at speed signals---"
                 print >>file
                 if (encoderpinname or resolverpinname) and self.d.suseatspeed:
@@ -1503,7 +1527,7 @@ class HAL:
                 if not p == "unused-encoder":
                     for sig in (self.d.halencoderinputsignames):
                        if p == sig+"-a":
-                            pinname = self.d.make_pinname(self.d.findsignal( p ))
+                            pinname = self.halpin(p)
                             print >>file, "\n# ---",sig.upper(),"---"
                             print >>file, "net %s         <=  "% (sig+"-position")+pinname +".position"
                             print >>file, "net %s            <=  "% (sig+"-count")+pinname +".count"
@@ -1520,7 +1544,7 @@ class HAL:
                 if not p == "unused-resolver":
                     for sig in (self.d.halresolversignames):
                        if p == sig:
-                            pinname = self.d.make_pinname(self.d.findsignal( p ))
+                            pinname = self.halpin(p)
                             print >>file, "\n# ---",sig.upper(),"---"
                             print >>file, "net %s         <=  "% (sig+"-position")+pinname +".position"
                             print >>file, "net %s            <=  "% (sig+"-count")+pinname +".count"
@@ -1538,7 +1562,7 @@ class HAL:
             # for analog in pins
             elif t == (_PD.ANALOGIN):
                 if not p == "unused-analog-input":
-                            pinname = self.d.make_pinname(self.d.findsignal( p ))
+                            pinname = self.halpin(p)
                             print >>file, "\n# ---",p.upper(),"---"
                             print >>file, "net %s         <=  "% (p)+pinname
 
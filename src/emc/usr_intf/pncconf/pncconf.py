@@ -31,7 +31,9 @@ import errno
 import time
 import hashlib
 import pickle
+import re
 import shutil
+import multiprocessing
 import math
 from optparse import Option, OptionParser
 import textwrap
@@ -124,6 +126,15 @@ def md5sum(filename):
     else:
         return hashlib.md5(f.read()).hexdigest()    
 
+# parsed firmware XMLs are kept here, with the time and size of their files
+FIRMWARE_CACHE = os.path.expanduser("~/.pncconf-firmware-cache")
+# change this when parse_xml changes what it makes of a file
+FIRMWARE_CACHE_VERSION = 1
+
+def parse_firmware(args):
+    """Parse a firmware XML in a process of the pool"""
+    return app.parse_xml(*args)
+
 # a class for holding the glade widgets rather then searching for them each time
 class Widgets:
     def __init__(self, xml):
@@ -139,8 +150,17 @@ class Widgets:
 
 
 
+# the names of the Data attributes that hold the signal of a pin
+MESAPIN = re.compile(r"mesa(\d+)c(\d+)pin(\d+)$")
+SSERIALPIN = re.compile(r"mesa(\d+)sserial(\d+)_(\d+)pin(\d+)$")
+PPORTPIN = re.compile(r"pp(\d)_([IO])pin(\d+)$")
+PPORTINPUTS = (2,3,4,5,6,7,8,9,10,11,12,13,15)
+PPORTOUTPUTS = (1,2,3,4,5,6,7,8,9,14,16,17)
+
 class Data:
     def __init__(self,_PD):
+        # the pins each signal is on, kept by __setattr__
+        self.__dict__['_signalpins'] = {}
         pw = pwd.getpwuid(os.getuid())
         # custom signal name lists
         self.halencoderinputsignames = []
@@ -1157,51 +1177,75 @@ Choosing no will mean AXIS options such as size/position and force maximum might
         return getattr(self, item)
     def __setitem__(self, item, value):
         return setattr(self, item, value)
+    def __setattr__(self, item, value):
+        if item[:2] in ("me", "pp") and (MESAPIN.match(item)
+                or SSERIALPIN.match(item) or PPORTPIN.match(item)):
+            pins = self._signalpins
+            if item in self.__dict__:
+                old = self.__dict__[item]
+                pins[old].discard(item)
+                if not pins[old]: del pins[old]
+            pins.setdefault(value, set()).add(item)
+        self.__dict__[item] = value
 
     # This method returns I/O pin designation (name and number) of a given HAL signalname.
     # It does not check to see if the signalname is in the list more then once.
     # if parports are not used then signals are not searched.
+    # The pins a signal is on are looked up in the index kept by __setattr__;
+    # of those in use, mesa pins come first, then sserial pins, then
+    # parport inputs and outputs.
     def findsignal(self, sig):
-        if self.number_pports:
-            ppinput = {}
-            ppoutput = {}
-            for i in (1,2,3):
-                for s in (2,3,4,5,6,7,8,9,10,11,12,13,15):
-                    key = self["pp%d_Ipin%d" %(i,s)]
-                    ppinput[key] = "pp%d_Ipin%d" %(i,s) 
-                for s in (1,2,3,4,5,6,7,8,9,14,16,17):
-                    key = self["pp%d_Opin%d" %(i,s)]
-                    ppoutput[key] = "pp%d_Opin%d" %(i,s) 
-        mesa = {}
-        for boardnum in range(0,int(self.number_mesa)):
-            for concount,connector in enumerate(self["mesa%d_currentfirmwaredata"% (boardnum)][_PD._NUMOFCNCTRS]) :
-                for s in range(0,24):
-                    key =   self["mesa%dc%dpin%d"% (boardnum,connector,s)]
-                    mesa[key] = "mesa%dc%dpin%d" %(boardnum,connector,s)
-            if self["mesa%d_numof_sserialports"% boardnum]:
-                sserial = {}
-                port = 0
-                for channel in range (0,self["mesa%d_currentfirmwaredata"% boardnum][_PD._MAXSSERIALCHANNELS]):
-                        if channel ==_PD._NUM_CHANNELS: break # TODO may not be all channels available
-                        for pin in range (0,_PD._SSCOMBOLEN):       
-                            key = self['mesa%dsserial%d_%dpin%d' % (boardnum, port, channel, pin)]
-                            sserial[key] = 'mesa%dsserial%d_%dpin%d' % (boardnum, port, channel, pin)
-        try:
-            return mesa[sig]
-        except:
-            try:
-                return sserial[sig]
-            except:
-                pass
-        if self.number_pports:
-            try:
-                return ppinput[sig]
-            except:
-                try:
-                    return ppoutput[sig]
-                except:
-                    return None
-        else: return None
+        best = None
+        for name in self._signalpins.get(sig, ()):
+            rank = self.pin_rank(name)
+            if rank is not None and (best is None or rank > best[0]):
+                best = rank, name
+        if best: return best[1]
+        return None
+
+    # This method returns every signal that is on a pin in use, mapped to the
+    # pin findsignal would return for it, in one pass over the index.
+    def connections(self):
+        graph = {}
+        for sig in self._signalpins:
+            pin = self.findsignal(sig)
+            if pin: graph[sig] = pin
+        return graph
+
+    # the order of the pins findsignal looks at, best last: None for pins
+    # that are not in use
+    def pin_rank(self, name):
+        m = MESAPIN.match(name)
+        if m:
+            boardnum, connector, pin = map(int, m.groups())
+            if boardnum >= int(self.number_mesa) or pin >= 24: return None
+            connectors = self["mesa%d_currentfirmwaredata"% boardnum][_PD._NUMOFCNCTRS]
+            if connector not in connectors: return None
+            return 3, boardnum, connectors.index(connector), pin
+        m = SSERIALPIN.match(name)
+        if m:
+            boardnum, port, channel, pin = map(int, m.groups())
+            # only the last board with sserial ports is searched, and only
+            # its first port
+            if port != 0: return None
+            for last in range(int(self.number_mesa)-1,-1,-1):
+                if self["mesa%d_numof_sserialports"% last]: break
+            else:
+                return None
+            if boardnum != last or pin >= _PD._SSCOMBOLEN: return None
+            firmware = self["mesa%d_currentfirmwaredata"% boardnum]
+            if channel >= min(firmware[_PD._MAXSSERIALCHANNELS], _PD._NUM_CHANNELS): return None
+            return 2, channel, pin
+        m = PPORTPIN.match(name)
+        if m and self.number_pports:
+            port, direction, pin = int(m.group(1)), m.group(2), int(m.group(3))
+            if port not in (1,2,3): return None
+            if direction == "I":
+                if pin not in PPORTINPUTS: return None
+                return 1, port, pin
+            if pin not in PPORTOUTPUTS: return None
+            return 0, port, pin
+        return None
 
     # search all the current firmware array for related pins
     # if not the same component number as the pin that changed or
@@ -1414,6 +1458,7 @@ class App:
            _DEBUGSTRING = [dbgstate]
         self.recursive_block = False
         self.firmware_block = False
+        self.firmware_cache = None
         # Private data holds the array of pages to load, signals, and messages
         _PD = self._p = private_data.Private_Data(self,BIN,BASE)
         self.d = Data(self._p)
@@ -2067,7 +2112,6 @@ PNCconf will use internal firmware data"%self._p.FIRMDIR),True)
 
     def mesa_firmware_search(self,boardtitle,*args):
         #TODO if no firm packages set up for internal data?
-        #TODO don't do this if the firmware is already loaded
         self.pbar.set_text("Loading external firmware")
         self.pbar.set_fraction(0)
         self.window.show()
@@ -2086,16 +2130,93 @@ PNCconf will use internal firmware data"%self._p.FIRMDIR),True)
                     temp = name.rstrip(".xml")
                     firmlist.append(temp)
         dbg("\nXML list:%s"%firmlist,mtype="firmname")
-        for n,currentfirm in enumerate(firmlist):
-            self.pbar.set_fraction(n*1.0/len(firmlist))
-            while gtk.events_pending():
-                gtk.main_iteration()
-            # XMLs don't tell us the driver type so set to None (parse will guess)
-            firmdata = self.parse_xml(None,boardtitle, currentfirm,os.path.join(
-                                self._p.FIRMDIR,boardtitle,currentfirm+".xml"))
-            self._p.MESA_FIRMWAREDATA.append(firmdata)
+        # only the files that are new or changed since they were last
+        # parsed are parsed again, in a pool of processes
+        cache = self.load_firmware_cache()
+        keys = {}
+        stale = []
+        changed = False
+        for currentfirm in firmlist:
+            path = os.path.join(self._p.FIRMDIR,boardtitle,currentfirm+".xml")
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            keys[currentfirm] = path, st.st_mtime, st.st_size
+            entry = cache.get(path)
+            if entry is None or entry[:2] != (st.st_mtime, st.st_size):
+                # XMLs don't tell us the driver type so set to None (parse will guess)
+                stale.append((None,boardtitle,currentfirm,path))
+        if stale:
+            dbg("\nparsing XML:%s"%[i[2] for i in stale],mtype="firmname")
+            if len(stale) > 1 and multiprocessing.cpu_count() > 1:
+                pool = multiprocessing.Pool()
+                results = pool.imap(parse_firmware, stale)
+            else:
+                pool = None
+                results = (parse_firmware(i) for i in stale)
+            try:
+                for n,firmdata in enumerate(results):
+                    self.pbar.set_fraction(n*1.0/len(stale))
+                    while gtk.events_pending():
+                        gtk.main_iteration()
+                    path, mtime, size = keys[stale[n][2]]
+                    cache[path] = mtime, size, firmdata
+            finally:
+                if pool: pool.terminate()
+            changed = True
+        # forget the files of this board that are gone
+        folder = os.path.join(self._p.FIRMDIR,boardtitle,"")
+        present = set(i[0] for i in keys.values())
+        for path in cache.keys():
+            if path.startswith(folder) and path not in present:
+                del cache[path]
+                changed = True
+        if changed:
+            self.save_firmware_cache()
+        # copies, so nothing done to the firmware data changes the cache
+        for currentfirm in firmlist:
+            if currentfirm in keys:
+                firmdata = cache[keys[currentfirm][0]][2]
+                self._p.MESA_FIRMWAREDATA.append(copy.deepcopy(firmdata))
         self.window.hide()
 
+    def firmware_cache_version(self):
+        # the pin types of parsed firmware are translated names, so the
+        # cache is only good for the language it was made in
+        names = [v for k,v in sorted(vars(self._p).items()) if k.startswith('pintype_')]
+        return FIRMWARE_CACHE_VERSION, hashlib.md5(repr(names)).hexdigest()
+
+    def load_firmware_cache(self):
+        """Return the parsed firmware, by path, read from the cache file the
+        first time"""
+        if self.firmware_cache is None:
+            self.firmware_cache = {}
+            try:
+                f = open(FIRMWARE_CACHE, "rb")
+                try:
+                    version, cache = pickle.load(f)
+                finally:
+                    f.close()
+                if version == self.firmware_cache_version():
+                    self.firmware_cache = cache
+            except Exception, detail:
+                dbg("firmware cache not loaded: %s"%detail,mtype="firmname")
+        return self.firmware_cache
+
+    def save_firmware_cache(self):
+        temp = FIRMWARE_CACHE + ".tmp"
+        try:
+            f = open(temp, "wb")
+            try:
+                pickle.dump((self.firmware_cache_version(), self.firmware_cache), f,
+                    pickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+            os.rename(temp, FIRMWARE_CACHE)
+        except (IOError, OSError), detail:
+            print "**** WARNING: Pncconf could not save the firmware cache:", detail
+
     def parse_xml(self, driver, boardtitle, firmname, xml_path):
             def search(elementlist):
                 for i in elementlist:
@@ -23,6 +23,7 @@
 import os
 import time
 import shutil
+import halnet
 
 class HAL:
     def __init__(self,app):
@@ -31,10 +32,14 @@ class HAL:
         global SIG
         SIG = app._p    # private data (signal names)
         self.a = app    # The parent, stepconf
+        self.inputs = self.outputs = set()
+        self.netlist = None
 
     def write_halfile(self, base):
-        inputs = self.a.build_input_set()
-        outputs = self.a.build_output_set()
+        # the signals on the parport pins are collected once; every section
+        # below looks them up in these sets
+        self.inputs = inputs = self.a.build_input_set()
+        self.outputs = outputs = self.a.build_output_set()
 
         filename = os.path.join(base, self.d.machinename + ".hal")
         file = open(filename, "w")
@@ -410,6 +415,12 @@ class HAL:
         file.close()
         self.sim_hardware_halfile(base)
         self.d.add_md5sum(filename)
+        # keep the graph of what was written, for comparing configurations
+        try:
+            self.netlist = halnet.read(filename)
+        except ValueError, detail:
+            print "**** ERROR in generated HAL file:", detail
+            self.netlist = None
 
 #******************
 # HELPER FUNCTIONS
@@ -433,7 +444,7 @@ class HAL:
         print >>file, "net %sstep <= stepgen.%d.step" % (let, num)
         print >>file, "net %sdir <= stepgen.%d.dir" % (let, num)
         print >>file, "net %senable joint.%d.amp-enable-out => stepgen.%d.enable" % (let, num, num)
-        homesig = self.a.home_sig(let)
+        homesig = self.a.home_sig(let, self.inputs)
         if homesig:
             print >>file, "net %s => joint.%d.home-sw-in" % (homesig, num)
         min_limsig = self.min_lim_sig(let)
@@ -450,8 +461,7 @@ class HAL:
             print >>f1, _("# This file sets up simulated limits/home/spindle encoder hardware.")
             print >>f1, _("# This is a generated file do not edit.")
             print >>f1
-            inputs = self.a.build_input_set()
-            if SIG.PHA in inputs:
+            if SIG.PHA in self.inputs:
                 print >>f1, "loadrt sim_encoder names=sim-encoder"
                 print >>f1, "setp sim-encoder.ppr %d"%int(self.d.spindlecpr)
                 print >>f1, "setp sim-encoder.scale 1"
@@ -646,10 +656,9 @@ class HAL:
                 print >>file, "setp parport.0.pin-%02d-out-reset%s 1" % (num,ending)
 
     def min_lim_sig(self, axis):
-        inputs = self.a.build_input_set()
         thisaxisminlimits = set((SIG.ALL_LIMIT, SIG.ALL_LIMIT_HOME, "min-" + axis, "min-home-" + axis,
                                "both-" + axis, "both-home-" + axis))
-        for i in inputs:
+        for i in self.inputs:
             if i in thisaxisminlimits:
                 if i==SIG.ALL_LIMIT_HOME:
                     # ALL_LIMIT is reused here as filtered signal
@@ -658,10 +667,9 @@ class HAL:
                     return i
 
     def max_lim_sig(self, axis):
-        inputs = self.a.build_input_set()
         thisaxismaxlimits = set((SIG.ALL_LIMIT, SIG.ALL_LIMIT_HOME, "max-" + axis, "max-home-" + axis,
                                "both-" + axis, "both-home-" + axis))
-        for i in inputs:
+        for i in self.inputs:
             if i in thisaxismaxlimits:
                 if i==SIG.ALL_LIMIT_HOME:
                     # ALL_LIMIT is reused here as filtered signal
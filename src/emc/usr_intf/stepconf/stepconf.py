@@ -1539,9 +1539,10 @@ class StepconfApp:
         if steptime is None: steptime = self.d.steptime
         return steptime <= 5000
 
-    def home_sig(self, axis):
+    def home_sig(self, axis, inputs=None):
         SIG = self._p
-        inputs = self.build_input_set()
+        if inputs is None:
+            inputs = self.build_input_set()
         thisaxishome = set((SIG.ALL_HOME, SIG.ALL_LIMIT_HOME, "home-" + axis, "min-home-" + axis,
                             "max-home-" + axis, "both-home-" + axis))
         for i in inputs:
@@ -229,7 +229,7 @@ class emc_status:
                      dro_table,
                      error,
                      estops, machines, override_limit, status,
-                     floods, mists, spindles, prefs, opstop, blockdel):
+                     floods, mists, spindles, prefs, opstop, blockdel, stat=None):
                 self.gtk = gtk
                 self.emc = emc
                 self.listing = listing
@@ -254,7 +254,9 @@ class emc_status:
                 self.machine_units_mm=0
                 self.unit_convert=[1]*9
                 self.actual = 0
-                self.emcstat = emc.stat()
+                # without a stat of its own, the caller polls it
+                self.emcstat = stat or emc.stat()
+                self.own_stat = stat is None
                 self.emcerror = emc.error_channel()
 
         def dro_inch(self, b):
@@ -291,7 +293,7 @@ class emc_status:
                 return 1
 
         def periodic(self):
-                self.emcstat.poll()
+                if self.own_stat: self.emcstat.poll()
                 am = self.emcstat.axis_mask
                 lathe = not (self.emcstat.axis_mask & 2)
                 dtg = self.emcstat.dtg
@@ -15,11 +15,13 @@
 import hal
 
 class hal_interface:
-    def __init__(self, gui, emc_control, mdi_control, emc):
+    def __init__(self, gui, emc_control, mdi_control, emc, stat=None):
         self.gui = gui
         self.emc_control = emc_control
         self.emc = emc
-        self.emc_stat = self.emc.stat()
+        # without a stat of its own, the caller polls it
+        self.emc_stat = stat or self.emc.stat()
+        self.own_stat = stat is None
         self.mdi_control = mdi_control
         self.c = hal.component("touchy")
         self.c.newpin("status-indicator", hal.HAL_BIT, hal.HAL_OUT)
@@ -209,7 +211,7 @@ class hal_interface:
         if abort and not self.abort: self.emc_control.abort()
         self.abort = abort
 
-        self.emc_stat.poll()
+        if self.own_stat: self.emc_stat.poll()
         self.c["jog.active"] = self.emc_stat.task_mode == self.emc.MODE_MANUAL
 
         if self.emc_stat.paused:
@@ -61,6 +61,7 @@ def set_text(w, t):
 	if ot != t: w.set_label(t)
 
 import linuxcnc
+import hal_glib
 from touchy import emc_interface
 from touchy import mdi
 from touchy import hal_interface
@@ -201,9 +202,11 @@ class touchy:
                 self.listing = listing.listing(gtk, linuxcnc, listing_labels, listing_eventboxes)
 
                 # emc interface
+                self.status_hub = hal_glib.StatusHub()
                 self.linuxcnc = emc_interface.emc_control(linuxcnc, self.listing, self.wTree.get_widget("error"))
                 self.linuxcnc.continuous_jog_velocity(self.mv_val)
-                self.hal = hal_interface.hal_interface(self, self.linuxcnc, self.mdi_control, linuxcnc)
+                self.hal = hal_interface.hal_interface(self, self.linuxcnc, self.mdi_control, linuxcnc,
+                                                       self.status_hub.stat)
 
                 # silly file chooser
                 filechooser_labels = []
@@ -248,7 +251,7 @@ class touchy:
                                                        self.wTree.get_widget("override_limits"),
                                                        stats,
                                                        floods, mists, spindles, prefs,
-                                                       opstop, blockdel)
+                                                       opstop, blockdel, self.status_hub.stat)
 
                 self.current_file = self.status.emcstat.file
                 # check the ini file if UNITS are set to mm"
@@ -296,8 +299,8 @@ class touchy:
 
                 self.linuxcnc.max_velocity(self.mv_val)
                                 
-                gobject.timeout_add(50, self.periodic_status)
-                gobject.timeout_add(100, self.periodic_radiobuttons)
+                self.status_hub.subscribe(self.periodic_status, interval=50)
+                self.status_hub.subscribe(self.periodic_radiobuttons, interval=100)
 
                 # event bindings
                 dic = {
@@ -681,7 +684,7 @@ class touchy:
                 self.current_file = self.filechooser.select(eb, e)
                 self.listing.clear_startline()
 
-        def periodic_status(self):
+        def periodic_status(self, stat, changed):
                 self.linuxcnc.mask()
                 self.radiobutton_mask = 1
                 self.status.periodic()
@@ -697,10 +700,8 @@ class touchy:
                 self.hal.periodic(self.tab == 1) # MDI tab?
                 return True
 
-        def periodic_radiobuttons(self):
+        def periodic_radiobuttons(self, s, changed):
                 self.radiobutton_mask = 1
-                s = linuxcnc.stat()
-                s.poll()
                 # Show effect of external override inputs
                 self.fo_val = s.feedrate * 100
                 self.so_val = s.spindle[0]['override'] * 100
@@ -455,6 +455,24 @@ static PyObject *pyhal_get_pin(PyObject *_self, PyObject *o) {
     return pyhal_pin_new(pin, name);
 }
 
+static PyObject *pyhal_get_values(PyObject *_self, PyObject *o) {
+    halobject *self = (halobject *)_self;
+    EXCEPTION_IF_NOT_LIVE(NULL);
+
+    PyObject *result = PyDict_New();
+    if(!result) return NULL;
+    for(itemmap::iterator i = self->items->begin(); i != self->items->end(); i++) {
+        PyObject *value = pyhal_read_common(&i->second);
+        if(!value || PyDict_SetItemString(result, i->first.c_str(), value) < 0) {
+            Py_XDECREF(value);
+            Py_DECREF(result);
+            return NULL;
+        }
+        Py_DECREF(value);
+    }
+    return result;
+}
+
 static PyObject *pyhal_ready(PyObject *_self, PyObject *o) {
     // hal_ready did not exist in EMC 2.0.x, make it a no-op
     halobject *self = (halobject *)_self;
@@ -541,6 +559,8 @@ static PyMethodDef hal_methods[] = {
         "Create a new pin"},
     {"getitem", pyhal_get_pin, METH_VARARGS,
         "Get existing pin object"},
+    {"getvalues", pyhal_get_values, METH_NOARGS,
+        "Get the values of all pins and params as a dictionary"},
     {"exit", pyhal_exit, METH_NOARGS,
         "Call hal_exit"},
     {"ready", pyhal_ready, METH_NOARGS,
@@ -18,6 +18,12 @@
 import linux_event, sys, os, fcntl, hal, select, time, glob, fnmatch, select
 from hal import *
 
+EV_KEY = linux_event.EV['EV_KEY']
+EV_REL = linux_event.EV['EV_REL']
+EV_ABS = linux_event.EV['EV_ABS']
+# the subset option letter of each kind of event
+PARTS = {EV_KEY: 'K', EV_REL: 'R', EV_ABS: 'A'}
+
 def tohalname(s): return str(s).lower().replace("_", "-")
 
 class HalWrapper:
@@ -49,140 +55,181 @@ class HalWrapper:
 	raise KeyError, k
 	self._drive[k] = v
 
+class RelAxis:
+    """The pins of a relative axis, and the values last read from them"""
+    def __init__(self, comp, prefix):
+        self.position = comp.newpin(prefix + "-position", HAL_FLOAT, HAL_OUT)
+        self.counts = comp.newpin(prefix + "-counts", HAL_S32, HAL_OUT)
+        self.reset = comp.newpin(prefix + "-reset", HAL_BIT, HAL_IN)
+        self.scale = comp.newpin(prefix + "-scale", HAL_FLOAT, HAL_IN)
+        self.scale.set(1.)
+        self.value = 0
+        self.last_scale = None
+
+    def refresh(self):
+        """Return whether the position needs computing again"""
+        return self.reset.get() or self.scale.get() != self.last_scale
+
+    def update(self):
+        if self.reset.get(): self.value = 0
+        self.last_scale = self.scale.get()
+        self.counts.set(self.value)
+        self.position.set(self.value / (self.last_scale or 1))
+
+class AbsAxis:
+    """The pins of an absolute axis, and the values last read from them"""
+    def __init__(self, comp, prefix, absinfo):
+        self.position = comp.newpin(prefix + "-position", HAL_FLOAT, HAL_OUT)
+        self.counts = comp.newpin(prefix + "-counts", HAL_S32, HAL_OUT)
+        self.is_pos = comp.newpin(prefix + "-is-pos", HAL_BIT, HAL_OUT)
+        self.is_neg = comp.newpin(prefix + "-is-neg", HAL_BIT, HAL_OUT)
+        self.scale = comp.newpin(prefix + "-scale", HAL_FLOAT, HAL_IN)
+        self.offset = comp.newpin(prefix + "-offset", HAL_FLOAT, HAL_IN)
+        self.fuzz = comp.newpin(prefix + "-fuzz", HAL_S32, HAL_IN)
+        self.flat = comp.newpin(prefix + "-flat", HAL_S32, HAL_IN)
+        minimum = comp.newparam(prefix + "-min", HAL_S32, HAL_RO)
+        maximum = comp.newparam(prefix + "-max", HAL_S32, HAL_RO)
+        center = (absinfo.minimum + absinfo.maximum)/2.
+        halfrange = (absinfo.maximum - absinfo.minimum)/2. or 1
+        self.counts.set(absinfo.value)
+        self.position.set((absinfo.value - center) / halfrange)
+        self.scale.set(halfrange)
+        self.offset.set(center)
+        self.fuzz.set(absinfo.fuzz)
+        self.flat.set(absinfo.flat)
+        minimum.set(absinfo.minimum)
+        maximum.set(absinfo.maximum)
+        self.value = absinfo.value
+        self.inputs = None
+        self.refresh()
+
+    def refresh(self):
+        """Read the input pins; return whether the position needs
+        computing again"""
+        inputs = (self.scale.get(), self.offset.get(), self.fuzz.get(),
+            self.flat.get())
+        if inputs == self.inputs: return False
+        self.inputs = inputs
+        self.last_scale = inputs[0] or 1
+        self.last_offset = inputs[1]
+        self.last_fuzz = inputs[2]
+        self.center = int(inputs[1])
+        self.low = self.center - inputs[3]
+        self.high = self.center + inputs[3]
+        return True
+
+    def event(self, value):
+        """Take the value of an event; return whether counts changed"""
+        if self.low <= value <= self.high:
+            value = self.center
+        if abs(value - self.value) > self.last_fuzz:
+            self.value = value
+            return True
+        return False
+
+    def update(self):
+        self.counts.set(self.value)
+        position = (self.value - self.last_offset) / self.last_scale
+        self.position.set(position)
+        # Use .01 because my Joystick isn't exactly zero at rest. maybe should be a parameter?
+        self.is_neg.set(position < -.01)
+        self.is_pos.set(position > .01)
+
 class HalInputDevice:
     def __init__(self, comp, idx, name, parts='KRAL'):
 	self.device = linux_event.InputDevice(name)
 
 	self.idx = idx
-	self.codes = set()
-	self.last = {}
-	self.rel_items = []
-	self.abs_items = []
 	self.comp = comp
         self.parts = parts
+        # what to do with each code, per type of event: the two pins of
+        # a key, or the RelAxis or AbsAxis
+        self.keys = {}
+        self.rels = {}
+        self.abss = {}
+        # axes whose output pins need computing again
+        self.dirty = set()
+        # [code, pin, invert pin, last state] of each LED
+        self.leds = []
 
         if 'K' in parts:
             for key in self.device.get_bits('EV_KEY'):
+                code = linux_event.encode('EV_KEY', key)
                 key = tohalname(key)
-                self.codes.add(key)
-                comp.newpin("%s.%s" % (idx, key), HAL_BIT, HAL_OUT)
-                comp.newpin("%s.%s-not" % (idx, key), HAL_BIT, HAL_OUT)
-                self.set(key + "-not", 1)
+                pin = comp.newpin("%s.%s" % (idx, key), HAL_BIT, HAL_OUT)
+                pin_not = comp.newpin("%s.%s-not" % (idx, key), HAL_BIT, HAL_OUT)
+                pin_not.set(1)
+                self.keys[code] = pin, pin_not
 
         if 'R' in parts:
             for axis in self.device.get_bits('EV_REL'):
-                name = tohalname(axis)
-                self.codes.add(name)
-                comp.newpin("%s.%s-position" % (idx, name), HAL_FLOAT, HAL_OUT)
-                comp.newpin("%s.%s-counts" % (idx, name), HAL_S32, HAL_OUT)
-                comp.newpin("%s.%s-reset" % (idx, name), HAL_BIT, HAL_IN)
-                comp.newpin("%s.%s-scale" % (idx, name), HAL_FLOAT, HAL_IN)
-                self.set(name + '-scale', 1.)
-                self.rel_items.append(name)
+                rel = RelAxis(comp, "%s.%s" % (idx, tohalname(axis)))
+                self.rels[linux_event.encode('EV_REL', axis)] = rel
+                self.dirty.add(rel)
 
         if 'A' in parts:
             for axis in self.device.get_bits('EV_ABS'):
-                name = tohalname(axis)
-                self.codes.add(name)
-                absinfo = self.device.get_absinfo(axis)
-                comp.newpin("%s.%s-position" % (idx, name), HAL_FLOAT, HAL_OUT)
-                comp.newpin("%s.%s-counts" % (idx, name), HAL_S32, HAL_OUT)
-                comp.newpin("%s.%s-is-pos" % (idx, name), HAL_BIT, HAL_OUT)
-                comp.newpin("%s.%s-is-neg" % (idx, name), HAL_BIT, HAL_OUT)
-                comp.newpin("%s.%s-scale" % (idx, name), HAL_FLOAT, HAL_IN)
-                comp.newpin("%s.%s-offset" % (idx, name), HAL_FLOAT, HAL_IN)
-                comp.newpin("%s.%s-fuzz" % (idx, name), HAL_S32, HAL_IN)
-                comp.newpin("%s.%s-flat" % (idx, name), HAL_S32, HAL_IN)
-                comp.newparam("%s.%s-min" % (idx, name), HAL_S32, HAL_RO)
-                comp.newparam("%s.%s-max" % (idx, name), HAL_S32, HAL_RO)
-                center = (absinfo.minimum + absinfo.maximum)/2.
-                halfrange = (absinfo.maximum - absinfo.minimum)/2. or 1
-                self.set(name + "-counts", absinfo.value)
-                self.set(name + "-position",
-                    (absinfo.value - center) / halfrange)
-                self.set(name + "-scale", halfrange)
-                self.set(name + "-offset", center)
-                self.set(name + "-fuzz", absinfo.fuzz)
-                self.set(name + "-flat", absinfo.flat)
-                self.set(name + "-min", absinfo.minimum)
-                self.set(name + "-max", absinfo.maximum)
-                self.abs_items.append(name)
-
-	self.ledmap = {}
+                a = AbsAxis(comp, "%s.%s" % (idx, tohalname(axis)),
+                    self.device.get_absinfo(axis))
+                self.abss[linux_event.encode('EV_ABS', axis)] = a
+                self.dirty.add(a)
+
         if 'L' in parts:
             for led in self.device.get_bits('EV_LED'):
                 name = tohalname(led)
-                self.ledmap[name] = led
-                comp.newpin("%s.%s" % (idx, name), HAL_BIT, HAL_IN)
-                comp.newpin("%s.%s-invert" % (idx, name), HAL_BIT, HAL_IN)
-                self.last[name] = 0
+                pin = comp.newpin("%s.%s" % (idx, name), HAL_BIT, HAL_IN)
+                invert = comp.newpin("%s.%s-invert" % (idx, name), HAL_BIT, HAL_IN)
+                self.leds.append([led, pin, invert, 0])
                 self.device.write_event('EV_LED', led, 0)
-	
-    def get(self, name):
-	name = "%s.%s" % (self.idx, name)
-	return self.comp[name]
 
-    def set(self, name, value):
-	name = "%s.%s" % (self.idx, name)
-	self.comp[name] = value
+    def read(self):
+        """Handle the events waiting on the device"""
+        keys = self.keys; rels = self.rels; abss = self.abss
+        dirty = self.dirty
+        for type, code, value in self.device.read_events():
+            if type == EV_KEY:
+                pins = keys.get(code)
+                if pins:
+                    pins[0].set(value != 0)
+                    pins[1].set(value == 0)
+                    continue
+            elif type == EV_ABS:
+                a = abss.get(code)
+                if a:
+                    if a.event(value): dirty.add(a)
+                    continue
+            elif type == EV_REL:
+                rel = rels.get(code)
+                if rel:
+                    rel.value += value
+                    dirty.add(rel)
+                    continue
+            else:
+                continue
+            if PARTS[type] in self.parts:
+                print >>sys.stderr, "Unexpected event", \
+                    linux_event.EV_invert[type], code
 
-    def update(self):
-	while self.device.readable():
-	    ev = self.device.read_event()
-	    if ev.type == 'EV_SYN': continue
-	    elif ev.type == 'EV_SND': continue
-	    elif ev.type == 'EV_MSC': continue
-            elif ev.type == 'EV_LED': continue
-            elif ev.type == 'EV_KEY' and 'K' not in self.parts: continue
-            elif ev.type == 'EV_REL' and 'R' not in self.parts: continue
-            elif ev.type == 'EV_ABS' and 'A' not in self.parts: continue
-	    code = tohalname(ev.code)
-	    if code not in self.codes:
-		print >>sys.stderr, "Unexpected event", ev.type, ev.code
-		continue
-	    if ev.type == 'EV_KEY':
-		if ev.value:
-		    self.set(code, 1)
-		    self.set(code + "-not", 0)
-		else:
-		    self.set(code, 0)
-		    self.set(code + "-not", 1)
-	    elif ev.type == 'EV_REL':
-		self.set(code + "-counts", self.get(code + "-counts") + ev.value)
-	    elif ev.type == 'EV_ABS':
-		flat = self.get(code + "-flat")
-		fuzz = self.get(code + "-fuzz")
-		center = int(self.get(code + "-offset"))
-		if ev.value < center-flat or ev.value > center+flat:
-		    value = ev.value
-		else: value = center
-		if abs(value - self.get(code + "-counts")) > fuzz:
-		    self.set(code + "-counts", value)
-
-                
-	for a in self.abs_items:
-	    value = self.get(a + "-counts")
-	    scale = self.get(a + "-scale") or 1
-	    offset = self.get(a + "-offset")
-	    position = (value - offset) / scale
-	    self.set(a + "-position", position)
-	    # Use .01 because my Joystick isn't exactly zero at rest. maybe should be a parameter?
-	    self.set(a + "-is-neg", (position < -.01) )
-	    self.set(a + "-is-pos", (position >  .01) )
-
-	for r in self.rel_items:
-	    reset = self.get(r + "-reset")
-	    scale = self.get(r + "-scale") or 1
-	    if reset: self.set(r + "-counts", 0)
-	    self.set(r + "-position", self.get(r + "-counts") / scale)
-
-	for k, v in self.last.items():
-	    # Note: this is OK because the hal module always returns True or False for HAL_BIT values
-	    u = self.comp["%s.%s" % (self.idx, k)] != self.comp["%s.%s-invert" % (self.idx, k)]
-	    if u != self.last[k]:
-		led = self.ledmap[k]
-		self.device.write_event('EV_LED', led, u)
-		self.last[k] = u
+    def refresh(self):
+        """Notice changes of the input pins: scales, offsets, resets and
+        LEDs"""
+        for a in self.abss.values():
+            if a.refresh(): self.dirty.add(a)
+        for rel in self.rels.values():
+            if rel.refresh(): self.dirty.add(rel)
+
+        for l in self.leds:
+            # Note: this is OK because the hal module always returns True or False for HAL_BIT values
+            u = l[1].get() != l[2].get()
+            if u != l[3]:
+                self.device.write_event('EV_LED', l[0], u)
+                l[3] = u
+
+    def flush(self):
+        """Compute the output pins of the axes that changed"""
+        for a in self.dirty:
+            a.update()
+        self.dirty.clear()
 
 h = component("hal_input")
 w = HalWrapper(h)
@@ -200,14 +247,27 @@ for f in sys.argv[1:]:
             raise SystemExit, detail
         parts = 'KRAL'
         i += 1
+w.newparam("refresh-period", HAL_FLOAT, HAL_RW)
+w["refresh-period"] = .01
 w.drive()
 h.ready()
 
-fds = [dev.device.fileno() for dev in d]
+# Wait for events, but wake up at least every refresh-period seconds to
+# follow the input pins.  Output pins are only computed for the codes
+# that changed.
+devices = dict((dev.device.fileno(), dev) for dev in d)
+fds = devices.keys()
+next_refresh = time.time()
 try:
     while 1:
-	select.select(fds, [], [], .01)
-	for i in d: i.update()
+	timeout = max(0, next_refresh - time.time())
+	r, w_, x = select.select(fds, [], [], timeout)
+	for fd in r: devices[fd].read()
+	now = time.time()
+	if now >= next_refresh:
+	    for i in d: i.refresh()
+	    next_refresh = now + max(.001, w["refresh-period"])
+	for i in d: i.flush()
 	w.drive()
 except KeyboardInterrupt:
     pass
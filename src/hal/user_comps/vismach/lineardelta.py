@@ -64,6 +64,7 @@ class TriangularPrismZ:
         self.z1 = z1
         self.h = h
 
+    @constant
     def draw(self):
         x0 = 0
         x1 = -self.h*sin(pi/3)
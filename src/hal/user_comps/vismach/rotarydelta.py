@@ -59,6 +59,7 @@ class DeltaTranslate(Collection):
         glPopMatrix()
 
 class HexPrismZ(CoordsBase):
+    @constant
     def draw(self):
 	z0, z1, h = self.coords()
         h /= cos(pi/6)
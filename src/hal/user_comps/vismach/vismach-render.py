@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+vismach-render renders a vismach model to image files without a display,
+a GPU or a running HAL, for example to check a model in a test.
+
+    vismach-render [options] model [setting ...] output
+
+model is a vismach script such as scaragui (looked up next to this
+program when it is not a file), the settings are passed on to it as
+they would be on its command line, and output is the name of the image
+to write.  With more than one frame it should contain a %d format, as
+in frame%04d.png.
+
+The HAL component the model creates is replaced by a plain table of pin
+values, so no realtime environment is needed.  Pins are set with
+--set pin=value, and --frames reads a CSV file whose first line names
+pins and whose other lines give their values for one frame each.
+
+The picture is drawn by softgl, a software renderer written with NumPy,
+so it does not look exactly like the OpenGL window: there is no
+antialiasing, and parts that cross the near plane are left out.  The
+time each frame takes to traverse and to rasterise is printed, and so
+are the collisions found by the model's CollisionChecker, if it has one.
+
+Options:
+    --size WxH      size of the image (default 400x300)
+    --lat DEG       view latitude (default: the model's)
+    --lon DEG       view longitude (default: the model's)
+    --distance D    distance of the camera (default: 3 times the model size)
+    --set PIN=VALUE set a pin for all frames
+    --frames FILE   read the pin values of each frame from a CSV file
+    --depth         also write the depth buffer next to each image, as
+                    a NumPy .npy file of values between 0 and 1
+"""
+
+import os
+import sys
+import csv
+import time
+import zlib
+import struct
+import getopt
+
+import numpy
+import softgl
+sys.modules['minigl'] = softgl
+from softgl import *
+
+import hal
+import vismach
+
+class component(dict):
+    """Stands in for hal.component: the pins and parameters are entries
+    of the dictionary, and keep the values they are set to"""
+    instances = []
+
+    def __init__(self, name, prefix=None):
+        dict.__init__(self)
+        self.name = name
+        component.instances.append(self)
+
+    def newpin(self, name, type, dir):
+        self[name] = 0.0
+
+    def newparam(self, name, type, dir):
+        self[name] = 0.0
+
+    def getprefix(self):
+        return self.name
+
+    def getvalues(self):
+        return dict(self)
+
+    def ready(self):
+        pass
+
+    def exit(self):
+        pass
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError, name
+
+class Scene(Exception):
+    """The arguments of vismach.main, raised to stop the model script"""
+    def __init__(self, model, tool, work, size=10, hud=0,
+            rotation_vectors=None, lat=0, lon=0, collisions=None, **kw):
+        Exception.__init__(self)
+        self.model = model
+        self.tool = tool
+        self.work = work
+        self.size = size
+        self.rotation_vectors = rotation_vectors or [(1.,0.,0.), (0.,0.,1.)]
+        self.lat = lat
+        self.lon = lon
+        self.collisions = collisions
+
+def capture_main(*args, **kw):
+    raise Scene(*args, **kw)
+
+def load_model(script, settings):
+    """Run the model script and return the Scene it passes to main()"""
+    hal.component = component
+    vismach.main = capture_main
+    sys.argv = [script] + settings
+    namespace = {'__name__': '__main__', '__file__': script}
+    try:
+        execfile(script, namespace)
+    except Scene, scene:
+        return scene
+    raise SystemExit, "%s: the model script did not call main()" % script
+
+def find_script(name):
+    if os.path.exists(name): return name
+    here = os.path.dirname(os.path.abspath(sys.argv[0]))
+    for candidate in (name, name + ".py"):
+        path = os.path.join(here, candidate)
+        if os.path.exists(path): return path
+    raise SystemExit, "%s: no such model" % name
+
+def set_pin(name, value):
+    for c in component.instances:
+        if name in c:
+            c[name] = float(value)
+            return
+    raise SystemExit, "unknown pin %s" % name
+
+def read_frames(filename):
+    """Return the frames of a CSV file as lists of (pin, value)"""
+    f = open(filename, "rb")
+    try:
+        rows = [row for row in csv.reader(f) if row]
+    finally:
+        f.close()
+    if not rows: return []
+    names = [n.strip() for n in rows[0]]
+    return [zip(names, row) for row in rows[1:]]
+
+def write_png(filename, image):
+    """Write an (h, w, 3) uint8 array as an RGB PNG file"""
+    h, w = image.shape[:2]
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+    # every row starts with filter type 0
+    rows = numpy.zeros((h, w * 3 + 1), dtype=numpy.uint8)
+    rows[:, 1:] = image.reshape(h, w * 3)
+    f = open(filename, "wb")
+    try:
+        f.write("\x89PNG\r\n\x1a\n")
+        f.write(chunk("IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk("IDAT", zlib.compress(rows.tostring(), 6)))
+        f.write(chunk("IEND", ""))
+    finally:
+        f.close()
+
+class Renderer:
+    def __init__(self, scene, width, height, distance=None, lat=None, lon=None):
+        self.scene = scene
+        self.framebuffer = softgl.Framebuffer(width, height)
+        self.world = vismach.Capture()
+        self.model = vismach.CompiledModel(vismach.Collection(
+            [scene.model, self.world]))
+        self.backplot = vismach.Backplot()
+        self.backplot.tolerance = scene.size * 1e-4
+        self.distance = distance or scene.size * 3
+        self.lat = scene.lat if lat is None else lat
+        self.lon = scene.lon if lon is None else lon
+        self.touching = []
+        softgl.make_current(self.framebuffer)
+
+    def setup_view(self):
+        fb = self.framebuffer
+        size = self.scene.size
+        glClearColor(0, 0, 0, 0)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        # the camera of vismach.main
+        gluPerspective(30, float(fb.width) / fb.height, size * 0.01, size * 10.0)
+        gluLookAt(0, 0, self.distance, 0, 0, 0, 0, 1, 0)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+        vismach.setup_lighting()
+        glRotatef(self.lat, *self.scene.rotation_vectors[0])
+        glRotatef(self.lon, *self.scene.rotation_vectors[1])
+
+    def render(self):
+        """Draw one frame; return the traverse and rasterise times"""
+        start = time.time()
+        self.setup_view()
+        self.model.traverse()
+        self.draw_backplot()
+        if self.scene.collisions:
+            self.touching = self.scene.collisions.check()
+        middle = time.time()
+        self.framebuffer.flush()
+        return middle - start, time.time() - middle
+
+    def draw_backplot(self):
+        # the tool tip in work coordinates, as in vismach.O.redraw
+        view2world = vismach.invert(self.world.t)
+        view2work = vismach.invert(self.scene.work.t)
+        tool = numpy.array(list(self.scene.tool.t[12:15]) + [1])
+        work = numpy.dot(tool, numpy.array(view2work).reshape(4, 4))
+        self.backplot.add(tuple(work[:3]))
+        glPushMatrix()
+        glMultMatrixd(view2world)
+        glMultMatrixd(self.scene.work.t)
+        glDisable(GL_LIGHTING)
+        glColor3f(1.0, 0.5, 0.5)
+        self.backplot.draw()
+        glEnable(GL_LIGHTING)
+        glPopMatrix()
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h",
+            ["size=", "lat=", "lon=", "distance=", "set=", "frames=",
+             "depth", "help"])
+    except getopt.GetoptError, detail:
+        raise SystemExit, "%s\n%s" % (detail, __doc__)
+    width, height = 400, 300
+    lat = lon = distance = None
+    pins = []
+    frames = None
+    depth = False
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            print __doc__
+            raise SystemExit
+        elif o == "--size":
+            width, height = [int(v) for v in a.lower().split("x")]
+        elif o == "--lat":
+            lat = float(a)
+        elif o == "--lon":
+            lon = float(a)
+        elif o == "--distance":
+            distance = float(a)
+        elif o == "--set":
+            pins.append(a.split("=", 1))
+        elif o == "--frames":
+            frames = read_frames(a)
+        elif o == "--depth":
+            depth = True
+    if len(args) < 2:
+        raise SystemExit, __doc__
+
+    output = args[-1]
+    scene = load_model(find_script(args[0]), args[1:-1])
+    renderer = Renderer(scene, width, height, distance, lat, lon)
+    for name, value in pins:
+        set_pin(name, value)
+    if frames is None: frames = [[]]
+    if len(frames) > 1 and "%" not in output:
+        raise SystemExit, "%s: the output name needs a %%d format for %d frames" % (
+            output, len(frames))
+
+    total = [0.0, 0.0]
+    for i, frame in enumerate(frames):
+        for name, value in frame:
+            set_pin(name, value)
+        traverse, raster = renderer.render()
+        filename = output % i if "%" in output else output
+        write_png(filename, renderer.framebuffer.image())
+        if depth:
+            numpy.save(os.path.splitext(filename)[0] + ".npy",
+                renderer.framebuffer.depth_image())
+        total[0] += traverse; total[1] += raster
+        print "%s: traverse %.1f ms, rasterise %.1f ms" % (filename,
+            traverse * 1000, raster * 1000)
+        for a, b in renderer.touching:
+            print "%s: collision between %s and %s" % (filename, a.name, b.name)
+    n = len(frames)
+    print "%d frames, %.1f ms/frame (traverse %.1f ms, rasterise %.1f ms)" % (
+        n, sum(total) * 1000 / n, total[0] * 1000 / n, total[1] * 1000 / n)
+
+if __name__ == '__main__':
+    main()
+
+# vim:ts=8:sts=4:sw=4:et:
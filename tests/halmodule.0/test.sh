@@ -8,6 +8,7 @@ try:
     ps = h.newpin("s", hal.HAL_S32, hal.HAL_OUT);
     pu = h.newpin("u", hal.HAL_U32, hal.HAL_OUT);
     pf = h.newpin("f", hal.HAL_FLOAT, hal.HAL_OUT);
+    pb = h.newpin("b", hal.HAL_BIT, hal.HAL_OUT);
     param = h.newparam("param", hal.HAL_BIT, hal.HAL_RW)
     h.ready()
 
@@ -81,6 +82,14 @@ try:
 
     try_set_pin(pu, 0)
     try_set_pin(pu, -1)
+
+    h["s"] = -5
+    h["u"] = 7
+    h["f"] = 2.5
+    h["b"] = 1
+    h["param"] = 1
+    for k, v in sorted(h.getvalues().items()):
+        print "getvalues", k, v
 except:
     import traceback
     print "Exception:", traceback.format_exc()
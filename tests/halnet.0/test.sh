@@ -0,0 +1,20 @@
+#!/bin/sh
+python <<EOF
+import halnet
+n = halnet.Netlist()
+n.parse("""
+# stepconf
+net xenable joint.0.amp-enable-out => stepgen.0.enable
+net xstep <= stepgen.0.step
+net xstep => parport.0.pin-03-out
+# pncconf
+net x-pos-cmd  joint.0.motor-pos-cmd => pid.x.command
+net x-pos-fb   hm2_5i25.0.encoder.00.position => pid.x.feedback joint.0.motor-pos-fb
+net estop-ext  <=  parport.0.pin-10-in-not
+net estop-ext  =>  iocontrol.0.emc-enable-in
+net spindle-cw motion.spindle-forward
+net spindle-cw => parport.0.pin-14-out
+""")
+for s in sorted(n.signals):
+    print s, n.driver(s), " ".join(n.readers(s))
+EOF